@@ -1,9 +1,14 @@
-from bookings.models import Notification
+from django.utils.functional import SimpleLazyObject
+
+from bookings.notifications import unread_count
 
 
 def notifications_processor(request):
-    """Add unread notification count to all templates"""
+    """
+    Add unread notification count to all templates.
+    The count is lazy, so pages that never show the badge don't look it up.
+    """
     if request.user.is_authenticated:
-        unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return {'unread_notifications_count': unread_count}
+        user_id = request.user.id
+        return {'unread_notifications_count': SimpleLazyObject(lambda: unread_count(user_id))}
     return {'unread_notifications_count': 0}
@@ -0,0 +1,218 @@
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .roles import get_request_role
+
+logger = logging.getLogger(__name__)
+
+# Session key holding the unix time the session expiry was last pushed forward
+SESSION_REFRESHED_KEY = '_session_refreshed_at'
+
+
+class SlidingSessionMiddleware:
+    """
+    Sliding session expiry without SESSION_SAVE_EVERY_REQUEST.
+
+    The session is only marked as modified (and so re-saved with a fresh
+    expiry) once less than SESSION_REFRESH_THRESHOLD seconds of its lifetime
+    remain. Empty sessions, e.g. anonymous visitors browsing services, are
+    never written. Must come after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty() or not session.keys():
+            return response
+
+        now = int(time.time())
+        refreshed_at = session.get(SESSION_REFRESHED_KEY, 0)
+        remaining = refreshed_at + session.get_expiry_age() - now
+        if remaining < settings.SESSION_REFRESH_THRESHOLD:
+            session[SESSION_REFRESHED_KEY] = now
+
+        return response
+
+
+class RoleMiddleware:
+    """
+    Resolve the user's role (see accounts/roles.py) once per request and
+    expose it as request.role. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role = get_request_role(request)
+        return self.get_response(request)
+
+
+class RequestTimings:
+    """
+    SQL and template timings of one request. Installed with
+    connection.execute_wrapper() it times every statement, keeping the
+    slowest QUERY_TIMING_TOP of them and every statement above
+    SLOW_QUERY_THRESHOLD_MS.
+    """
+
+    def __init__(self, top=3, slow_threshold=None):
+        self.top = top
+        self.slow_threshold = slow_threshold
+        self.query_count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+        self.slowest = []  # min-heap of (duration, sequence, alias, sql)
+        self.slow_queries = []  # (duration, alias, sql, params)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            alias = context['connection'].alias
+            self.query_count += 1
+            self.db_time += duration
+            entry = (duration, self.query_count, alias, sql)
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, entry)
+            elif self.top:
+                heapq.heappushpop(self.slowest, entry)
+            if self.slow_threshold is not None and duration * 1000 >= self.slow_threshold and not many:
+                self.slow_queries.append((duration, alias, sql, params))
+
+    def slowest_queries(self):
+        """(duration, alias, sql) of the slowest statements, slowest first"""
+        return [(duration, alias, sql) for duration, _, alias, sql in sorted(self.slowest, reverse=True)]
+
+
+# Timings of the request being handled, None outside QueryInstrumentationMiddleware
+_current_timings = ContextVar('request_timings', default=None)
+
+
+def timed_render(render, *args):
+    """
+    Call a template's render function, adding the time of top-level renders
+    to the request timings (see accounts/template_backends.py)
+    """
+    timings = _current_timings.get()
+    if timings is None or timings.rendering:
+        return render(*args)
+    timings.rendering = True
+    started = time.perf_counter()
+    try:
+        return render(*args)
+    finally:
+        timings.render_time += time.perf_counter() - started
+        timings.rendering = False
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Per-request SQL query count, database time, slowest statements and
+    template render time.
+
+    Every request is logged (DEBUG, or WARNING once it issues more than
+    SLOW_REQUEST_QUERY_COUNT queries) with the numbers in `extra` for
+    structured log handlers. Statements slower than SLOW_QUERY_THRESHOLD_MS
+    are logged as WARNING with their EXPLAIN output. With SERVER_TIMING on,
+    the numbers are also sent in a Server-Timing header for the browser's
+    network panel. Render time includes queries run from templates, and is
+    measured by the template backend (accounts.template_backends).
+
+    Should come first so the queries of the other middleware are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        timings = RequestTimings(
+            top=getattr(settings, 'QUERY_TIMING_TOP', 3),
+            slow_threshold=getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None),
+        )
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total_time = time.perf_counter() - started
+
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = (
+                f'db;dur={timings.db_time * 1000:.1f};desc="{timings.query_count} queries", '
+                f'render;dur={timings.render_time * 1000:.1f}, '
+                f'total;dur={total_time * 1000:.1f}'
+            )
+
+        self.log_request(request, response, timings, total_time)
+        for duration, alias, sql, params in timings.slow_queries:
+            self.log_slow_query(request, duration, alias, sql, params)
+        return response
+
+    def log_request(self, request, response, timings, total_time):
+        query_limit = getattr(settings, 'SLOW_REQUEST_QUERY_COUNT', None)
+        level = logging.DEBUG
+        if query_limit is not None and timings.query_count > query_limit:
+            level = logging.WARNING
+        if not logger.isEnabledFor(level):
+            return
+
+        slowest = timings.slowest_queries()
+        logger.log(
+            level,
+            '%s %s %s: %d queries, db %.1fms, render %.1fms, total %.1fms',
+            request.method, request.path, response.status_code, timings.query_count,
+            timings.db_time * 1000, timings.render_time * 1000, total_time * 1000,
+            extra={
+                'path': request.path,
+                'method': request.method,
+                'status_code': response.status_code,
+                'query_count': timings.query_count,
+                'db_ms': round(timings.db_time * 1000, 1),
+                'render_ms': round(timings.render_time * 1000, 1),
+                'total_ms': round(total_time * 1000, 1),
+                'slowest_queries': [
+                    {'ms': round(duration * 1000, 1), 'sql': sql} for duration, _, sql in slowest
+                ],
+            },
+        )
+
+    def log_slow_query(self, request, duration, alias, sql, params):
+        logger.warning(
+            'Slow query (%.1fms) in %s %s: %s\n%s',
+            duration * 1000, request.method, request.path, sql, explain(alias, sql, params),
+            extra={'path': request.path, 'query_ms': round(duration * 1000, 1), 'sql': sql},
+        )
+
+
+def explain(alias, sql, params):
+    """The database's query plan for a statement, as text"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return '(no plan for non-SELECT statements)'
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f'(EXPLAIN failed: {error})'
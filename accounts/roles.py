@@ -0,0 +1,130 @@
+"""
+User role resolution (user / provider / superadmin).
+
+The role comes from UserProfile.user_type, or from a ProviderProfile for
+providers without a UserProfile. It used to be looked up separately by
+every template filter call, view guard and decorator. It is now resolved
+at most once per request:
+
+    RoleMiddleware  -> takes the role from the session (no query) and puts
+                       it on request.role and the user object
+    get_role(user)  -> the single lookup everything else goes through
+
+The session copy carries a per-user version token kept in the cache.
+Saving or deleting a UserProfile or ProviderProfile replaces the token
+(see bookings/signals.py), which makes every session of that user resolve
+the role again on its next request. A token missing from the cache
+(evicted, or lost with a restart) is replaced by a new random one rather
+than restarted at a known value, so a session saved before a role change
+can never match again.
+
+Invalidation only reaches every process when they share the cache, so
+the session copy is only used with ROLE_SESSION_CACHE enabled (the
+development server, or a shared backend such as Redis or Memcached).
+Without it the role is looked up once per request.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import UserProfile
+
+ROLE_USER = 'user'
+ROLE_PROVIDER = 'provider'
+ROLE_SUPERADMIN = 'superadmin'
+
+ROLE_LABELS = dict(UserProfile.USER_TYPE_CHOICES)
+
+ROLE_SESSION_KEY = '_user_role'
+ROLE_VERSION_CACHE_KEY = 'roles:version:{}'
+
+# Attribute caching the role on a User instance for the rest of the request
+_USER_ROLE_ATTR = '_cached_role'
+_MISSING = object()
+
+
+def resolve_role(user):
+    """
+    Look the role up in the database (one query).
+    None means the user has neither a UserProfile nor a ProviderProfile.
+    """
+    row = User.objects.filter(pk=user.pk).values_list(
+        'userprofile__user_type', 'provider_profile__id').first()
+    if row is None:
+        return None
+    user_type, provider_profile_id = row
+    if user_type:
+        return user_type
+    return ROLE_PROVIDER if provider_profile_id is not None else None
+
+
+def get_role(user):
+    """The role of a user, cached on the user object; None for anonymous users"""
+    if user is None or not user.is_authenticated:
+        return None
+    role = getattr(user, _USER_ROLE_ATTR, _MISSING)
+    if role is _MISSING:
+        role = resolve_role(user)
+        setattr(user, _USER_ROLE_ATTR, role)
+    return role
+
+
+def is_provider(user):
+    return get_role(user) == ROLE_PROVIDER
+
+
+def is_superadmin(user):
+    return get_role(user) == ROLE_SUPERADMIN
+
+
+def role_label(user):
+    """Display name of the user's role, 'User' when there is no profile"""
+    return ROLE_LABELS.get(get_role(user), 'User')
+
+
+def role_version(user_id):
+    """The user's current role version token"""
+    key = ROLE_VERSION_CACHE_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Unknown (new user, evicted or restarted): a fresh token that no
+        # stored session carries; add() keeps a concurrent request's token
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_role(user_id):
+    """Make every session of the user resolve the role again"""
+    cache.set(ROLE_VERSION_CACHE_KEY.format(user_id), uuid4().hex, None)
+
+
+def get_request_role(request):
+    """
+    The role for the request's user, from the session when it is still
+    current, otherwise from the database (and then stored in the session).
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if hasattr(user, _USER_ROLE_ATTR):
+        return getattr(user, _USER_ROLE_ATTR)
+    if not settings.ROLE_SESSION_CACHE:
+        return get_role(user)
+
+    session = getattr(request, 'session', None)
+    version = role_version(user.pk)
+    stored = session.get(ROLE_SESSION_KEY) if session is not None else None
+
+    if stored and stored.get('user') == user.pk and version is not None and stored.get('version') == version:
+        role = stored['role']
+        setattr(user, _USER_ROLE_ATTR, role)
+        return role
+
+    role = get_role(user)
+    if session is not None:
+        session[ROLE_SESSION_KEY] = {'user': user.pk, 'version': version, 'role': role}
+    return role
+
@@ -0,0 +1,28 @@
+"""
+Template backend that reports render time to QueryInstrumentationMiddleware.
+
+Configured in settings.TEMPLATES instead of patching Template.render, so
+only renders through this backend are timed, and only while a request is
+being instrumented: management commands and tests rendering templates
+outside a request are left alone.
+"""
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import timed_render
+
+
+class TimedTemplate(Template):
+    """A Django template whose renders count toward the request's render time"""
+
+    def render(self, context=None, request=None):
+        return timed_render(super().render, context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates returning TimedTemplate wrappers"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
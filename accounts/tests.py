@@ -1,3 +1,534 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import connection
+from django.template.base import Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from datetime import date, time, timedelta
+from decimal import Decimal
+from .middleware import SESSION_REFRESHED_KEY
+from .models import UserProfile
+from .roles import ROLE_PROVIDER, ROLE_USER, get_role
+from bookings.featured import FEATURED_POOL_SIZE
+from bookings.models import Service, Availability, Booking, Notification, ProviderProfile
+from bookings.rollups import record_bookings
 
-# Create your tests here.
+
+class DashboardTestMixin:
+    """Shared fixtures for dashboard tests"""
+
+    def create_provider(self, username='provider'):
+        user = User.objects.create_user(username=username, password='testpass123')
+        UserProfile.objects.create(user=user, user_type='provider', city='Amsterdam')
+        return user
+
+    def create_customer(self, username='customer'):
+        user = User.objects.create_user(username=username, password='testpass123')
+        UserProfile.objects.create(user=user, user_type='user')
+        return user
+
+    def create_service(self, provider, duration=60):
+        return Service.objects.create(
+            provider=provider,
+            name='Haircut',
+            category='salon_beauty',
+            description='Professional haircut',
+            price=Decimal('35.00'),
+            duration=duration
+        )
+
+    def create_bookings(self, service, customer, day, count, status='completed'):
+        """Create `count` back-to-back one hour bookings on a day"""
+        slots = Availability.objects.bulk_create([
+            Availability(
+                provider=service.provider, service=service, date=day,
+                start_time=time(i % 24, 0), end_time=time((i + 1) % 24, 0),
+                is_available=False
+            )
+            for i in range(count)
+        ])
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                customer=customer, provider=service.provider, service=service,
+                availability=slot, date=day, start_time=slot.start_time,
+                end_time=slot.end_time, price=service.price, status=status
+            )
+            for slot in slots
+        ])
+        record_bookings(bookings)
+        return bookings
+
+
+class DashboardStatsTestCase(DashboardTestMixin, TestCase):
+    """Test cases for the dashboard statistics"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.provider = self.create_provider()
+        self.customer = self.create_customer()
+        self.service = self.create_service(self.provider)
+        self.past_day = date.today() - timedelta(days=3)
+
+    def get_dashboard(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('dashboard'))
+
+    def test_provider_stats(self):
+        """Test the provider dashboard numbers"""
+        self.create_bookings(self.service, self.customer, self.past_day, 3, status='completed')
+        self.create_bookings(self.service, self.customer, self.past_day - timedelta(days=1), 2,
+                             status='pending')
+
+        response = self.get_dashboard(self.provider)
+
+        self.assertEqual(response.context['total_bookings'], 5)
+        self.assertEqual(response.context['pending_bookings'], 2)
+        self.assertEqual(response.context['completed_bookings'], 3)
+        self.assertEqual(response.context['total_revenue'], Decimal('105.00'))
+        self.assertEqual(response.context['total_hours'], 3.0)
+
+    def test_customer_stats(self):
+        """Test the customer dashboard numbers"""
+        self.create_bookings(self.service, self.customer, self.past_day, 2, status='confirmed')
+
+        response = self.get_dashboard(self.customer)
+
+        self.assertEqual(response.context['total_bookings'], 2)
+        self.assertEqual(response.context['completed_bookings'], 0)
+        self.assertEqual(response.context['total_spent'], 0)
+        self.assertEqual(response.context['total_hours'], 2.0)
+
+    def test_provider_stats_query_count_is_constant(self):
+        """Test that the stats cost does not grow with the number of bookings"""
+        # Enough bookings to fill the fixed-size "recent bookings" lists
+        self.create_bookings(self.service, self.customer, self.past_day, 6)
+        self.get_dashboard(self.provider)
+        with CaptureQueriesContext(connection) as few:
+            self.get_dashboard(self.provider)
+
+        self.create_bookings(self.service, self.customer, self.past_day - timedelta(days=1), 20)
+        with CaptureQueriesContext(connection) as many:
+            self.get_dashboard(self.provider)
+
+        self.assertEqual(len(few), len(many))
+
+
+class CalendarFeedTestCase(DashboardTestMixin, TestCase):
+    """Query-count regression tests for the calendar booking feeds"""
+
+    UPCOMING = 500
+
+    def setUp(self):
+        """Set up test data"""
+        self.provider = self.create_provider()
+        self.service = self.create_service(self.provider)
+        customers = [self.create_customer(f'customer{i}') for i in range(5)]
+        customers[0].first_name, customers[0].last_name = 'Ann', 'Smith'
+        customers[0].save()
+
+        # 500 upcoming bookings spread over the next few weeks
+        tomorrow = date.today() + timedelta(days=1)
+        for day_offset in range(self.UPCOMING // 20):
+            self.create_bookings(self.service, customers[day_offset % 5],
+                                 tomorrow + timedelta(days=day_offset), 20, status='confirmed')
+
+    def test_feed_is_one_query(self):
+        """Test the feed builder output and query count"""
+        from bookings.feeds import calendar_feed
+
+        with self.assertNumQueries(1):
+            feed = calendar_feed(self.provider, date.today(), date.today() + timedelta(days=90))
+
+        self.assertEqual(sum(len(day) for day in feed.values()), self.UPCOMING)
+        first_day = feed[(date.today() + timedelta(days=1)).isoformat()]
+        self.assertEqual(first_day[0]['customer'], 'Ann Smith')
+        self.assertEqual(first_day[0]['service'], 'Haircut')
+        self.assertEqual(first_day[0]['time'], '00:00')
+        self.assertEqual(first_day[0]['price'], '35.00')
+
+    def count_queries(self, user, url_name):
+        """Queries for a warmed-up GET of the page as the given user"""
+        self.client.force_login(user)
+        self.client.get(reverse(url_name))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_calendar_view_query_count(self):
+        """Test that the calendar page costs the same with 0 or 500 bookings"""
+        idle_provider = self.create_provider('idle_provider')
+
+        self.assertEqual(
+            self.count_queries(self.provider, 'booking_calendar'),
+            self.count_queries(idle_provider, 'booking_calendar')
+        )
+
+    def test_dashboard_query_count(self):
+        """Test that the provider dashboard costs the same with 0 or 500 bookings"""
+        idle_provider = self.create_provider('idle_provider')
+
+        self.assertEqual(
+            self.count_queries(self.provider, 'dashboard'),
+            self.count_queries(idle_provider, 'dashboard')
+        )
+
+
+class UnreadNotificationCountTestCase(DashboardTestMixin, TestCase):
+    """Test the cached unread notification badge"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = self.create_customer()
+        self.client.force_login(self.customer)
+        self.notification = self.notify(self.customer)
+
+    def notify(self, user, title='Reminder'):
+        return Notification.objects.create(
+            user=user, notification_type='reminder', title=title, message='Your appointment is tomorrow'
+        )
+
+    def badge_count(self):
+        response = self.client.get(reverse('dashboard'))
+        return response.context['unread_notifications_count']
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(url_name))
+        return [q['sql'] for q in queries if 'bookings_notification' in q['sql']]
+
+    def test_count_is_cached(self):
+        self.assertEqual(self.badge_count(), 1)
+        self.assertEqual(self.count_queries('dashboard'), [])
+
+    def test_count_is_lazy(self):
+        """Pages that don't show the badge never count notifications"""
+        self.assertEqual(self.count_queries('home'), [])
+
+    def test_create_and_delete_reset_count(self):
+        self.assertEqual(self.badge_count(), 1)
+        self.notify(self.customer, title='Second')
+        self.assertEqual(self.badge_count(), 2)
+
+        self.client.get(reverse('notifications') + f'?delete={self.notification.id}')
+        self.assertEqual(self.badge_count(), 1)
+
+    def test_mark_read_resets_count(self):
+        self.notify(self.customer, title='Second')
+        self.assertEqual(self.badge_count(), 2)
+
+        self.client.get(reverse('notifications') + f'?mark_read={self.notification.id}')
+        self.assertEqual(self.badge_count(), 1)
+
+        self.client.get(reverse('notifications') + '?mark_all_read=true')
+        self.assertEqual(self.badge_count(), 0)
+
+    def test_superadmin_bulk_send_resets_count(self):
+        self.assertEqual(self.badge_count(), 1)
+
+        admin = User.objects.create_user(username='admin', password='testpass123')
+        UserProfile.objects.create(user=admin, user_type='superadmin')
+        self.client.force_login(admin)
+        self.client.post(reverse('superadmin_notifications'), {
+            'notification_type': 'system',
+            'title': 'Maintenance',
+            'message': 'Down tonight',
+            'recipient_type': 'all',
+        })
+
+        self.client.force_login(self.customer)
+        self.assertEqual(self.badge_count(), 2)
+
+
+class SlidingSessionTestCase(TestCase):
+    """Test that sessions are only written when the expiry needs refreshing"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='testpass123')
+        UserProfile.objects.create(user=self.user, user_type='user')
+
+    def session_writes(self, url_name='browse_providers'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return [
+            q['sql'] for q in queries
+            if 'django_session' in q['sql'] and q['sql'].startswith(('UPDATE', 'INSERT'))
+        ]
+
+    def test_anonymous_browse_writes_no_session(self):
+        self.assertEqual(self.session_writes(), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_fresh_session_is_not_rewritten(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('browse_providers'))
+
+        self.assertEqual(self.session_writes(), [])
+
+    def test_session_close_to_expiry_is_refreshed(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('browse_providers'))
+
+        session = self.client.session
+        session[SESSION_REFRESHED_KEY] -= settings.SESSION_COOKIE_AGE - settings.SESSION_REFRESH_THRESHOLD + 60
+        session.save()
+
+        self.assertEqual(len(self.session_writes()), 1)
+        self.assertEqual(self.session_writes(), [])
+
+
+class HomePageTestCase(DashboardTestMixin, TestCase):
+    """Test the featured services and categories on the landing page"""
+
+    def setUp(self):
+        cache.clear()
+        self.provider = self.create_provider()
+
+    def add_services(self, count, **fields):
+        Service.objects.bulk_create([
+            Service(provider=self.provider, name=f'Service {i}', category=fields.get('category', 'fitness'),
+                    description='Test service', price=Decimal('20.00'), duration=60,
+                    is_active=fields.get('is_active', True))
+            for i in range(count)
+        ])
+
+    def home_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_featured_services_are_random_active_services(self):
+        self.add_services(3, is_active=False)
+        self.add_services(10)
+
+        response, _ = self.home_queries()
+        featured = response.context['featured_services']
+
+        self.assertEqual(len(featured), 6)
+        self.assertEqual(len({service.id for service in featured}), 6)
+        self.assertTrue(all(service.is_active for service in featured))
+
+    def test_small_catalog_shows_every_service(self):
+        self.add_services(2)
+        response, _ = self.home_queries()
+        self.assertEqual(len(response.context['featured_services']), 2)
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        self.add_services(FEATURED_POOL_SIZE * 2)
+        _, small = self.home_queries()
+        self.add_services(500, category='education')
+        response, large = self.home_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(response.context['popular_categories'][0]['value'], 'education')
+
+    def test_pool_and_categories_are_cached(self):
+        self.add_services(10)
+        self.client.get(reverse('home'))
+
+        with self.assertNumQueries(1):  # only the featured rows
+            response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['featured_services']), 6)
+
+
+@override_settings(ROLE_SESSION_CACHE=True)
+class RoleResolutionTestCase(DashboardTestMixin, TestCase):
+    """Test that the user role is resolved once and cached in the session"""
+
+    def setUp(self):
+        cache.clear()
+        self.provider = self.create_provider()
+        self.customer = self.create_customer()
+
+    def profile_queries(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        return response, [
+            q['sql'] for q in queries
+            if 'accounts_userprofile' in q['sql'] or 'bookings_providerprofile' in q['sql']
+        ]
+
+    def test_role_is_read_from_session(self):
+        self.client.force_login(self.provider)
+        response, queries = self.profile_queries('my_services')
+        self.assertEqual(response.wsgi_request.role, ROLE_PROVIDER)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.profile_queries('my_services')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.role, ROLE_PROVIDER)
+        self.assertEqual(queries, [])
+
+    def test_profile_change_refreshes_role(self):
+        self.client.force_login(self.provider)
+        self.client.get(reverse('dashboard'))
+
+        profile = self.provider.userprofile
+        profile.user_type = 'user'
+        profile.save()
+
+        response, _ = self.profile_queries('dashboard')
+        self.assertEqual(response.wsgi_request.role, ROLE_USER)
+        self.assertFalse(response.context['is_provider'])
+
+    def test_lost_role_version_does_not_revive_old_sessions(self):
+        self.client.force_login(self.provider)
+        cache.clear()
+        self.client.get(reverse('dashboard'))
+
+        # Demoted, then the cache is lost (a restart or an eviction)
+        profile = self.provider.userprofile
+        profile.user_type = 'user'
+        profile.save()
+        cache.clear()
+
+        response, queries = self.profile_queries('dashboard')
+        self.assertEqual(response.wsgi_request.role, ROLE_USER)
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(ROLE_SESSION_CACHE=False)
+    def test_role_is_looked_up_without_session_cache(self):
+        self.client.force_login(self.provider)
+        self.client.get(reverse('my_services'))
+
+        response, queries = self.profile_queries('my_services')
+        self.assertEqual(response.wsgi_request.role, ROLE_PROVIDER)
+        self.assertEqual(len(queries), 1)
+
+    def test_superadmin_required_uses_role(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('superadmin_dashboard'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+        admin = User.objects.create_user(username='admin', password='testpass123')
+        UserProfile.objects.create(user=admin, user_type='superadmin')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse('superadmin_dashboard')).status_code, 200)
+
+    def test_login_rejects_wrong_account_type(self):
+        response = self.client.post(reverse('login'), {
+            'username': 'provider', 'password': 'testpass123', 'account_type': 'user'
+        }, follow=True)
+        self.assertContains(response, 'registered as a Service Provider')
+
+        response = self.client.post(reverse('login'), {
+            'username': 'provider', 'password': 'testpass123', 'account_type': 'provider'
+        })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_anonymous_user_is_not_provider(self):
+        self.assertFalse(ProviderProfile.is_provider(AnonymousUser()))
+        self.assertIsNone(get_role(AnonymousUser()))
+
+
+class QueryInstrumentationTestCase(TestCase):
+    """Test the per-request query and timing instrumentation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='testpass123')
+        UserProfile.objects.create(user=self.user, user_type='user')
+        self.client.force_login(self.user)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('browse_providers'))
+
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+        self.assertGreater(float(timing['render'].split('=')[1]), 0)
+        # Timed by the template backend, not by patching Django
+        self.assertEqual(Template.render.__module__, 'django.template.base')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_no_header_when_disabled(self):
+        response = self.client.get(reverse('browse_providers'))
+
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_logged_with_their_plan(self):
+        with self.assertLogs('accounts.middleware', 'WARNING') as logs:
+            self.client.get(reverse('browse_providers'))
+
+        slow = [record for record in logs.records if record.getMessage().startswith('Slow query')]
+        self.assertTrue(slow)
+        # SQLite query plans describe each table access as SCAN or SEARCH
+        self.assertTrue(any(word in record.getMessage() for record in slow for word in ('SCAN', 'SEARCH')))
+
+    @override_settings(SLOW_REQUEST_QUERY_COUNT=0, SLOW_QUERY_THRESHOLD_MS=None)
+    def test_requests_over_the_query_limit_are_logged(self):
+        with self.assertLogs('accounts.middleware', 'WARNING') as logs:
+            self.client.get(reverse('browse_providers'))
+
+        record, = logs.records
+        self.assertEqual(record.path, reverse('browse_providers'))
+        self.assertGreater(record.query_count, 0)
+        self.assertLessEqual(len(record.slowest_queries), settings.QUERY_TIMING_TOP)
+
+
+class SuperadminDashboardTestCase(DashboardTestMixin, TestCase):
+    """Test the cached platform statistics of the superadmin dashboard"""
+
+    def setUp(self):
+        cache.clear()
+        self.provider = self.create_provider()
+        self.customer = self.create_customer()
+        self.service = self.create_service(self.provider)
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        UserProfile.objects.create(user=self.admin, user_type='superadmin')
+        self.client.force_login(self.admin)
+
+    def get_dashboard(self):
+        return self.client.get(reverse('superadmin_dashboard'))
+
+    def test_platform_totals(self):
+        self.create_bookings(self.service, self.customer, date.today(), 3, status='completed')
+        self.create_bookings(self.service, self.customer, date.today() + timedelta(days=1), 2,
+                             status='pending')
+
+        context = self.get_dashboard().context
+
+        self.assertEqual(context['total_users'], 3)
+        self.assertEqual(context['total_providers'], 1)
+        self.assertEqual(context['total_customers'], 1)
+        self.assertEqual(context['total_bookings'], 5)
+        self.assertEqual(context['total_revenue'], Decimal('105.00'))
+        self.assertEqual(context['total_hours'], 3.0)
+        self.assertEqual([(s.name, s.booking_count) for s in context['top_services']], [('Haircut', 5)])
+
+    def test_monthly_revenue_uses_calendar_months(self):
+        this_month = date.today().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        self.create_bookings(self.service, self.customer, this_month, 2)
+        self.create_bookings(self.service, self.customer, last_month, 1)
+        self.create_bookings(self.service, self.customer, this_month - timedelta(days=1), 1)
+
+        revenue = self.get_dashboard().context['monthly_revenue']
+
+        self.assertEqual(len(revenue), 6)
+        self.assertEqual(revenue[-1], {'month': this_month.strftime('%b %Y'), 'revenue': 70.0})
+        self.assertEqual(revenue[-2], {'month': last_month.strftime('%b %Y'), 'revenue': 70.0})
+        self.assertEqual(sum(month['revenue'] for month in revenue[:-2]), 0)
+
+    def test_stats_are_cached(self):
+        self.create_bookings(self.service, self.customer, date.today(), 2)
+        self.get_dashboard()
+
+        self.create_bookings(self.service, self.customer, date.today() - timedelta(days=1), 2)
+        with CaptureQueriesContext(connection) as queries:
+            context = self.get_dashboard().context
+
+        self.assertEqual(context['total_bookings'], 2)
+        self.assertFalse(any('SUM' in query['sql'] for query in queries))
+
+        cache.clear()
+        self.assertEqual(self.get_dashboard().context['total_bookings'], 4)
@@ -2,44 +2,30 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import Q
 from django.contrib.auth.models import User
 from functools import wraps
 from .models import UserProfile
+from .roles import ROLE_PROVIDER, ROLE_SUPERADMIN, get_role, role_label
 from .forms import UserRegistrationForm, ProviderRegistrationForm
-from bookings.models import Notification, Service, Booking
+from bookings.models import BookingDailyRollup, Notification, Service, Booking
+from bookings.featured import featured_services, popular_categories
+from bookings.feeds import calendar_feed_json
+from bookings.notifications import invalidate_unread_count, unread_count as unread_notification_count
+from bookings.transitions import BookingService, InvalidTransition
+from bookings.stats import BookingStats, RollupStats, load_top_services, platform_stats
 from datetime import datetime, timedelta, date
-import random
 
 # Create your views here.
 
 
 def home(request):
     """Home/landing page with featured services and categories"""
-    # Get 6 random featured services
-    all_services = list(Service.objects.filter(
-        is_active=True).select_related('provider'))
-    featured_services = random.sample(all_services, min(6, len(all_services)))
-
-    # Get popular categories with service counts
-    category_stats = Service.objects.filter(is_active=True).values('category').annotate(
-        count=Count('id')
-    ).order_by('-count')[:6]
-
-    # Get category display names
-    category_dict = dict(Service.CATEGORY_CHOICES)
-    popular_categories = [
-        {
-            'value': cat['category'],
-            'label': category_dict.get(cat['category'], cat['category']),
-            'count': cat['count']
-        }
-        for cat in category_stats
-    ]
-
     context = {
-        'featured_services': featured_services,
-        'popular_categories': popular_categories,
+        # 6 random featured services from a cached rotating pool
+        'featured_services': featured_services(),
+        # Popular categories with service counts
+        'popular_categories': popular_categories(),
     }
 
     return render(request, 'home.html', context)
@@ -79,34 +65,32 @@ def custom_login(request):
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
-            # Check if user has a profile
-            try:
-                user_profile = UserProfile.objects.get(user=user)
-
-                # Allow superadmin to login regardless of selected account type
-                if user_profile.user_type == 'superadmin':
-                    login(request, user)
-                    return redirect('superadmin_dashboard')
-
-                # Validate account type matches for regular users and providers
-                if user_profile.user_type != account_type:
-                    # Wrong account type selected
-                    if account_type == 'user':
-                        messages.error(
-                            request, 'You are not allowed to login with this panel. This account is registered as a Service Provider. Please select "Provider" to login.')
-                    else:
-                        messages.error(
-                            request, 'You are not allowed to login with this panel. This account is registered as a User. Please select "User" to login.')
-                    return redirect('login')
+            role = get_role(user)
 
-                # Account type matches - login successful
+            # No profile found - allow login anyway
+            if role is None:
                 login(request, user)
                 return redirect('dashboard')
 
-            except UserProfile.DoesNotExist:
-                # No profile found - allow login anyway
+            # Allow superadmin to login regardless of selected account type
+            if role == ROLE_SUPERADMIN:
                 login(request, user)
-                return redirect('dashboard')
+                return redirect('superadmin_dashboard')
+
+            # Validate account type matches for regular users and providers
+            if role != account_type:
+                # Wrong account type selected
+                if account_type == 'user':
+                    messages.error(
+                        request, 'You are not allowed to login with this panel. This account is registered as a Service Provider. Please select "Provider" to login.')
+                else:
+                    messages.error(
+                        request, 'You are not allowed to login with this panel. This account is registered as a User. Please select "User" to login.')
+                return redirect('login')
+
+            # Account type matches - login successful
+            login(request, user)
+            return redirect('dashboard')
         else:
             # Invalid credentials
             messages.error(request, 'Invalid username or password.')
@@ -190,20 +174,12 @@ def success(request):
 @login_required
 def dashboard(request):
     """User dashboard - only accessible when logged in"""
-    # Get the user's profile to display user type
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-        user_type = user_profile.get_user_type_display()
-        is_provider = user_profile.user_type == 'provider'
+    # Redirect superadmin to superadmin panel
+    if request.role == ROLE_SUPERADMIN:
+        return redirect('superadmin_dashboard')
 
-        # Redirect superadmin to superadmin panel
-        if user_profile.user_type == 'superadmin':
-            return redirect('superadmin_dashboard')
-
-    except UserProfile.DoesNotExist:
-        user_profile = None
-        user_type = "User"
-        is_provider = False
+    user_type = role_label(request.user)
+    is_provider = request.role == ROLE_PROVIDER
 
     # Handle booking actions (accept, reject, complete) from dashboard
     if request.method == "POST" and is_provider:
@@ -211,30 +187,28 @@ def dashboard(request):
         booking_id = request.POST.get("booking_id")
 
         try:
-            booking = Booking.objects.get(id=booking_id, provider=request.user)
+            booking = Booking.objects.select_related("customer").get(id=booking_id, provider=request.user)
+            bookings = BookingService(actor=request.user)
 
             if action == "accept":
-                booking.status = "confirmed"
-                booking.save()
+                bookings.confirm(booking)
                 messages.success(
                     request, f"Booking accepted for {booking.customer.username}")
 
             elif action == "reject":
-                booking.status = "cancelled"
-                booking.save()
-                # Make availability slot available again
-                booking.availability.is_available = True
-                booking.availability.save()
+                # Cancel and reopen the slots this booking blocked
+                bookings.cancel(booking)
                 messages.success(
                     request, f"Booking rejected for {booking.customer.username}")
 
             elif action == "complete":
-                booking.status = "completed"
-                booking.save()
+                bookings.complete(booking)
                 messages.success(request, f"Booking marked as completed")
 
         except Booking.DoesNotExist:
             messages.error(request, "Booking not found")
+        except InvalidTransition as e:
+            messages.error(request, str(e))
 
         return redirect("dashboard")
 
@@ -245,7 +219,6 @@ def dashboard(request):
         'email': request.user.email if request.user.email else 'Not provided',
         'date_joined': request.user.date_joined,
         'last_login': request.user.last_login,
-        'user_profile': user_profile,
         'is_provider': is_provider,
     }
 
@@ -254,101 +227,56 @@ def dashboard(request):
         # Get all bookings where this user is the provider
         provider_bookings = Booking.objects.filter(provider=request.user)
 
-        # Total bookings count
-        total_bookings = provider_bookings.count()
+        # Totals, per-status counts, revenue and hours from the daily rollups
+        first_day_of_month = datetime.now().replace(day=1).date()
+        stats = RollupStats(
+            BookingDailyRollup.objects.filter(provider=request.user), month_start=first_day_of_month
+        ).compute()
 
-        # Total money collected (from completed bookings)
-        total_revenue = provider_bookings.filter(
-            status='completed'
-        ).aggregate(total=Sum('price'))['total'] or 0
+        # Booking lists rendered by the template (with their service and customer)
+        listed_bookings = provider_bookings.select_related('service', 'customer')
 
         # Pending bookings (for sections - query sets)
-        pending_bookings_list = provider_bookings.filter(
+        pending_bookings_list = listed_bookings.filter(
             status='pending').order_by('date', 'start_time')
-        confirmed_bookings_list = provider_bookings.filter(
+        confirmed_bookings_list = listed_bookings.filter(
             status='confirmed').order_by('date', 'start_time')
 
-        # Counts for stats
-        pending_bookings = provider_bookings.filter(status='pending').count()
-        completed_bookings = provider_bookings.filter(
-            status='completed').count()
-
         # Upcoming bookings (confirmed or pending, date in future)
         today = datetime.now().date()
-        upcoming_bookings = provider_bookings.filter(
+        upcoming_bookings = listed_bookings.filter(
             Q(status='confirmed') | Q(status='pending'),
             date__gte=today
         ).order_by('date', 'start_time')[:5]
 
         # Recent bookings
-        recent_bookings = provider_bookings.order_by('-created_at')[:5]
+        recent_bookings = listed_bookings.order_by('-created_at')[:5]
 
         # Active services count
         active_services = Service.objects.filter(
             provider=request.user, is_active=True).count()
 
-        # This month's revenue
-        first_day_of_month = datetime.now().replace(day=1).date()
-        month_revenue = provider_bookings.filter(
-            status='completed',
-            date__gte=first_day_of_month
-        ).aggregate(total=Sum('price'))['total'] or 0
-
-        # Calculate total hours booked
-        total_hours = 0
-        for booking in provider_bookings.filter(Q(status='completed') | Q(status='confirmed')):
-            start_datetime = datetime.combine(booking.date, booking.start_time)
-            end_datetime = datetime.combine(booking.date, booking.end_time)
-            duration = (end_datetime - start_datetime).total_seconds() / 3600
-            total_hours += duration
-
         # Calendar data - get bookings grouped by date for calendar view
-        import calendar
-        import json
-
         # Get current month and year
         now = datetime.now()
         current_year = now.year
         current_month = now.month
 
-        # Get all bookings for the next 3 months for calendar
-        end_date = now + timedelta(days=90)
-        calendar_bookings = provider_bookings.filter(
-            date__gte=today,
-            date__lte=end_date
-        ).exclude(status='cancelled')
-
-        # Group bookings by date
-        bookings_by_date = {}
-        for booking in calendar_bookings:
-            date_str = booking.date.isoformat()
-            if date_str not in bookings_by_date:
-                bookings_by_date[date_str] = []
-            bookings_by_date[date_str].append({
-                'id': booking.id,
-                'service': booking.service.name,
-                'customer': booking.customer.get_full_name() or booking.customer.username,
-                'time': booking.start_time.strftime('%H:%M'),
-                'end_time': booking.end_time.strftime('%H:%M'),
-                'status': booking.status,
-                'price': str(booking.price)
-            })
-
-        # Convert to JSON for JavaScript
-        bookings_json = json.dumps(bookings_by_date)
+        # All bookings for the next 3 months, serialized for JavaScript
+        bookings_json = calendar_feed_json(request.user, today, (now + timedelta(days=90)).date())
 
         context.update({
-            'total_bookings': total_bookings,
-            'total_revenue': total_revenue,
-            'pending_bookings': pending_bookings,
+            'total_bookings': stats['total_bookings'],
+            'total_revenue': stats['total_revenue'],
+            'pending_bookings': stats['pending_bookings'],
             'pending_bookings_list': pending_bookings_list,
             'confirmed_bookings': confirmed_bookings_list,
-            'completed_bookings': completed_bookings,
+            'completed_bookings': stats['completed_bookings'],
             'upcoming_bookings': upcoming_bookings,
             'recent_bookings': recent_bookings,
             'active_services': active_services,
-            'month_revenue': month_revenue,
-            'total_hours': round(total_hours, 1),
+            'month_revenue': stats['month_revenue'],
+            'total_hours': stats['total_hours'],
             'current_year': current_year,
             'current_month': current_month,
             'bookings_json': bookings_json,
@@ -359,55 +287,38 @@ def dashboard(request):
         # Get all bookings where this user is the customer
         customer_bookings = Booking.objects.filter(customer=request.user)
 
-        # Total bookings count
-        total_bookings = customer_bookings.count()
+        # Totals, per-status counts, spend and hours in one query
+        stats = BookingStats(customer_bookings).compute()
+
+        # Booking lists rendered by the template (with their service and provider)
+        listed_bookings = customer_bookings.select_related('service', 'provider')
 
         # Upcoming bookings
         today = datetime.now().date()
-        upcoming_bookings = customer_bookings.filter(
+        upcoming_bookings = listed_bookings.filter(
             Q(status='confirmed') | Q(status='pending'),
             date__gte=today
         ).order_by('date', 'start_time')[:5]
 
         # Past bookings
-        past_bookings = customer_bookings.filter(
+        past_bookings = listed_bookings.filter(
             date__lt=today
         ).order_by('-date', '-start_time')[:5]
 
         # Last completed booking
-        last_booking = customer_bookings.filter(
+        last_booking = listed_bookings.filter(
             status='completed'
         ).order_by('-date', '-start_time').first()
 
-        # Completed bookings count
-        completed_bookings = customer_bookings.filter(
-            status='completed').count()
-
-        # Pending bookings count
-        pending_bookings = customer_bookings.filter(status='pending').count()
-
-        # Total money spent
-        total_spent = customer_bookings.filter(
-            status='completed'
-        ).aggregate(total=Sum('price'))['total'] or 0
-
-        # Calculate total hours booked
-        total_hours = 0
-        for booking in customer_bookings.filter(Q(status='completed') | Q(status='confirmed')):
-            start_datetime = datetime.combine(booking.date, booking.start_time)
-            end_datetime = datetime.combine(booking.date, booking.end_time)
-            duration = (end_datetime - start_datetime).total_seconds() / 3600
-            total_hours += duration
-
         context.update({
-            'total_bookings': total_bookings,
+            'total_bookings': stats['total_bookings'],
             'upcoming_bookings': upcoming_bookings,
             'past_bookings': past_bookings,
             'last_booking': last_booking,
-            'completed_bookings': completed_bookings,
-            'pending_bookings': pending_bookings,
-            'total_spent': total_spent,
-            'total_hours': round(total_hours, 1),
+            'completed_bookings': stats['completed_bookings'],
+            'pending_bookings': stats['pending_bookings'],
+            'total_spent': stats['total_revenue'],
+            'total_hours': stats['total_hours'],
         })
 
     return render(request, 'accounts/dashboard.html', context)
@@ -416,51 +327,17 @@ def dashboard(request):
 @login_required
 def booking_calendar(request):
     """Calendar view for providers to see their bookings"""
-    # Get the user's profile to check if provider
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-        is_provider = user_profile.user_type == 'provider'
-    except UserProfile.DoesNotExist:
-        is_provider = False
-
     # Only providers can access calendar
-    if not is_provider:
+    if request.role != ROLE_PROVIDER:
         messages.error(request, 'Only providers can access the calendar.')
         return redirect('dashboard')
 
-    # Get all bookings for this provider
-    provider_bookings = Booking.objects.filter(provider=request.user)
-
     # Get current month and year
     now = datetime.now()
     today = now.date()
 
-    # Get all bookings for the next 3 months for calendar
-    end_date = now + timedelta(days=90)
-    calendar_bookings = provider_bookings.filter(
-        date__gte=today,
-        date__lte=end_date
-    ).exclude(status='cancelled')
-
-    # Group bookings by date
-    bookings_by_date = {}
-    for booking in calendar_bookings:
-        date_str = booking.date.isoformat()
-        if date_str not in bookings_by_date:
-            bookings_by_date[date_str] = []
-        bookings_by_date[date_str].append({
-            'id': booking.id,
-            'service': booking.service.name,
-            'customer': booking.customer.get_full_name() or booking.customer.username,
-            'time': booking.start_time.strftime('%H:%M'),
-            'end_time': booking.end_time.strftime('%H:%M'),
-            'status': booking.status,
-            'price': str(booking.price)
-        })
-
-    # Convert to JSON for JavaScript
-    import json
-    bookings_json = json.dumps(bookings_by_date)
+    # All bookings for the next 3 months, serialized for JavaScript
+    bookings_json = calendar_feed_json(request.user, today, (now + timedelta(days=90)).date())
 
     context = {
         'bookings_json': bookings_json,
@@ -543,6 +420,7 @@ def notifications(request):
     # Mark all as read
     if request.GET.get('mark_all_read') == 'true':
         user_notifications.update(is_read=True)
+        invalidate_unread_count(request.user.id)
         messages.success(request, 'All notifications marked as read!')
         return redirect('notifications')
 
@@ -559,7 +437,7 @@ def notifications(request):
             pass
 
     # Statistics
-    unread_count = user_notifications.filter(is_read=False).count()
+    unread_count = unread_notification_count(request.user.id)
     total_count = user_notifications.count()
 
     context = {
@@ -581,15 +459,13 @@ def superadmin_required(view_func):
                 request, 'You must be logged in to access this page.')
             return redirect('login')
 
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-            if user_profile.user_type != 'superadmin':
-                messages.error(
-                    request, 'You do not have permission to access this page.')
-                return redirect('dashboard')
-        except UserProfile.DoesNotExist:
+        if request.role is None:
             messages.error(request, 'User profile not found.')
             return redirect('dashboard')
+        if request.role != ROLE_SUPERADMIN:
+            messages.error(
+                request, 'You do not have permission to access this page.')
+            return redirect('dashboard')
 
         return view_func(request, *args, **kwargs)
     return _wrapped_view
@@ -598,51 +474,15 @@ def superadmin_required(view_func):
 @superadmin_required
 def superadmin_dashboard(request):
     """Superadmin dashboard with analytics and statistics"""
-    # Get all statistics
-    total_users = User.objects.count()
-    total_providers = UserProfile.objects.filter(user_type='provider').count()
-    total_customers = UserProfile.objects.filter(user_type='user').count()
-    total_services = Service.objects.count()
-    active_services = Service.objects.filter(is_active=True).count()
-    total_bookings = Booking.objects.count()
-    pending_bookings = Booking.objects.filter(status='pending').count()
-    completed_bookings = Booking.objects.filter(status='completed').count()
-    total_revenue = Booking.objects.filter(
-        status='completed').aggregate(total=Sum('price'))['total'] or 0
-
-    # Calculate total hours booked across all providers
-    total_hours = 0
-    for booking in Booking.objects.filter(Q(status='completed') | Q(status='confirmed')):
-        start_datetime = datetime.combine(booking.date, booking.start_time)
-        end_datetime = datetime.combine(booking.date, booking.end_time)
-        duration = (end_datetime - start_datetime).total_seconds() / 3600
-        total_hours += duration
-
-    # Monthly revenue (last 6 months)
-    monthly_revenue = []
-    for i in range(5, -1, -1):
-        month_start = (datetime.now().replace(day=1) -
-                       timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)
-                     ).replace(day=1) - timedelta(days=1)
-        revenue = Booking.objects.filter(
-            status='completed',
-            date__gte=month_start.date(),
-            date__lte=month_end.date()
-        ).aggregate(total=Sum('price'))['total'] or 0
-        monthly_revenue.append({
-            'month': month_start.strftime('%b %Y'),
-            'revenue': float(revenue)
-        })
+    # Totals, revenue per month and top services, cached for a minute
+    stats = platform_stats()
 
     # Recent users
     recent_users = User.objects.select_related(
         'userprofile').order_by('-date_joined')[:5]
 
     # Top services by bookings
-    top_services = Service.objects.annotate(
-        booking_count=Count('bookings')
-    ).order_by('-booking_count')[:5]
+    top_services = load_top_services(stats['top_service_counts'])
 
     # Recent bookings
     recent_bookings = Booking.objects.select_related(
@@ -650,17 +490,17 @@ def superadmin_dashboard(request):
     ).order_by('-created_at')[:10]
 
     context = {
-        'total_users': total_users,
-        'total_providers': total_providers,
-        'total_customers': total_customers,
-        'total_services': total_services,
-        'active_services': active_services,
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'completed_bookings': completed_bookings,
-        'total_revenue': total_revenue,
-        'total_hours': round(total_hours, 1),
-        'monthly_revenue': monthly_revenue,
+        'total_users': stats['total_users'],
+        'total_providers': stats['total_providers'],
+        'total_customers': stats['total_customers'],
+        'total_services': stats['total_services'],
+        'active_services': stats['active_services'],
+        'total_bookings': stats['total_bookings'],
+        'pending_bookings': stats['pending_bookings'],
+        'completed_bookings': stats['completed_bookings'],
+        'total_revenue': stats['total_revenue'],
+        'total_hours': stats['total_hours'],
+        'monthly_revenue': stats['monthly_revenue'],
         'recent_users': recent_users,
         'top_services': top_services,
         'recent_bookings': recent_bookings,
@@ -821,6 +661,7 @@ def superadmin_notifications(request):
 
         # Bulk create notifications
         Notification.objects.bulk_create(notifications_to_create)
+        invalidate_unread_count(*(n.user_id for n in notifications_to_create))
 
         messages.success(
             request, f'Successfully sent notification to {len(notifications_to_create)} users!')
@@ -42,12 +42,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'accounts.middleware.SlidingSessionMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -55,7 +58,8 @@ ROOT_URLCONF = 'booking_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to QueryInstrumentationMiddleware
+        'BACKEND': 'accounts.template_backends.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -150,6 +154,51 @@ CSRF_TRUSTED_ORIGINS = [
     'http://localhost:8000',
 ]
 
+# Cache (per-user unread notification counters, ...)
+# Use a shared backend such as Redis or Memcached when running several processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'booking-system',
+    }
+}
+
+# Cache each user's role in their session (accounts/roles.py). A role change
+# reaches the other processes through the cache, so only enable this with a
+# shared cache backend or a single process such as the development server;
+# without it the role is looked up once per request.
+ROLE_SESSION_CACHE = DEBUG
+
 # Session Settings
+# SESSION_STRATEGY picks the session backend:
+#   'db'             - every session read hits django_session
+#   'cached_db'      - reads come from the cache, writes go through to the database
+#   'signed_cookies' - no server-side storage at all (keep sessions small)
+SESSION_STRATEGY = 'cached_db'
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STRATEGY]
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
+
+# Don't write the session on every request. SlidingSessionMiddleware keeps the
+# expiry sliding by re-saving only once less than SESSION_REFRESH_THRESHOLD
+# seconds of the session lifetime are left.
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_THRESHOLD = SESSION_COOKIE_AGE // 2
+
+# Search analytics (bookings/analytics.py): SearchQuery rows are buffered in
+# memory and written in batches by a background thread
+SEARCH_LOG_QUEUE_SIZE = 10000  # entries beyond this are dropped and counted
+SEARCH_LOG_BATCH_SIZE = 200
+SEARCH_LOG_FLUSH_INTERVAL = 5.0  # seconds
+SEARCH_LOG_BACKGROUND = True
+
+# Per-request SQL instrumentation (accounts.middleware.QueryInstrumentationMiddleware)
+QUERY_INSTRUMENTATION = True
+QUERY_TIMING_TOP = 3  # slowest statements listed in each request log entry
+SLOW_QUERY_THRESHOLD_MS = 100  # slower statements are logged with their EXPLAIN
+SLOW_REQUEST_QUERY_COUNT = 50  # requests with more queries are logged as warnings
+SERVER_TIMING = DEBUG  # send the numbers in a Server-Timing header
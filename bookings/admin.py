@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import OldProvider, ProviderProfile, Availability, Service, Notification, Booking
+from .models import OldProvider, ProviderProfile, Availability, AvailabilityRule, Service, Notification, Booking
+from .bulk import bulk_set_status
+from .notifications import invalidate_unread_count
 
 
 # NOTE: OldProvider model is DEPRECATED - Use ProviderProfile instead
@@ -19,7 +21,10 @@ class ProviderProfileAdmin(admin.ModelAdmin):
     list_filter = ['service_type', 'city', 'is_verified', 'is_active', 'created_at']
     search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name', 'business_name', 'phone_number', 'kvk_number']
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['user__provider_stats']
+    # ProviderStats, maintained by bookings/provider_stats.py
+    readonly_fields = ['total_bookings', 'completed_bookings', 'total_revenue', 'next_available_date',
+                       'created_at', 'updated_at']
 
     fieldsets = (
         ('User Account', {
@@ -38,7 +43,8 @@ class ProviderProfileAdmin(admin.ModelAdmin):
             'fields': ('phone_number', 'website')
         }),
         ('Experience & Stats', {
-            'fields': ('years_experience', 'rating', 'total_bookings')
+            'fields': ('years_experience', 'rating', 'total_bookings', 'completed_bookings', 'total_revenue',
+                       'next_available_date')
         }),
         ('Status', {
             'fields': ('is_verified', 'is_active')
@@ -54,6 +60,26 @@ class ProviderProfileAdmin(admin.ModelAdmin):
 
     actions = ['verify_providers', 'activate_providers', 'deactivate_providers']
 
+    def _stat(self, obj, field):
+        stats = obj.stats
+        return getattr(stats, field) if stats is not None else None
+
+    def total_bookings(self, obj):
+        return self._stat(obj, 'total_bookings') or 0
+    total_bookings.short_description = "Total bookings"
+
+    def completed_bookings(self, obj):
+        return self._stat(obj, 'completed_bookings') or 0
+    completed_bookings.short_description = "Completed bookings"
+
+    def total_revenue(self, obj):
+        return self._stat(obj, 'total_revenue') or 0
+    total_revenue.short_description = "Revenue"
+
+    def next_available_date(self, obj):
+        return self._stat(obj, 'next_available_date')
+    next_available_date.short_description = "Next available"
+
     def verify_providers(self, request, queryset):
         updated = queryset.update(is_verified=True)
         self.message_user(request, f'{updated} provider(s) marked as verified.')
@@ -78,6 +104,14 @@ class AvailabilityAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(AvailabilityRule)
+class AvailabilityRuleAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'service', 'get_weekdays_display', 'start_time', 'end_time', 'start_date', 'end_date']
+    list_filter = ['start_date', 'provider']
+    search_fields = ['provider__username', 'service__name']
+    list_select_related = ['provider', 'service']
+
+
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ['name', 'provider', 'category', 'price', 'duration', 'is_active', 'created_at']
@@ -97,12 +131,16 @@ class NotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read', 'mark_as_unread']
 
     def mark_as_read(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
         updated = queryset.update(is_read=True)
+        invalidate_unread_count(*user_ids)
         self.message_user(request, f'{updated} notification(s) marked as read.')
     mark_as_read.short_description = "Mark selected notifications as read"
 
     def mark_as_unread(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
         updated = queryset.update(is_read=False)
+        invalidate_unread_count(*user_ids)
         self.message_user(request, f'{updated} notification(s) marked as unread.')
     mark_as_unread.short_description = "Mark selected notifications as unread"
 
@@ -117,17 +155,18 @@ class BookingAdmin(admin.ModelAdmin):
 
     actions = ['mark_as_confirmed', 'mark_as_completed', 'mark_as_cancelled']
 
+    def _bulk_set_status(self, request, queryset, status):
+        result = bulk_set_status(queryset, status, actor=request.user)
+        self.message_user(request, f'Marked as {status}: {result}.')
+
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
-        self.message_user(request, f'{updated} booking(s) marked as confirmed.')
+        self._bulk_set_status(request, queryset, 'confirmed')
     mark_as_confirmed.short_description = "Mark selected bookings as confirmed"
 
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
-        self.message_user(request, f'{updated} booking(s) marked as completed.')
+        self._bulk_set_status(request, queryset, 'completed')
     mark_as_completed.short_description = "Mark selected bookings as completed"
 
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
-        self.message_user(request, f'{updated} booking(s) marked as cancelled.')
+        self._bulk_set_status(request, queryset, 'cancelled')
     mark_as_cancelled.short_description = "Mark selected bookings as cancelled"
@@ -0,0 +1,150 @@
+# bookings/analytics.py
+"""
+Buffered SearchQuery logging.
+
+search_services used to INSERT a SearchQuery row before rendering every
+search, putting a write (and on SQLite the database write lock) on the
+hottest read path. Searches are now queued in memory and written with
+bulk_create() by a background thread, once SEARCH_LOG_BATCH_SIZE entries
+are waiting or SEARCH_LOG_FLUSH_INTERVAL seconds have passed.
+
+The queue is bounded: when the writer falls behind, new entries are
+dropped and counted instead of slowing down the search. Failed writes are
+counted and logged, never raised. Rows get their created_at when they are
+flushed, so it can lag the search by up to the flush interval.
+
+With SEARCH_LOG_BACKGROUND = False (tests) no thread is started and the
+buffer is written inline once a batch is full, or on flush().
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .models import SearchQuery
+
+logger = logging.getLogger(__name__)
+
+
+class SearchLogBuffer:
+    """Bounded in-process queue of SearchQuery rows flushed in batches"""
+
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None, background=None):
+        # Unset options are read from settings when used, so override_settings works
+        self._options = {
+            'SEARCH_LOG_BATCH_SIZE': batch_size,
+            'SEARCH_LOG_FLUSH_INTERVAL': flush_interval,
+            'SEARCH_LOG_BACKGROUND': background,
+        }
+        self.max_size = max_size or getattr(settings, 'SEARCH_LOG_QUEUE_SIZE', 10000)
+
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _option(self, name):
+        value = self._options[name]
+        return getattr(settings, name) if value is None else value
+
+    @property
+    def batch_size(self):
+        return self._option('SEARCH_LOG_BATCH_SIZE')
+
+    @property
+    def flush_interval(self):
+        return self._option('SEARCH_LOG_FLUSH_INTERVAL')
+
+    @property
+    def background(self):
+        return self._option('SEARCH_LOG_BACKGROUND')
+
+    def log(self, **fields):
+        """Queue one SearchQuery; never blocks and never raises"""
+        try:
+            self._queue.put_nowait(SearchQuery(**fields))
+        except queue.Full:
+            self.dropped += 1
+            return
+        except Exception:
+            logger.exception('Could not queue search log entry')
+            self.failed += 1
+            return
+
+        if self._queue.qsize() >= self.batch_size:
+            if self.background:
+                self._wakeup.set()
+            else:
+                self.flush()
+        if self.background:
+            self._ensure_thread()
+
+    def flush(self):
+        """Write everything queued so far, returns the number of rows written"""
+        with self._flush_lock:
+            written = 0
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    return written
+                try:
+                    SearchQuery.objects.bulk_create(batch)
+                except Exception:
+                    logger.exception('Dropped %d search log entries', len(batch))
+                    self.failed += len(batch)
+                else:
+                    self.written += len(batch)
+                    written += len(batch)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _take(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='search-log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # The thread has its own database connection, don't keep it open between flushes
+                connection.close()
+
+
+search_log = SearchLogBuffer()
+
+
+def log_search(**fields):
+    """Queue a SearchQuery row on the shared buffer"""
+    search_log.log(**fields)
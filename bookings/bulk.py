@@ -0,0 +1,88 @@
+# bookings/bulk.py
+"""
+Chunked booking status changes for the admin actions.
+
+A plain queryset.update(status=...) skipped everything that normally
+happens when a booking changes status: cancelled bookings kept their
+slots closed and customers were never told. bulk_set_status() walks the
+selection in primary-key chunks and moves each chunk with one
+BookingService.apply() call (see bookings/transitions.py), one
+transaction per chunk. Rollups, slots and notifications are handled
+there in bulk, with a constant number of queries per chunk.
+
+The admin actions are used to correct bookings, so they may set any
+status; the transition rules of the views are not enforced.
+
+A failure only rolls back the chunk it happened in; earlier chunks stay
+committed and are reported.
+"""
+import logging
+import time as timer
+
+from .models import Booking
+from .transitions import BookingService, InvalidTransition
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 500
+
+# Attempts per chunk when other requests change its bookings concurrently
+CONFLICT_RETRIES = 3
+
+
+class BulkResult:
+    """Counters of one bulk_set_status() run"""
+
+    def __init__(self):
+        self.updated = 0
+        self.reopened = 0
+        self.closed = 0
+        self.notified = 0
+        self.chunks = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return (f'{self.updated} booking(s) updated in {self.chunks} chunk(s), '
+                f'{self.reopened} slot(s) reopened, {self.closed} slot(s) closed, '
+                f'{self.notified} notification(s) sent in {self.seconds:.2f}s')
+
+
+def bulk_set_status(bookings, status, chunk_size=BULK_CHUNK_SIZE, progress=None, actor=None):
+    """
+    Move the bookings in a queryset to `status`.
+
+    progress, when given, is called after each chunk with the running
+    BulkResult so callers can report how far a long run got. actor is the
+    user making the change, passed on to the transition hooks.
+    """
+    service = BookingService(actor=actor, enforce=False)
+    result = BulkResult()
+    started = timer.perf_counter()
+    last_id = 0
+
+    while True:
+        ids = list(bookings.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        for attempt in range(1, CONFLICT_RETRIES + 1):
+            try:
+                chunk = service.apply(Booking.objects.filter(id__in=ids), status)
+                break
+            except InvalidTransition:
+                if attempt == CONFLICT_RETRIES:
+                    raise
+        result.updated += len(chunk)
+        result.reopened += chunk.reopened
+        result.closed += chunk.closed
+        result.notified += sum(1 for change in chunk.changes if change.customer_id != getattr(actor, 'id', None))
+
+        result.chunks += 1
+        result.seconds = timer.perf_counter() - started
+        logger.info('bulk_set_status(%s): chunk %d, %s', status, result.chunks, result)
+        if progress is not None:
+            progress(result)
+
+    result.seconds = timer.perf_counter() - started
+    return result
@@ -0,0 +1,290 @@
+# bookings/datagen.py
+"""
+Seeded synthetic data for development and load testing.
+
+The seeding commands used to create rows one save() at a time with the
+global random module, and generate_availability emptied the Availability
+table first (taking every booking with it through the cascade). The
+helpers here only ever add rows, write them with bulk_create in batches
+and draw from a random.Random(seed), so the same arguments always build
+the same dataset:
+
+    create_providers()    providers with profiles and services, from dicts
+    generate_slots()      open slots for services over a range of days
+    generate_load_data()  a whole synthetic marketplace: providers,
+                          services, customers, slots and bookings
+
+bulk_create skips model signals, so the ProviderProfile rows, search index
+entries and booking rollups and counters the signals would add are written
+here explicitly, and the providers' next available dates are refreshed
+once the slots are in. Bookings point at their slot, which needs
+bulk_create to set primary keys (PostgreSQL, or SQLite 3.35+).
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import UserProfile
+
+from .models import Availability, Booking, ProviderProfile, Service
+from .provider_stats import refresh_next_available_dates
+from .scheduling import from_minutes
+from .rollups import record_bookings
+from .search import get_backend as get_search_backend
+
+BATCH_SIZE = 5000
+DEFAULT_PASSWORD = 'testpass123'
+
+# category -> (first hour, closing hour) of a working day
+WORKING_HOURS = {
+    'salon_beauty': (9, 18),
+    'health_wellness': (9, 18),
+    'fitness': (8, 20),
+    'education': (8, 20),
+}
+DEFAULT_WORKING_HOURS = (10, 17)
+
+# Share of days a service has no slots at all
+DAYS_OFF_RATE = 0.2
+
+# Generated booking statuses and their weights
+BOOKING_STATUS_WEIGHTS = {'pending': 15, 'confirmed': 45, 'completed': 30, 'cancelled': 10}
+
+SERVICE_NAMES = {
+    'salon_beauty': ['Haircut & Style', 'Hair Coloring', 'Manicure', 'Facial Treatment', 'Beard Trim'],
+    'health_wellness': ['Sports Massage', 'Physiotherapy', 'Acupuncture', 'Nutrition Advice', 'Yoga Therapy'],
+    'education': ['Math Tutoring', 'English Lessons', 'Piano Lessons', 'Exam Preparation', 'Coding for Kids'],
+    'home_services': ['Plumbing Repair', 'House Cleaning', 'Garden Maintenance', 'Electrical Repair', 'Painting'],
+    'fitness': ['Personal Training', 'Boxing Class', 'Swimming Lessons', 'Pilates', 'Running Coaching'],
+    'technology': ['Laptop Repair', 'Website Setup', 'Network Installation', 'Data Recovery', 'IT Support'],
+    'business': ['Tax Advice', 'Business Coaching', 'Bookkeeping', 'Marketing Strategy', 'Legal Consultation'],
+    'other': ['Pet Sitting', 'Photography', 'Event Planning', 'Moving Help', 'Translation'],
+}
+FIRST_NAMES = ['Anna', 'Bram', 'Chloe', 'Daan', 'Emma', 'Finn', 'Hanna', 'Jesse', 'Lisa', 'Milan',
+               'Noor', 'Olivia', 'Ruben', 'Sara', 'Thijs', 'Yara']
+LAST_NAMES = ['de Jong', 'Jansen', 'de Vries', 'van Dijk', 'Bakker', 'Visser', 'Smit', 'Meijer',
+              'de Boer', 'Mulder', 'Bos', 'Vos']
+CITIES = ['Amsterdam', 'Rotterdam', 'Utrecht', 'The Hague', 'Eindhoven', 'Groningen']
+DURATIONS = [30, 60, 60, 60, 90, 120]
+
+
+def working_hours(category):
+    return WORKING_HOURS.get(category, DEFAULT_WORKING_HOURS)
+
+
+def day_slot_times(category, duration):
+    """(start, end) times of the back-to-back slots of a working day"""
+    first_hour, closing_hour = working_hours(category)
+    return [
+        (from_minutes(start), from_minutes(start + duration))
+        for start in range(first_hour * 60, closing_hour * 60 - duration + 1, duration)
+    ]
+
+
+def create_providers(provider_data, password=DEFAULT_PASSWORD, rng=None, batch_size=BATCH_SIZE):
+    """
+    Create providers from dicts shaped like the create_providers fixtures
+    (username, email, first_name, last_name, city, bio, service_type, kvk and
+    a list of services). Usernames that already exist are skipped.
+    Returns the created users.
+    """
+    rng = rng or random.Random()
+    taken = set(User.objects.filter(
+        username__in=[data['username'] for data in provider_data]
+    ).values_list('username', flat=True))
+    provider_data = [data for data in provider_data if data['username'] not in taken]
+    if not provider_data:
+        return []
+
+    hashed_password = make_password(password)
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(username=data['username'], email=data.get('email', ''), password=hashed_password,
+                 first_name=data.get('first_name', ''), last_name=data.get('last_name', ''))
+            for data in provider_data
+        ], batch_size=batch_size)
+
+        profiles = []
+        provider_profiles = []
+        services = []
+        for user, data in zip(users, provider_data):
+            phone_number = f'+31 6 {rng.randint(10000000, 99999999)}'
+            profiles.append(UserProfile(
+                user=user, user_type='provider', phone_number=phone_number, city=data.get('city'),
+                bio=data.get('bio'), service_type=data.get('service_type'), kvk_number=data.get('kvk'),
+            ))
+            # What the UserProfile post_save signal would have created
+            provider_profiles.append(ProviderProfile(
+                user=user, service_type=data.get('service_type') or 'other',
+                bio=data.get('bio') or f'Services provided by {user.username}',
+                city=data.get('city') or 'Not specified', phone_number=phone_number,
+                kvk_number=data.get('kvk') or '', is_active=True,
+            ))
+            services.extend(
+                Service(provider=user, name=service['name'], category=service['category'],
+                        description=service['description'], price=Decimal(service['price']),
+                        duration=service['duration'], is_active=True)
+                for service in data['services']
+            )
+
+        UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+        ProviderProfile.objects.bulk_create(provider_profiles, batch_size=batch_size)
+        services = Service.objects.bulk_create(services, batch_size=batch_size)
+        get_search_backend().index_services([service.id for service in services])
+    return users
+
+
+def existing_slot_keys(services, start, end):
+    """(service id, date, start time) of the slots the services already have in [start, end)"""
+    return set(Availability.objects.filter(
+        service__in=services, date__gte=start, date__lt=end
+    ).values_list('service_id', 'date', 'start_time'))
+
+
+def generate_slots(services, start, days, rng=None, days_off_rate=DAYS_OFF_RATE, skip=()):
+    """
+    Yield unsaved open slots for each service on `days` days from `start`,
+    leaving out a random share of days off and the (service id, date, start
+    time) keys in `skip`.
+    """
+    rng = rng or random.Random()
+    for service in services:
+        slot_times = day_slot_times(service.category, service.duration)
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            if rng.random() < days_off_rate:
+                continue
+            for start_time, end_time in slot_times:
+                if (service.id, day, start_time) in skip:
+                    continue
+                yield Availability(provider_id=service.provider_id, service=service, date=day,
+                                   start_time=start_time, end_time=end_time, is_available=True)
+
+
+def booking_for(slot, customer_id, status):
+    """Unsaved booking of a slot, priced at the slot's service price"""
+    return Booking(
+        customer_id=customer_id, provider_id=slot.provider_id, service=slot.service,
+        availability=slot, date=slot.date, start_time=slot.start_time, end_time=slot.end_time,
+        price=slot.service.price, status=status,
+    )
+
+
+def synthetic_providers(count, services_per_provider, prefix, rng):
+    """create_providers() dicts for `count` made-up providers"""
+    categories = list(SERVICE_NAMES)
+    for number in range(count):
+        category = rng.choice(categories)
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        names = rng.sample(SERVICE_NAMES[category], min(services_per_provider, len(SERVICE_NAMES[category])))
+        while len(names) < services_per_provider:
+            names.append(f'{rng.choice(SERVICE_NAMES[category])} {len(names) + 1}')
+        yield {
+            'username': f'{prefix}_provider_{number}',
+            'email': f'{prefix}_provider_{number}@example.com',
+            'first_name': first_name,
+            'last_name': last_name,
+            'city': rng.choice(CITIES),
+            'bio': f'{first_name} {last_name} offers {category.replace("_", " ")} services.',
+            'service_type': category,
+            'kvk': f'{rng.randint(10000000, 99999999)}',
+            'services': [
+                {'name': name, 'category': category, 'description': f'{name} by {first_name}',
+                 'price': f'{rng.randrange(20, 200)}.00', 'duration': rng.choice(DURATIONS)}
+                for name in names
+            ],
+        }
+
+
+def generate_load_data(providers=100, services_per_provider=3, customers=1000, days=30,
+                       booking_density=0.4, seed=0, start=None, prefix='load',
+                       batch_size=BATCH_SIZE, progress=None):
+    """
+    Build a synthetic dataset next to the existing data. Usernames start
+    with `prefix`, so a dataset can be told apart and deleted again.
+
+    booking_density is the share of generated slots that get a booking.
+    progress, when given, is called with the running counters after each
+    batch of slots. Returns the counters.
+    """
+    rng = random.Random(seed)
+    start = start or date.today()
+    counts = {'providers': 0, 'services': 0, 'customers': 0, 'slots': 0, 'bookings': 0}
+
+    specs = list(synthetic_providers(providers, services_per_provider, prefix, rng))
+    provider_users = []
+    for index in range(0, len(specs), batch_size):
+        provider_users.extend(create_providers(specs[index:index + batch_size], rng=rng, batch_size=batch_size))
+    counts['providers'] = len(provider_users)
+
+    hashed_password = make_password(DEFAULT_PASSWORD)
+    customer_ids = []
+    for index in range(0, customers, batch_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}_customer_{number}', password=hashed_password,
+                     first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+                for number in range(index, min(index + batch_size, customers))
+            ])
+            UserProfile.objects.bulk_create([UserProfile(user=user, user_type='user') for user in users])
+        customer_ids.extend(user.id for user in users)
+    counts['customers'] = len(customer_ids)
+
+    services = list(Service.objects.filter(provider__in=provider_users).order_by('id'))
+    counts['services'] = len(services)
+
+    statuses = list(BOOKING_STATUS_WEIGHTS)
+    weights = list(BOOKING_STATUS_WEIGHTS.values())
+    batch = []
+
+    def flush():
+        """Write a batch of (slot, booking status or None) pairs"""
+        with transaction.atomic():
+            slots = Availability.objects.bulk_create([slot for slot, _ in batch])
+            bookings = Booking.objects.bulk_create([
+                booking_for(slot, rng.choice(customer_ids), status)
+                for slot, (_, status) in zip(slots, batch) if status is not None
+            ])
+            record_bookings(bookings)
+        counts['slots'] += len(slots)
+        counts['bookings'] += len(bookings)
+        batch.clear()
+        if progress is not None:
+            progress(counts)
+
+    for slot in generate_slots(services, start, days, rng):
+        status = None
+        if customer_ids and rng.random() < booking_density:
+            status = rng.choices(statuses, weights)[0]
+            # Cancelled bookings release their slot
+            slot.is_available = status == 'cancelled'
+        batch.append((slot, status))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    refresh_next_available_dates(user.id for user in provider_users)
+    return counts
+
+
+def delete_load_data(prefix):
+    """Delete a generated dataset: its users and, by cascade, everything they own"""
+    users = User.objects.filter(
+        Q(username__startswith=f'{prefix}_provider_') | Q(username__startswith=f'{prefix}_customer_')
+    )
+    with transaction.atomic():
+        # Skip the per-booking post_delete signals of delete(): they would
+        # update rollup and ProviderStats rows of the dataset's providers,
+        # which the cascade below removes anyway. Nothing references a
+        # Booking, so one DELETE through the private _raw_delete() is safe.
+        # Bookings of the dataset's customers with other providers still
+        # go through the cascade and its signals.
+        bookings = Booking.objects.filter(provider__in=users)
+        deleted = bookings._raw_delete(bookings.db)
+        total, per_model = users.delete()
+    return total + deleted, per_model
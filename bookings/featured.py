@@ -0,0 +1,84 @@
+# bookings/featured.py
+"""
+Featured services and popular categories for the landing page.
+
+The home page used to load every active service into memory to
+random.sample() six of them. Now a small pool of random service ids is
+picked with indexed primary-key seeks (a random id in the id range, then
+the first active service at or after it) and kept in the cache for a few
+minutes. Each page view samples from that pool and loads only the
+services it shows, so the work per request does not grow with the
+catalog. The category counts are cached for the same reason.
+"""
+import random
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min
+
+from .models import Service
+
+FEATURED_COUNT = 6
+FEATURED_POOL_SIZE = 30
+FEATURED_POOL_TIMEOUT = 5 * 60  # seconds, the pool rotates this often
+FEATURED_POOL_CACHE_KEY = 'featured:pool'
+
+POPULAR_CATEGORY_COUNT = 6
+POPULAR_CATEGORIES_TIMEOUT = 5 * 60  # seconds
+POPULAR_CATEGORIES_CACHE_KEY = 'featured:categories'
+
+
+def build_featured_pool(size=FEATURED_POOL_SIZE):
+    """Pick up to `size` random active service ids with primary-key seeks"""
+    active = Service.objects.filter(is_active=True)
+    bounds = active.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+
+    pool = set()
+    for pivot in random.sample(range(bounds['low'], bounds['high'] + 1),
+                               min(size, bounds['high'] - bounds['low'] + 1)):
+        service_id = active.filter(id__gte=pivot).order_by('id').values_list('id', flat=True).first()
+        if service_id is not None:
+            pool.add(service_id)
+    return sorted(pool)
+
+
+def featured_pool():
+    pool = cache.get(FEATURED_POOL_CACHE_KEY)
+    if pool is None:
+        pool = build_featured_pool()
+        cache.set(FEATURED_POOL_CACHE_KEY, pool, FEATURED_POOL_TIMEOUT)
+    return pool
+
+
+def featured_services(count=FEATURED_COUNT):
+    """Up to `count` random active services with their providers"""
+    pool = featured_pool()
+    picked = random.sample(pool, min(count, len(pool)))
+    services = list(Service.objects.filter(
+        id__in=picked, is_active=True).select_related('provider'))
+    random.shuffle(services)
+    return services
+
+
+def popular_categories(count=POPULAR_CATEGORY_COUNT):
+    """The categories with the most active services, as dicts for the template"""
+    categories = cache.get(POPULAR_CATEGORIES_CACHE_KEY)
+    if categories is None:
+        # Get popular categories with service counts
+        category_stats = Service.objects.filter(is_active=True).values('category').annotate(
+            count=Count('id')
+        ).order_by('-count')[:count]
+
+        # Get category display names
+        category_dict = dict(Service.CATEGORY_CHOICES)
+        categories = [
+            {
+                'value': cat['category'],
+                'label': category_dict.get(cat['category'], cat['category']),
+                'count': cat['count']
+            }
+            for cat in category_stats
+        ]
+        cache.set(POPULAR_CATEGORIES_CACHE_KEY, categories, POPULAR_CATEGORIES_TIMEOUT)
+    return categories
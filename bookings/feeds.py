@@ -0,0 +1,45 @@
+# bookings/feeds.py
+"""
+Booking feeds serialized for the JavaScript calendars.
+
+The feed is built from a single values() query so no Booking, Service or
+User model instances are created, and no related rows are fetched lazily.
+"""
+import json
+
+from .models import Booking
+
+FEED_FIELDS = (
+    'id', 'date', 'start_time', 'end_time', 'status', 'price',
+    'service__name', 'customer__username', 'customer__first_name', 'customer__last_name',
+)
+
+
+def calendar_feed(provider, start_date, end_date):
+    """Return the provider's non-cancelled bookings grouped by ISO date"""
+    rows = Booking.objects.filter(
+        provider=provider,
+        date__gte=start_date,
+        date__lte=end_date
+    ).exclude(status='cancelled').order_by('date', 'start_time').values_list(*FEED_FIELDS)
+
+    bookings_by_date = {}
+    for (booking_id, day, start_time, end_time, status, price,
+         service_name, username, first_name, last_name) in rows:
+        # Same result as User.get_full_name() or username
+        full_name = f"{first_name} {last_name}".strip()
+        bookings_by_date.setdefault(day.isoformat(), []).append({
+            'id': booking_id,
+            'service': service_name,
+            'customer': full_name or username,
+            'time': start_time.strftime('%H:%M'),
+            'end_time': end_time.strftime('%H:%M'),
+            'status': status,
+            'price': str(price)
+        })
+    return bookings_by_date
+
+
+def calendar_feed_json(provider, start_date, end_date):
+    """calendar_feed() as the JSON string the calendar templates expect"""
+    return json.dumps(calendar_feed(provider, start_date, end_date))
@@ -1,61 +1,76 @@
 # Simple Django Management Command to Add Mock Providers
 from django.core.management.base import BaseCommand
-from bookings.models import Provider
+from bookings.datagen import create_providers
+import random
+
+MOCK_PROVIDERS = [
+    # Mock Provider 1 - Jake's Plumbing
+    {
+        'username': 'jakes_plumbing',
+        'email': 'jake@example.com',
+        'first_name': 'Jake',
+        'last_name': '',
+        'city': 'Amsterdam',
+        'bio': "A desendentiel plumber, handout capritism. Gascad bapponing duueccetenced cogators in Amsterdam.",
+        'service_type': 'home_services',
+        'services': [
+            {'name': "Jake's Plumbing", 'category': 'home_services', 'price': '65.00', 'duration': 60,
+             'description': 'Plumbing repairs and installations'},
+        ]
+    },
+    # Mock Provider 2 - Laura's Salon
+    {
+        'username': 'lauras_salon',
+        'email': 'laura@example.com',
+        'first_name': 'Laura',
+        'last_name': '',
+        'city': 'Rotterdam',
+        'bio': "Eqpey copIiare to ookyling with wrodessiewes hoibe ouembenies cureatected noti bants in notilication.",
+        'service_type': 'salon_beauty',
+        'services': [
+            {'name': "Laura's Salon", 'category': 'salon_beauty', 'price': '45.00', 'duration': 60,
+             'description': 'Haircuts, styling and coloring'},
+        ]
+    },
+    # Mock Provider 3 - Mike's Therapy
+    {
+        'username': 'mikes_therapy',
+        'email': 'mike@example.com',
+        'first_name': 'Mike',
+        'last_name': '',
+        'city': 'Rotterdam',
+        'bio': "Hiacgy captiare to nape profiersented porfessional therapy services in Rottiroziant Ltors receriency.",
+        'service_type': 'health_wellness',
+        'services': [
+            {'name': "Mike's Therapy", 'category': 'health_wellness', 'price': '80.00', 'duration': 60,
+             'description': 'Professional therapy sessions'},
+        ]
+    },
+    # Mock Provider 4 - Anna's Cleaning
+    {
+        'username': 'annas_cleaning',
+        'email': 'anna@example.com',
+        'first_name': 'Anna',
+        'last_name': '',
+        'city': 'Utrecht',
+        'bio': "Professional cleaning services for homes and offices. Reliable, thorough, and eco-friendly cleaning solutions.",
+        'service_type': 'home_services',
+        'services': [
+            {'name': "Anna's Cleaning", 'category': 'home_services', 'price': '35.00', 'duration': 120,
+             'description': 'Home and office cleaning'},
+        ]
+    },
+]
 
 
 class Command(BaseCommand):
     help = 'Add mock service providers to database'
 
-    def handle(self, *args, **kwargs):
-        # Clear existing providers
-        Provider.objects.all().delete()
-
-        # Mock Provider 1 - Jake's Plumbing
-        Provider.objects.create(
-            name="Jake's Plumbing",
-            service_type='plumbing',
-            location='amsterdam',
-            rating=4.8,
-            years_experience=5,
-            completed_jobs=120,
-            description="A desendentiel plumber, handout capritism. Gascad bapponing duueccetenced cogators in Amsterdam.",
-            image_url="https://ui-avatars.com/api/?name=Jake&background=667eea&color=fff&size=200"
-        )
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for the generated phone numbers')
 
-        # Mock Provider 2 - Laura's Salon
-        Provider.objects.create(
-            name="Laura's Salon",
-            service_type='salon',
-            location='rotterdam',
-            rating=4.9,
-            years_experience=8,
-            completed_jobs=300,
-            description="Eqpey copIiare to ookyling with wrodessiewes hoibe ouembenies cureatected noti bants in notilication.",
-            image_url="https://ui-avatars.com/api/?name=Laura&background=f093fb&color=fff&size=200"
-        )
-
-        # Mock Provider 3 - Mike's Therapy
-        Provider.objects.create(
-            name="Mike's Therapy",
-            service_type='therapy',
-            location='rotterdam',
-            rating=4.7,
-            years_experience=10,
-            completed_jobs=250,
-            description="Hiacgy captiare to nape profiersented porfessional therapy services in Rottiroziant Ltors receriency.",
-            image_url="https://ui-avatars.com/api/?name=Mike&background=4facfe&color=fff&size=200"
-        )
-
-        # Mock Provider 4 - Anna's Cleaning
-        Provider.objects.create(
-            name="Anna's Cleaning",
-            service_type='cleaning',
-            location='utrecht',
-            rating=4.6,
-            years_experience=3,
-            completed_jobs=80,
-            description="Professional cleaning services for homes and offices. Reliable, thorough, and eco-friendly cleaning solutions.",
-            image_url="https://ui-avatars.com/api/?name=Anna&background=28a745&color=fff&size=200"
-        )
+    def handle(self, *args, **kwargs):
+        # Existing mock providers are kept, only missing ones are added
+        users = create_providers(MOCK_PROVIDERS, password='provider123', rng=random.Random(kwargs['seed']))
 
-        self.stdout.write(self.style.SUCCESS('Successfully added 4 mock providers!'))
+        self.stdout.write(self.style.SUCCESS(f'Successfully added {len(users)} mock providers!'))
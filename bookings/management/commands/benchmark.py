@@ -0,0 +1,68 @@
+"""
+Management command to run the micro-benchmarks in bookings/benchmarks.py.
+
+Examples:
+    python manage.py benchmark slot_index
+    python manage.py benchmark slot_index --sizes 200 500 --json
+    python manage.py benchmark sessions --sizes 500 --repeat 3
+    python manage.py benchmark search --sizes 100000
+    python manage.py benchmark views --sizes 10 50 200 --output before.json
+    python manage.py benchmark views --sizes 10 50 200 --compare before.json
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.benchmarks import BENCHMARKS, compare_results
+
+
+class Command(BaseCommand):
+    help = 'Runs a booking micro-benchmark and prints the timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS), help='Benchmark to run')
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            help='Dataset sizes to run the benchmark with')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per measurement (the fastest run is kept)')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON instead of a table')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='JSON results of an earlier run; report the regressions against it')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Growth that counts as a regression with --compare (default 0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Cannot read {options["compare"]}: {error}')
+
+        kwargs = {'repeat': options['repeat']}
+        if options['sizes']:
+            kwargs['sizes'] = options['sizes']
+
+        results = BENCHMARKS[options['name']](**kwargs)
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(results, output_file, indent=2, sort_keys=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for row in results:
+                self.stdout.write(', '.join(f'{key}={value}' for key, value in row.items()))
+
+        if baseline is not None:
+            regressions = compare_results(baseline, results, options['threshold'])
+            for row, metric, old, new in regressions:
+                label = row.get('view') or row.get('strategy') or row.get('backend') or row['benchmark']
+                self.stderr.write(self.style.ERROR(f'Regression: {label} {metric} {old} -> {new}'))
+            if not regressions:
+                self.stderr.write(self.style.SUCCESS('No regressions against the baseline'))
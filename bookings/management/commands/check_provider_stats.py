@@ -0,0 +1,53 @@
+"""
+Management command to check the precomputed ProviderStats against the
+bookings and slots, and with --fix repair the drifted ones.
+
+Counters drift when bookings are written around the ORM (raw SQL, imports,
+admin bulk deletes), and next_available_date goes stale as days pass, so
+this is meant to run daily. Users are checked in chunks, with two grouped
+queries and at most one bulk INSERT and one bulk UPDATE per chunk.
+"""
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from bookings.provider_stats import PROVIDER_BATCH_SIZE, reconcile_provider_stats
+
+
+class Command(BaseCommand):
+    help = 'Checks (and with --fix repairs) the precomputed provider stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Write the expected stats of the drifted providers')
+        parser.add_argument('--batch-size', type=int, default=PROVIDER_BATCH_SIZE,
+                            help=f'Users per chunk (default {PROVIDER_BATCH_SIZE})')
+        parser.add_argument('--show-drift', action='store_true',
+                            help='List every drifted field of every provider')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def report(checked, drifted):
+            self.stdout.write(f'  {checked} users checked, {drifted} drifted')
+
+        drifted = reconcile_provider_stats(fix=options['fix'], batch_size=max(options['batch_size'], 1),
+                                           progress=report)
+
+        if options['show_drift']:
+            usernames = dict(User.objects.filter(
+                id__in=[provider_id for provider_id, _ in drifted]).values_list('id', 'username'))
+            for provider_id, differences in drifted:
+                for field, (stored, expected) in differences.items():
+                    self.stdout.write(f'  {usernames.get(provider_id)}: {field} {stored} -> {expected}')
+
+        elapsed = time.perf_counter() - started
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f'All provider stats are up to date ({elapsed:.2f}s)'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed the stats of {len(drifted)} providers in {elapsed:.2f}s'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'The stats of {len(drifted)} providers drifted; run with --fix to repair them'))
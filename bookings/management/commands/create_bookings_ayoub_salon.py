@@ -201,8 +201,7 @@ class Command(BaseCommand):
                             provider=provider_user,
                             service=service,
                             date=current_date,
-                            start_time=current_slot_start,
-                            end_time=current_slot_end
+                            start_time=current_slot_start
                         ).exists()
 
                         if not exists:
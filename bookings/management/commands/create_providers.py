@@ -1,14 +1,15 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from accounts.models import UserProfile
-from bookings.models import Service
-from decimal import Decimal
+from bookings.datagen import create_providers
 import random
 
 
 class Command(BaseCommand):
     help = 'Create 30 service providers with their services'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for the generated phone numbers')
+
     def handle(self, *args, **kwargs):
         self.stdout.write('Creating 30 service providers with services...')
 
@@ -466,51 +467,18 @@ class Command(BaseCommand):
             },
         ]
 
-        created_count = 0
-        for provider_data in providers_data:
-            try:
-                # Check if user already exists
-                if User.objects.filter(username=provider_data['username']).exists():
-                    self.stdout.write(self.style.WARNING(f"User {provider_data['username']} already exists, skipping..."))
-                    continue
-
-                # Create user
-                user = User.objects.create_user(
-                    username=provider_data['username'],
-                    email=provider_data['email'],
-                    password='provider123',  # Default password for all providers
-                    first_name=provider_data['first_name'],
-                    last_name=provider_data['last_name']
-                )
-
-                # Create user profile
-                UserProfile.objects.create(
-                    user=user,
-                    user_type='provider',
-                    phone_number=f'+31 6 {random.randint(10000000, 99999999)}',
-                    city=provider_data['city'],
-                    bio=provider_data['bio'],
-                    service_type=provider_data['service_type'],
-                    kvk_number=provider_data['kvk']
-                )
-
-                # Create services
-                for service_data in provider_data['services']:
-                    Service.objects.create(
-                        provider=user,
-                        name=service_data['name'],
-                        category=service_data['category'],
-                        description=service_data['description'],
-                        price=Decimal(service_data['price']),
-                        duration=service_data['duration'],
-                        is_active=True
-                    )
-
-                created_count += 1
-                self.stdout.write(self.style.SUCCESS(f"Created provider: {provider_data['username']} with {len(provider_data['services'])} services"))
+        taken = set(User.objects.filter(
+            username__in=[data['username'] for data in providers_data]
+        ).values_list('username', flat=True))
+        for username in sorted(taken):
+            self.stdout.write(self.style.WARNING(f"User {username} already exists, skipping..."))
 
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error creating {provider_data['username']}: {str(e)}"))
+        # All providers, profiles and services in a few bulk inserts
+        users = create_providers(providers_data, password='provider123', rng=random.Random(kwargs['seed']))
+        services_per_user = {data['username']: len(data['services']) for data in providers_data}
+        for user in users:
+            self.stdout.write(self.style.SUCCESS(f"Created provider: {user.username} with {services_per_user[user.username]} services"))
+        created_count = len(users)
 
         self.stdout.write(self.style.SUCCESS(f'\nSuccessfully created {created_count} providers!'))
         self.stdout.write(self.style.SUCCESS('All providers have password: provider123'))
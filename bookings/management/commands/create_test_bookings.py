@@ -5,7 +5,10 @@ This creates 25+ availability slots and bookings to test the system thoroughly.
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from bookings.datagen import booking_for
+from bookings.rollups import record_bookings
 from bookings.models import Service, Availability, Booking, ProviderProfile
+from bookings.provider_stats import refresh_next_available_dates
 from accounts.models import UserProfile
 from datetime import datetime, timedelta, time
 from decimal import Decimal
@@ -15,7 +18,12 @@ import random
 class Command(BaseCommand):
     help = 'Creates comprehensive test data with 25+ availability slots and bookings'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible test data')
+
     def handle(self, *args, **kwargs):
+        self.rng = random.Random(kwargs['seed'])
+
         self.stdout.write(self.style.SUCCESS('=' * 60))
         self.stdout.write(self.style.SUCCESS('Creating Comprehensive Test Data'))
         self.stdout.write(self.style.SUCCESS('=' * 60))
@@ -160,7 +168,6 @@ class Command(BaseCommand):
 
     def create_availability_slots(self, provider_user, services):
         """Create 25+ availability slots across multiple days"""
-        slots = []
         today = datetime.now().date()
 
         # Time slots for each day
@@ -176,25 +183,28 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('\nCreating availability slots...'))
 
+        # Existing slots of the next 5 days, looked up once
+        existing = {
+            (slot.service_id, slot.date, slot.start_time): slot
+            for slot in Availability.objects.filter(
+                provider=provider_user,
+                date__range=(today + timedelta(days=1), today + timedelta(days=5))
+            ).select_related('service')
+        }
+
         # Create slots for next 5 days (5 days × 7 slots = 35 slots)
+        slots = []
+        new_slots = []
         for day_offset in range(1, 6):
             current_date = today + timedelta(days=day_offset)
 
             for start_time, end_time in time_slots:
                 # Randomly assign to different services
-                service = random.choice(services)
-
-                # Check if slot already exists
-                existing = Availability.objects.filter(
-                    provider=provider_user,
-                    service=service,
-                    date=current_date,
-                    start_time=start_time,
-                    end_time=end_time
-                ).first()
-
-                if not existing:
-                    slot = Availability.objects.create(
+                service = self.rng.choice(services)
+
+                slot = existing.get((service.id, current_date, start_time))
+                if slot is None:
+                    slot = Availability(
                         provider=provider_user,
                         service=service,
                         date=current_date,
@@ -202,43 +212,42 @@ class Command(BaseCommand):
                         end_time=end_time,
                         is_available=True
                     )
-                    slots.append(slot)
+                    new_slots.append(slot)
                     self.stdout.write(
                         f'  • {current_date} {start_time}-{end_time} - {service.name}'
                     )
                 else:
-                    slots.append(existing)
                     self.stdout.write(
                         self.style.WARNING(
                             f'  ⚠ Slot already exists: {current_date} {start_time}-{end_time}'
                         )
                     )
+                slots.append(slot)
+
+        Availability.objects.bulk_create(new_slots)
 
         self.stdout.write(self.style.SUCCESS(f'\n✓ Total availability slots: {len(slots)}'))
         return slots
 
     def create_bookings(self, customer_user, provider_user, services, availability_slots):
         """Create bookings for some of the availability slots"""
-        bookings = []
-
         # Book approximately 40% of available slots
         num_bookings = min(15, int(len(availability_slots) * 0.4))
 
         self.stdout.write(self.style.SUCCESS(f'\nCreating {num_bookings} bookings...'))
 
         # Randomly select slots to book
-        slots_to_book = random.sample(availability_slots, num_bookings)
+        slots_to_book = self.rng.sample(availability_slots, num_bookings)
+        existing_bookings = {
+            booking.availability_id: booking
+            for booking in Booking.objects.filter(availability__in=[slot.id for slot in slots_to_book])
+        }
 
+        bookings = []
+        new_bookings = []
         for slot in slots_to_book:
-            # Check if already booked
-            if not slot.is_available:
-                self.stdout.write(
-                    self.style.WARNING(f'  ⚠ Slot already booked: {slot.date} {slot.start_time}')
-                )
-                continue
-
             # Check if booking already exists for this slot
-            existing_booking = Booking.objects.filter(availability=slot).first()
+            existing_booking = existing_bookings.get(slot.id)
             if existing_booking:
                 self.stdout.write(
                     self.style.WARNING(f'  ⚠ Booking already exists: {slot.date} {slot.start_time}')
@@ -246,27 +255,27 @@ class Command(BaseCommand):
                 bookings.append(existing_booking)
                 continue
 
-            # Create booking
-            booking = Booking.objects.create(
-                customer=customer_user,
-                provider=provider_user,
-                service=slot.service,
-                availability=slot,
-                date=slot.date,
-                start_time=slot.start_time,
-                end_time=slot.end_time,
-                price=slot.service.price,
-                status=random.choice(['pending', 'confirmed', 'confirmed', 'confirmed'])  # Mostly confirmed
-            )
-
-            # Mark slot as unavailable
-            slot.is_available = False
-            slot.save()
+            # Check if already booked
+            if not slot.is_available:
+                self.stdout.write(
+                    self.style.WARNING(f'  ⚠ Slot already booked: {slot.date} {slot.start_time}')
+                )
+                continue
 
-            bookings.append(booking)
+            status = self.rng.choice(['pending', 'confirmed', 'confirmed', 'confirmed'])  # Mostly confirmed
+            new_bookings.append(booking_for(slot, customer_user.id, status))
             self.stdout.write(
-                f'  • Booked: {slot.date} {slot.start_time}-{slot.end_time} - {slot.service.name} ({booking.status})'
+                f'  • Booked: {slot.date} {slot.start_time}-{slot.end_time} - {slot.service.name} ({status})'
             )
 
+        # Create the bookings and mark their slots as unavailable
+        Booking.objects.bulk_create(new_bookings)
+        record_bookings(new_bookings)
+        Availability.objects.filter(
+            id__in=[booking.availability_id for booking in new_bookings]
+        ).update(is_available=False)
+        refresh_next_available_dates([provider_user.id])
+        bookings.extend(new_bookings)
+
         self.stdout.write(self.style.SUCCESS(f'\n✓ Created {len(bookings)} bookings'))
         return bookings
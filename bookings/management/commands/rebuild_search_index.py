@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the service full-text search index.
+
+Needed after writing services in bulk (bulk_create/update skip the signals
+that keep the index in sync).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookings.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of all services'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            indexed = backend.rebuild()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} services with {type(backend).__name__} in {elapsed:.2f}s'))
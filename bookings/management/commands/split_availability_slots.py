@@ -1,113 +1,143 @@
 """
 Management command to split existing long availability slots into multiple smaller slots
 based on service duration. This fixes slots created before the auto-split feature was added.
+
+The slots are processed in primary-key chunks, one transaction per chunk:
+the sub-slots that already exist are looked up with one query per chunk,
+the split originals are deleted with one DELETE and the missing sub-slots
+written with bulk_create, after which the providers' next available dates
+and schedule versions are refreshed. Every chunk reports the last id it
+finished, so an interrupted run continues with --resume-from-id.
 """
 
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
 from bookings.models import Availability
-from datetime import datetime, timedelta
+from bookings.provider_stats import refresh_next_available_dates
+from bookings.scheduling import from_minutes, to_minutes
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_SERVICE_DURATION = 60  # minutes, for slots without a service
 
 
 class Command(BaseCommand):
     help = 'Splits existing long availability slots into multiple slots based on service duration'
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.SUCCESS('=' * 60))
-        self.stdout.write(self.style.SUCCESS('Splitting Existing Availability Slots'))
-        self.stdout.write(self.style.SUCCESS('=' * 60))
-
-        # Find all available slots
-        long_slots = Availability.objects.filter(is_available=True)
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f'Slots per chunk and transaction (default {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--resume-from-id', type=int, default=0,
+                            help='Only process slots with an id greater than this one')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing anything')
 
-        total_slots_processed = 0
-        total_new_slots_created = 0
-        slots_to_delete = []
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        dry_run = options['dry_run']
 
-        for slot in long_slots:
-            # Calculate slot duration in minutes
-            start_datetime = datetime.combine(slot.date, slot.start_time)
-            end_datetime = datetime.combine(slot.date, slot.end_time)
-            slot_duration = int((end_datetime - start_datetime).total_seconds() / 60)
-
-            # Get service duration
-            service_duration = slot.service.duration if slot.service else 60
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS('Splitting Existing Availability Slots'
+                                             + (' (dry run)' if dry_run else '')))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
 
-            # Only split if the slot is longer than the service duration
-            if slot_duration > service_duration:
-                self.stdout.write(
-                    f'\nProcessing: {slot.service.name if slot.service else "General"} '
-                    f'on {slot.date} ({slot.start_time}-{slot.end_time}) '
-                    f'[{slot_duration} min slot, {service_duration} min service]'
-                )
-
-                # Create multiple smaller slots
-                current_slot_start = slot.start_time
-                new_slots_count = 0
-
-                while True:
-                    # Calculate end time for this slot
-                    current_start_datetime = datetime.combine(slot.date, current_slot_start)
-                    slot_end_datetime = current_start_datetime + timedelta(minutes=service_duration)
-                    current_slot_end = slot_end_datetime.time()
-
-                    # Check if this slot goes beyond the original end time
-                    if slot_end_datetime > end_datetime:
-                        break
-
-                    # Check if this exact slot already exists (avoid duplicates)
-                    exists = Availability.objects.filter(
-                        provider=slot.provider,
-                        service=slot.service,
-                        date=slot.date,
-                        start_time=current_slot_start,
-                        end_time=current_slot_end
-                    ).exclude(id=slot.id).exists()
-
-                    if not exists:
-                        # Create new slot
-                        Availability.objects.create(
-                            provider=slot.provider,
-                            service=slot.service,
-                            date=slot.date,
-                            start_time=current_slot_start,
-                            end_time=current_slot_end,
-                            is_available=True
-                        )
-                        new_slots_count += 1
-                        self.stdout.write(
-                            f'  ✓ Created: {current_slot_start} - {current_slot_end}'
-                        )
-
-                    # Move to next slot
-                    current_slot_start = current_slot_end
-
-                # Mark original slot for deletion
-                if new_slots_count > 0:
-                    slots_to_delete.append(slot)
-                    total_new_slots_created += new_slots_count
-                    total_slots_processed += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  → Split into {new_slots_count} smaller slots'
-                        )
-                    )
-
-        # Delete original long slots
-        if slots_to_delete:
-            self.stdout.write(self.style.WARNING(f'\nDeleting {len(slots_to_delete)} original long slots...'))
-            for slot in slots_to_delete:
-                slot.delete()
-            self.stdout.write(self.style.SUCCESS('✓ Original slots deleted'))
+        # Open slots that no booking points to; the upper id bound keeps the
+        # run from walking over the slots it creates itself
+        slots = Availability.objects.filter(is_available=True, booking__isnull=True)
+        last_id = options['resume_from_id']
+        max_id = slots.aggregate(max_id=Max('id'))['max_id'] or 0
+        slots = slots.filter(id__lte=max_id).select_related('service').order_by('id')
+
+        totals = {'scanned': 0, 'split': 0, 'created': 0, 'deleted': 0}
+        started = time.perf_counter()
+
+        while True:
+            chunk = list(slots.filter(id__gt=last_id)[:batch_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            if dry_run:
+                created, deleted = self.split_chunk(chunk, dry_run=True)
+            else:
+                with transaction.atomic():
+                    created, deleted = self.split_chunk(chunk)
+
+            totals['scanned'] += len(chunk)
+            totals['split'] += deleted
+            totals['created'] += created
+            totals['deleted'] += 0 if dry_run else deleted
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  Chunk up to id {last_id}: {totals["scanned"]} slots scanned, '
+                f'{totals["split"]} split, {totals["created"]} new slots '
+                f'({totals["scanned"] / elapsed if elapsed else 0:.0f} slots/s)'
+            )
+
+        elapsed = time.perf_counter() - started
 
         # Summary
         self.stdout.write(self.style.SUCCESS('\n' + '=' * 60))
-        self.stdout.write(self.style.SUCCESS('MIGRATION COMPLETED'))
+        self.stdout.write(self.style.SUCCESS('DRY RUN COMPLETED' if dry_run else 'MIGRATION COMPLETED'))
         self.stdout.write(self.style.SUCCESS('=' * 60))
-        self.stdout.write(self.style.SUCCESS(f'✓ Long slots processed: {total_slots_processed}'))
-        self.stdout.write(self.style.SUCCESS(f'✓ New smaller slots created: {total_new_slots_created}'))
-        self.stdout.write(self.style.SUCCESS(f'✓ Original long slots deleted: {len(slots_to_delete)}'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Slots scanned: {totals["scanned"]}'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Long slots processed: {totals["split"]}'))
+        self.stdout.write(self.style.SUCCESS(f'✓ New smaller slots created: {totals["created"]}'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Original long slots deleted: {totals["deleted"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Time: {elapsed:.2f}s ({totals["scanned"] / elapsed if elapsed else 0:.0f} slots/s)'))
         self.stdout.write(self.style.SUCCESS('=' * 60))
 
-        if total_slots_processed == 0:
+        if totals['split'] == 0:
             self.stdout.write(self.style.WARNING('\nNo long slots found that needed splitting!'))
             self.stdout.write(self.style.WARNING('All existing slots are already the correct duration.'))
+
+    def split_chunk(self, chunk, dry_run=False):
+        """Split the long slots of one chunk; returns (slots created, originals deleted)"""
+        planned = {}
+        for slot in chunk:
+            service_duration = slot.service.duration if slot.service else DEFAULT_SERVICE_DURATION
+            start, end = to_minutes(slot.start_time), to_minutes(slot.end_time)
+            # Only split if the slot is longer than the service duration
+            if end - start > service_duration:
+                planned[slot] = [
+                    (slot.provider_id, slot.service_id, slot.date,
+                     from_minutes(sub_start), from_minutes(sub_start + service_duration))
+                    for sub_start in range(start, end - service_duration + 1, service_duration)
+                ]
+        if not planned:
+            return 0, 0
+
+        # One lookup for the start times of the chunk that are already taken.
+        # Slots are unique per start time; the long slots being split give
+        # theirs up
+        existing = set(Availability.objects.filter(
+            provider_id__in={slot.provider_id for slot in planned},
+            date__in={slot.date for slot in planned},
+        ).exclude(id__in=[slot.id for slot in planned]).values_list(
+            'provider_id', 'service_id', 'date', 'start_time'))
+
+        new_slots = []
+        split_ids = []
+        for slot, sub_slots in planned.items():
+            # Two long slots of a chunk can cover the same sub-slot, so one
+            # may be left with nothing to add; it is still replaced
+            missing = [key for key in sub_slots if key[:4] not in existing]
+            existing.update(key[:4] for key in missing)
+            split_ids.append(slot.id)
+            new_slots.extend(
+                Availability(provider_id=provider_id, service_id=service_id, date=day,
+                             start_time=start_time, end_time=end_time, is_available=True)
+                for provider_id, service_id, day, start_time, end_time in missing
+            )
+
+        if not dry_run and split_ids:
+            # Delete first: the first sub-slot starts where its original did
+            Availability.objects.filter(id__in=split_ids).delete()
+            Availability.objects.bulk_create(new_slots)
+            refresh_next_available_dates({slot.provider_id for slot in planned if slot.id in split_ids})
+        return len(new_slots), len(split_ids)
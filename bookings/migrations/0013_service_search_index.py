@@ -0,0 +1,54 @@
+from django.db import migrations
+
+FTS_TABLE = 'bookings_service_fts'
+
+
+def fts5_available(connection):
+    """True if the SQLite library of the connection has FTS5 compiled in"""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table used by bookings.search on SQLite"""
+    if schema_editor.connection.vendor != 'sqlite' or not fts5_available(schema_editor.connection):
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "name, description, category, provider, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+    Service = apps.get_model('bookings', 'Service')
+    labels = dict(Service._meta.get_field('category').choices)
+    rows = Service.objects.values_list(
+        'id', 'name', 'description', 'category',
+        'provider__username', 'provider__first_name', 'provider__last_name'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, category, provider) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [
+                (service_id, name, description, labels.get(category, category),
+                 ' '.join(part for part in (username, first_name, last_name) if part))
+                for service_id, name, description, category, username, first_name, last_name in rows
+            ]
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_availability_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
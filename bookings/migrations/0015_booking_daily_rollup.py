@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timedelta
+
+
+def populate_booking_rollups(apps, schema_editor):
+    """
+    Roll up the existing bookings (one grouped query). Large tables can be
+    left empty here and filled with `manage.py rebuild_booking_rollups`.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingDailyRollup = apps.get_model('bookings', 'BookingDailyRollup')
+
+    duration = models.ExpressionWrapper(models.F('end_time') - models.F('start_time'),
+                                        output_field=models.DurationField())
+    rows = Booking.objects.order_by().values('date', 'provider_id', 'service_id', 'status').annotate(
+        booking_count=models.Count('id'), revenue=models.Sum('price'), booked=models.Sum(duration))
+    BookingDailyRollup.objects.bulk_create([
+        BookingDailyRollup(
+            date=row['date'], provider_id=row['provider_id'], service_id=row['service_id'],
+            status=row['status'], booking_count=row['booking_count'], revenue=row['revenue'] or 0,
+            minutes=int((row['booked'] or timedelta()).total_seconds() // 60),
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0014_service_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('booking_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('minutes', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bookings.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'date'], name='booking_rollup_provider_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookingdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'provider', 'service', 'status'), name='booking_rollup_key'),
+        ),
+        migrations.RunPython(populate_booking_rollups, migrations.RunPython.noop),
+    ]
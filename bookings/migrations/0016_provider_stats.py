@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import date
+
+
+def populate_provider_stats(apps, schema_editor):
+    """
+    Compute the stats of every provider with bookings or slots (two
+    grouped queries). Large tables can be left to
+    `manage.py check_provider_stats --fix`.
+    """
+    Availability = apps.get_model('bookings', 'Availability')
+    Booking = apps.get_model('bookings', 'Booking')
+    ProviderStats = apps.get_model('bookings', 'ProviderStats')
+
+    counters = {
+        row['provider_id']: row
+        for row in Booking.objects.order_by().values('provider_id').annotate(
+            total=models.Count('id', filter=~models.Q(status='cancelled')),
+            completed=models.Count('id', filter=models.Q(status='completed')),
+            revenue=models.Sum('price', filter=models.Q(status='completed')),
+        )
+    }
+    next_dates = dict(
+        Availability.objects.filter(is_available=True, date__gte=date.today()).order_by()
+        .values('provider_id').annotate(first=models.Min('date')).values_list('provider_id', 'first')
+    )
+
+    ProviderStats.objects.bulk_create([
+        ProviderStats(
+            provider_id=provider_id,
+            total_bookings=counters.get(provider_id, {}).get('total', 0),
+            completed_bookings=counters.get(provider_id, {}).get('completed', 0),
+            total_revenue=counters.get(provider_id, {}).get('revenue') or 0,
+            next_available_date=next_dates.get(provider_id),
+        )
+        for provider_id in counters.keys() | next_dates.keys()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('bookings', '0015_booking_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderStats',
+            fields=[
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='provider_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_bookings', models.IntegerField(db_index=True, default=0, help_text='Number of bookings that were not cancelled')),
+                ('completed_bookings', models.IntegerField(default=0, help_text='Number of completed bookings')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, help_text='Revenue of the completed bookings', max_digits=12)),
+                ('next_available_date', models.DateField(blank=True, db_index=True, help_text='First day from today with an open slot', null=True)),
+            ],
+            options={
+                'verbose_name': 'Provider Stats',
+                'verbose_name_plural': 'Provider Stats',
+            },
+        ),
+        migrations.RunPython(populate_provider_stats, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='providerprofile',
+            name='total_bookings',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0016_provider_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekdays', models.PositiveSmallIntegerField(help_text='Days of the week as a bit mask: Monday = 1, Tuesday = 2, ... Sunday = 64')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, help_text='Last day, empty for no end', null=True)),
+                ('excluded_dates', models.JSONField(blank=True, default=list, help_text='ISO dates within the range without slots')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_rules', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_rules', to='bookings.service')),
+            ],
+            options={
+                'ordering': ['start_date', 'start_time'],
+                'indexes': [models.Index(fields=['service', 'end_date'], name='avail_rule_service_idx')],
+            },
+        ),
+    ]
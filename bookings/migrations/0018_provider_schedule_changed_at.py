@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0017_availability_rule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='providerstats',
+            name='schedule_changed_at',
+            field=models.DateTimeField(blank=True, help_text="Last change to the provider's slots or bookings", null=True),
+        ),
+    ]
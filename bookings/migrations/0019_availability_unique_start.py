@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:21
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    """
+    Keep one slot per (provider, service, date, start time): the one with an
+    active booking if there is one, otherwise the oldest. A slot holds one
+    booking, so when the kept slot has none the latest booking of the
+    duplicates moves to it; cancelled or completed history that does not
+    fit is deleted with its slot. Two active bookings with the same start
+    cannot be merged automatically.
+    """
+    Availability = apps.get_model('bookings', 'Availability')
+    Booking = apps.get_model('bookings', 'Booking')
+    duplicates = Availability.objects.filter(service__isnull=False).values(
+        'provider_id', 'service_id', 'date', 'start_time'
+    ).annotate(rows=Count('id')).filter(rows__gt=1)
+
+    dropped = 0
+    for key in duplicates:
+        slots = list(Availability.objects.filter(
+            provider_id=key['provider_id'], service_id=key['service_id'],
+            date=key['date'], start_time=key['start_time'],
+        ).annotate(
+            active=Count('booking', filter=Q(booking__status__in=ACTIVE_STATUSES)),
+            booked=Count('booking'),
+        ).order_by('-active', 'id'))
+        active = [slot for slot in slots if slot.active]
+        if len(active) > 1:
+            raise RuntimeError(
+                f"Slots {[slot.id for slot in active]} have active bookings and start at the same time; "
+                "cancel all but one of them before migrating.")
+
+        kept, dupes = slots[0], slots[1:]
+        history = Booking.objects.filter(availability__in=dupes)
+        if not kept.booked:
+            moved = history.order_by('-updated_at', '-id').first()
+            if moved is not None:
+                history.filter(id=moved.id).update(availability=kept)
+                Availability.objects.filter(id=kept.id).update(is_available=moved.availability.is_available)
+        dropped += history.count()
+        Availability.objects.filter(id__in=[slot.id for slot in dupes]).delete()
+
+    if dropped:
+        print(f"  Deleted {dropped} cancelled or completed bookings of duplicate slots")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0018_provider_schedule_changed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='availability',
+            name='avail_service_day_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='availability',
+            constraint=models.UniqueConstraint(fields=('provider', 'service', 'date', 'start_time'), name='avail_unique_service_start'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0019_availability_unique_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceSearchEntry',
+            fields=[
+                ('service', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='bookings.service')),
+                ('document', models.TextField(db_column='bookings_service_fts')),
+            ],
+            options={
+                'db_table': 'bookings_service_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -134,10 +134,6 @@ class ProviderProfile(models.Model):
         default=0.0,
         help_text="Average rating (0-5)"
     )
-    total_bookings = models.IntegerField(
-        default=0,
-        help_text="Total number of completed bookings"
-    )
 
     # Status
     is_verified = models.BooleanField(
@@ -178,13 +174,16 @@ class ProviderProfile(models.Model):
         """Return star representation of rating"""
         return '⭐' * int(self.rating)
 
+    @property
+    def stats(self):
+        """The provider's ProviderStats, None before their first booking or slot"""
+        return getattr(self.user, 'provider_stats', None)
+
     @staticmethod
     def is_provider(user):
         """Check if a user is a provider (has a ProviderProfile)"""
-        try:
-            return hasattr(user, 'provider_profile') and user.provider_profile is not None
-        except:
-            return False
+        # A missing profile raises RelatedObjectDoesNotExist, an AttributeError
+        return getattr(user, 'provider_profile', None) is not None
 
     @staticmethod
     def get_provider_profile(user):
@@ -207,12 +206,62 @@ class Availability(models.Model):
     class Meta:
         verbose_name_plural = 'Availabilities'
         ordering = ['date', 'start_time']
+        constraints = [
+            # One slot per start time, so two first bookings of a rule slot
+            # (bookings/rules.py) share one row. Its index also serves a
+            # service's slots for one day in display order (view_availability,
+            # cancel/reject)
+            models.UniqueConstraint(fields=['provider', 'service', 'date', 'start_time'],
+                                    name='avail_unique_service_start'),
+        ]
+        indexes = [
+            # Only open slots: date range aggregate and confirm_booking overlap lookup
+            models.Index(fields=['provider', 'service', 'date'],
+                         condition=models.Q(is_available=True),
+                         name='avail_open_slot_idx'),
+        ]
 
     def __str__(self):
         service_info = f" - {self.service.name}" if self.service else ""
         return f"{self.provider.username} | {self.date} {self.start_time}-{self.end_time}{service_info}"
 
 
+class AvailabilityRule(models.Model):
+    """
+    A recurring weekly window of bookable slots of a service, expanded on
+    demand by bookings/rules.py instead of stored as one Availability row
+    per slot. A slot only becomes an Availability row when it is booked.
+    """
+
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availability_rules')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, related_name='availability_rules')
+    weekdays = models.PositiveSmallIntegerField(
+        help_text="Days of the week as a bit mask: Monday = 1, Tuesday = 2, ... Sunday = 64")
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True, help_text="Last day, empty for no end")
+    excluded_dates = models.JSONField(default=list, blank=True,
+                                      help_text="ISO dates within the range without slots")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+    class Meta:
+        ordering = ['start_date', 'start_time']
+        indexes = [
+            # The rules of a service that reach a given week (view_availability)
+            models.Index(fields=['service', 'end_date'], name='avail_rule_service_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider.username} | {self.service.name} from {self.start_date} {self.start_time}-{self.end_time}"
+
+    def get_weekdays_display(self):
+        """The rule's days as short names, comma separated"""
+        return ", ".join(name for day, name in enumerate(self.WEEKDAY_NAMES) if self.weekdays & (1 << day))
+
+
 class Service(models.Model):
     """Services offered by service providers"""
 
@@ -267,6 +316,12 @@ class Service(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Service'
         verbose_name_plural = 'Services'
+        indexes = [
+            # Keyset pagination of the active services per sort order
+            models.Index(fields=['is_active', 'created_at', 'id'], name='service_active_newest_idx'),
+            models.Index(fields=['is_active', 'price', 'id'], name='service_active_price_idx'),
+            models.Index(fields=['is_active', 'duration', 'id'], name='service_active_duration_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - €{self.price}"
@@ -283,6 +338,23 @@ class Service(models.Model):
             return f"{minutes}m"
 
 
+class ServiceSearchEntry(models.Model):
+    """
+    A row of the SQLite FTS5 index of bookings/search.py, mapped so search
+    can join it to the services. The table is created by a migration and
+    filled by the search backend, never through this model.
+    """
+
+    service = models.OneToOneField(Service, on_delete=models.DO_NOTHING, primary_key=True,
+                                   db_column='rowid', db_constraint=False, related_name='search_entry')
+    # The hidden column named after an FTS5 table, the left side of MATCH
+    document = models.TextField(db_column='bookings_service_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'bookings_service_fts'
+
+
 class Notification(models.Model):
     """Notification system for users and providers"""
 
@@ -385,6 +457,78 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Provider's bookings on a day by status (conflict checks, dashboard)
+            models.Index(fields=['provider', 'date', 'status'],
+                         name='booking_provider_day_idx'),
+            # Customer's bookings by date (customer dashboard, my_bookings)
+            models.Index(fields=['customer', 'date'],
+                         name='booking_customer_day_idx'),
+        ]
+
+
+class BookingDailyRollup(models.Model):
+    """
+    Number, revenue and minutes of the bookings per day, provider, service
+    and status. Kept up to date by bookings/rollups.py; rebuild it with
+    `python manage.py rebuild_booking_rollups`.
+    """
+
+    date = models.DateField()
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+
+    booking_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    minutes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'provider', 'service', 'status'],
+                                    name='booking_rollup_key'),
+        ]
+        indexes = [
+            # A provider's rollups over a date range (provider dashboard)
+            models.Index(fields=['provider', 'date'], name='booking_rollup_provider_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.provider_id}/{self.service_id} {self.status}: {self.booking_count}"
+
+
+class ProviderStats(models.Model):
+    """
+    Precomputed per-provider counters, kept up to date by
+    bookings/provider_stats.py as bookings and slots change. Check and
+    repair them with `python manage.py check_provider_stats --fix`.
+
+    They live in their own table rather than on ProviderProfile, which is
+    read on every request to resolve the user's role: writing it inside
+    every booking transaction would make those reads wait on the writers.
+    """
+
+    provider = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='provider_stats')
+
+    total_bookings = models.IntegerField(default=0, db_index=True,
+                                         help_text="Number of bookings that were not cancelled")
+    completed_bookings = models.IntegerField(default=0, help_text="Number of completed bookings")
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                        help_text="Revenue of the completed bookings")
+    next_available_date = models.DateField(null=True, blank=True, db_index=True,
+                                           help_text="First day from today with an open slot")
+    schedule_changed_at = models.DateTimeField(null=True, blank=True,
+                                               help_text="Last change to the provider's slots or bookings")
+
+    class Meta:
+        verbose_name = 'Provider Stats'
+        verbose_name_plural = 'Provider Stats'
+
+    def __str__(self):
+        return f"{self.provider_id}: {self.total_bookings} bookings"
+
 
 class SearchQuery(models.Model):
     """Track search queries for analytics and improvement"""
@@ -0,0 +1,70 @@
+# bookings/notifications.py
+"""
+Cached per-user unread notification counter, and the notifications sent
+to customers when their bookings change status.
+
+The badge in the dashboard header used to run a COUNT query on every page.
+The count is now kept in the cache and dropped whenever a user's
+notifications change: the signals in bookings/signals.py cover save() and
+delete(), and code that writes in bulk (bulk_create(), update()) calls
+invalidate_unread_count() itself because those skip model signals.
+"""
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Notification
+
+UNREAD_CACHE_KEY = 'notifications:unread:{}'
+UNREAD_CACHE_TIMEOUT = 60 * 60  # seconds, only a safety net for missed invalidations
+
+# status -> (notification type, title, verb used in the message)
+STATUS_NOTIFICATIONS = {
+    'confirmed': ('booking', 'Booking confirmed', 'confirmed'),
+    'completed': ('booking', 'Booking completed', 'marked as completed'),
+    'cancelled': ('cancellation', 'Booking cancelled', 'cancelled'),
+}
+
+
+def unread_cache_key(user_id):
+    return UNREAD_CACHE_KEY.format(user_id)
+
+
+def unread_count(user_id):
+    """Number of unread notifications for a user, served from the cache when possible"""
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def invalidate_unread_count(*user_ids):
+    """Forget the cached counters of the given users"""
+    cache.delete_many([unread_cache_key(user_id) for user_id in set(user_ids)])
+
+
+def notify_status_changes(changes, actor=None):
+    """
+    Tell the customers of transitioned bookings (BookingChange tuples)
+    about the new status, with one bulk_create. Customers who made the
+    change themselves are not notified. Returns the number sent.
+    """
+    actor_id = getattr(actor, 'id', None)
+    link = reverse('my_bookings')
+    notifications = []
+    for change in changes:
+        if change.customer_id == actor_id or change.status not in STATUS_NOTIFICATIONS:
+            continue
+        notification_type, title, verb = STATUS_NOTIFICATIONS[change.status]
+        notifications.append(Notification(
+            user_id=change.customer_id,
+            notification_type=notification_type,
+            title=title,
+            message=(f'Your booking for "{change.service_name}" on {change.date} '
+                     f'at {change.start_time:%H:%M} has been {verb}.'),
+            link=link,
+        ))
+    Notification.objects.bulk_create(notifications)
+    invalidate_unread_count(*(notification.user_id for notification in notifications))
+    return len(notifications)
@@ -0,0 +1,176 @@
+# bookings/pagination.py
+"""
+Keyset (cursor) pagination for the service listings.
+
+browse_providers and search_services used to render every matching
+service. Pages are now cut with a WHERE on the sort key instead of an
+OFFSET, so page 500 costs the same as page 1 and rows inserted while a
+user scrolls never shift or repeat results. Each ordering ends with the
+primary key, which makes it total and therefore stable.
+
+The relevance sort orders by a computed search rank that cannot be used
+in a WHERE clause; it falls back to offset cursors.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+# sort_by -> (field, descending); the id is always the tie-breaker
+KEYSET_ORDERINGS = {
+    'newest': ('created_at', True),
+    'price_low': ('price', False),
+    'price_high': ('price', True),
+    'duration': ('duration', False),
+    # Annotated from ProviderStats.total_bookings by the listing views
+    'popular': ('provider_bookings', True),
+}
+
+COUNT_CACHE_TIMEOUT = 60  # seconds
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next one"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor, None for a missing or malformed one"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by one of the KEYSET_ORDERINGS, or by an explicit
+    `ordering` with offset cursors (used for relevance).
+
+    Usage:
+        page = KeysetPaginator(services, 'price_low').page(request.GET.get('cursor'))
+        page.items, page.next_cursor
+    """
+
+    def __init__(self, queryset, sort_by, per_page=PAGE_SIZE, ordering=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        if ordering is None:
+            self.field, self.descending = KEYSET_ORDERINGS.get(sort_by, KEYSET_ORDERINGS['newest'])
+
+    def page(self, cursor=None):
+        if self.ordering is not None:
+            return self._offset_page(decode_cursor(cursor))
+        return self._keyset_page(decode_cursor(cursor))
+
+    def _keyset_page(self, position):
+        prefix = '-' if self.descending else ''
+        queryset = self.queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+
+        after = self._position_filter(position)
+        if after is not None:
+            queryset = queryset.filter(after)
+
+        rows = list(queryset[:self.per_page + 1])
+        items = rows[:self.per_page]
+        next_cursor = None
+        if len(rows) > self.per_page:
+            last = items[-1]
+            next_cursor = encode_cursor({
+                'v': self._dump(getattr(last, self.field)),
+                'id': last.id,
+            })
+        return KeysetPage(items, next_cursor)
+
+    def _position_filter(self, position):
+        """Q for the rows after the cursor position, None for the first page"""
+        if not position or 'v' not in position or 'id' not in position:
+            return None
+        try:
+            value = self._load(position['v'])
+            last_id = int(position['id'])
+        except (ValueError, TypeError, OverflowError, InvalidOperation):
+            return None
+
+        op = 'lt' if self.descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{op}': value})
+            | Q(**{self.field: value, f'id__{op}': last_id})
+        )
+
+    def _offset_page(self, position):
+        try:
+            offset = max(int((position or {}).get('offset', 0)), 0)
+        except (ValueError, TypeError):
+            offset = 0
+
+        rows = list(self.queryset.order_by(*self.ordering)[offset:offset + self.per_page + 1])
+        items = rows[:self.per_page]
+        next_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = encode_cursor({'offset': offset + self.per_page})
+        return KeysetPage(items, next_cursor)
+
+    def _dump(self, value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _load(self, value):
+        if self.field == 'created_at':
+            return datetime.fromisoformat(value)
+        if self.field == 'price':
+            price = Decimal(value)
+            if not price.is_finite():
+                raise InvalidOperation(f'Not a finite price: {value!r}')
+            return price
+        return int(value)
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    COUNT(*) of a queryset, cached for `timeout` seconds per distinct query.
+    Listings show it as a result total, so being a minute behind is fine.
+    """
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = 'service-count:' + hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
@@ -0,0 +1,240 @@
+# bookings/provider_stats.py
+"""
+Precomputed per-provider stats (ProviderStats).
+
+ProviderProfile.total_bookings was never written after the profile was
+created, so listings had nothing current to sort providers by. Each
+provider now has a ProviderStats row that is kept up to date as bookings
+change:
+
+    total_bookings        bookings that were not cancelled
+    completed_bookings    completed bookings
+    total_revenue         revenue of the completed bookings
+    next_available_date   first day from today with an open slot
+
+The booking counters move with the booking rollups: every RollupDelta
+(bookings/rollups.py) also adds its change to the providers' counters,
+with F() expressions in the same transaction as the booking write, so
+concurrent bookings never overwrite each other's counts.
+
+next_available_date depends on the slots rather than the bookings (open
+Availability rows and the days availability rules offer); code that opens
+or closes slots calls refresh_next_available_dates() for the providers it
+touched. It also goes stale when its day passes, which
+reconcile_provider_stats() (`manage.py check_provider_stats --fix`)
+repairs together with any counter drift.
+
+The same calls stamp schedule_changed_at, the version of the provider's
+schedule that the availability week endpoint sends as its ETag.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Availability, Booking, ProviderStats
+
+STAT_FIELDS = ('total_bookings', 'completed_bookings', 'total_revenue', 'next_available_date')
+
+# Providers per UPDATE or per reconcile chunk
+PROVIDER_BATCH_SIZE = 500
+
+
+def counter_change(status, price):
+    """(total, completed, revenue) a booking in `status` adds to its provider's counters"""
+    if status == 'cancelled':
+        return 0, 0, Decimal('0')
+    if status == 'completed':
+        return 1, 1, price or Decimal('0')
+    return 1, 0, Decimal('0')
+
+
+def ensure_provider_stats(provider_ids):
+    """Create the missing ProviderStats rows of the given providers"""
+    ProviderStats.objects.bulk_create(
+        [ProviderStats(provider_id=provider_id) for provider_id in provider_ids],
+        ignore_conflicts=True,
+    )
+
+
+class CounterDelta:
+    """
+    Accumulated counter changes per provider, applied in one go.
+
+    Usage:
+        delta = CounterDelta()
+        delta.add(provider_id, 'completed', price)
+        delta.add(provider_id, 'confirmed', price, -1)
+        delta.apply()
+    """
+
+    def __init__(self):
+        # provider id -> [total, completed, revenue]
+        self.changes = defaultdict(lambda: [0, 0, Decimal('0')])
+
+    def add(self, provider_id, status, price, sign=1):
+        total, completed, revenue = counter_change(status, price)
+        change = self.changes[provider_id]
+        change[0] += sign * total
+        change[1] += sign * completed
+        change[2] += sign * revenue
+
+    def apply(self):
+        changes = {
+            provider_id: change for provider_id, change in self.changes.items() if any(change)
+        }
+        self.changes.clear()
+
+        # Only a change that adds something can need a new row; a pure
+        # decrement (such as the cascade of a deleted provider) never
+        # creates one
+        ensure_provider_stats(
+            provider_id for provider_id, change in changes.items() if max(change) > 0
+        )
+        for provider_id, (total, completed, revenue) in changes.items():
+            ProviderStats.objects.filter(provider_id=provider_id).update(
+                total_bookings=F('total_bookings') + total,
+                completed_bookings=F('completed_bookings') + completed,
+                total_revenue=F('total_revenue') + revenue,
+            )
+
+
+def next_available_dates(provider_ids):
+    """
+    {provider id: first day from today with an open slot} of the given
+    providers that have one: an open Availability row or a day their
+    availability rules (bookings/rules.py) offer slots on.
+    """
+    from .rules import first_rule_dates
+
+    today = date.today()
+    next_dates = dict(
+        Availability.objects.filter(
+            provider_id__in=provider_ids, is_available=True, date__gte=today
+        ).order_by().values('provider_id').annotate(first=Min('date')).values_list('provider_id', 'first')
+    )
+    for provider_id, day in first_rule_dates(provider_ids, today).items():
+        if provider_id not in next_dates or day < next_dates[provider_id]:
+            next_dates[provider_id] = day
+    return next_dates
+
+
+def refresh_next_available_dates(provider_ids):
+    """
+    Recompute next_available_date for the given providers, one bulk UPDATE
+    per batch, and mark their schedules as changed
+    """
+    provider_ids = sorted(set(provider_ids))
+    now = timezone.now()
+    for i in range(0, len(provider_ids), PROVIDER_BATCH_SIZE):
+        batch = provider_ids[i:i + PROVIDER_BATCH_SIZE]
+        next_dates = next_available_dates(batch)
+        ensure_provider_stats(batch)
+        ProviderStats.objects.bulk_update([
+            ProviderStats(provider_id=provider_id, next_available_date=next_dates.get(provider_id),
+                          schedule_changed_at=now)
+            for provider_id in batch
+        ], ['next_available_date', 'schedule_changed_at'])
+
+
+def touch_schedules(provider_ids):
+    """Mark the schedules of the given providers as changed (see schedule_version())"""
+    provider_ids = set(provider_ids)
+    ensure_provider_stats(provider_ids)
+    ProviderStats.objects.filter(provider_id__in=provider_ids).update(schedule_changed_at=timezone.now())
+
+
+def schedule_version(provider_id):
+    """
+    When the provider's slots or bookings last changed, None when unknown.
+    Code that changes slots goes through refresh_next_available_dates() and
+    booking transitions through touch_schedules(), so the availability
+    week endpoint can derive its ETag from this one column.
+    """
+    return ProviderStats.objects.filter(provider_id=provider_id).values_list(
+        'schedule_changed_at', flat=True).first()
+
+
+def expected_provider_stats(provider_ids):
+    """
+    The STAT_FIELDS values of the given providers with bookings or open
+    slots, computed with two grouped queries and one query of their rules.
+    Returns {provider id: (total, completed, revenue, next available date)}.
+    """
+    counters = {
+        row['provider_id']: row
+        for row in Booking.objects.filter(provider_id__in=provider_ids).order_by().values(
+            'provider_id'
+        ).annotate(
+            total=Count('id', filter=~Q(status='cancelled')),
+            completed=Count('id', filter=Q(status='completed')),
+            revenue=Sum('price', filter=Q(status='completed')),
+        )
+    }
+    next_dates = next_available_dates(provider_ids)
+
+    expected = {}
+    for provider_id in counters.keys() | next_dates.keys():
+        row = counters.get(provider_id, {})
+        expected[provider_id] = (
+            row.get('total', 0),
+            row.get('completed', 0),
+            row.get('revenue') or Decimal('0'),
+            next_dates.get(provider_id),
+        )
+    return expected
+
+
+def reconcile_provider_stats(fix=False, batch_size=PROVIDER_BATCH_SIZE, progress=None):
+    """
+    Compare the stats of every user with their bookings and slots as a
+    provider, in chunks of `batch_size` users. With fix=True the drifted
+    stats are written with one bulk INSERT and one bulk UPDATE per chunk.
+
+    progress, when given, is called with (users checked, drifted) after
+    each chunk. Returns a list of (provider id, {field: (stored, expected)}).
+    """
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    empty = (0, 0, Decimal('0'), None)
+    drifted = []
+    checked = 0
+    last_id = 0
+    while True:
+        user_ids = list(users.filter(id__gt=last_id)[:batch_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        expected = expected_provider_stats(user_ids)
+        stored = ProviderStats.objects.in_bulk(user_ids)
+        created, changed = [], []
+        for provider_id in user_ids:
+            stats = stored.get(provider_id)
+            values = expected.get(provider_id, empty)
+            is_new = stats is None
+            if is_new:
+                if values == empty:
+                    continue
+                stats = ProviderStats(provider_id=provider_id)
+            differences = {
+                field: (getattr(stats, field), value)
+                for field, value in zip(STAT_FIELDS, values)
+                if getattr(stats, field) != value
+            }
+            if differences:
+                drifted.append((provider_id, differences))
+                for field, (_, value) in differences.items():
+                    setattr(stats, field, value)
+                (created if is_new else changed).append(stats)
+
+        if fix:
+            ProviderStats.objects.bulk_create(created)
+            ProviderStats.objects.bulk_update(changed, STAT_FIELDS)
+
+        checked += len(user_ids)
+        if progress is not None:
+            progress(checked, len(drifted))
+    return drifted
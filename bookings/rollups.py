@@ -0,0 +1,186 @@
+# bookings/rollups.py
+"""
+Daily booking rollups.
+
+The dashboards used to aggregate the Booking table on every page view.
+BookingDailyRollup keeps the number, revenue and minutes of the bookings
+per (date, provider, service, status), so the dashboards read a few rows
+per day instead of one row per booking.
+
+The rollups are maintained incrementally:
+
+    - the Booking signals in bookings/signals.py cover save() and delete()
+    - status changes made by BookingService (bookings/transitions.py) are
+      recorded by its booking_status_changed hook
+    - code that writes bookings in bulk (bulk_create(), update()) records
+      the change itself with a RollupDelta or record_bookings()
+
+Increments are applied as one INSERT ... ON CONFLICT DO UPDATE per batch
+(SQLite 3.24+ and PostgreSQL), decrements as a plain UPDATE: a decrement
+never creates a row, so deleting a service or provider, which cascades to
+both their bookings and their rollups, cannot resurrect a rollup row.
+
+rebuild_rollups() recomputes them from the bookings, in date-range chunks.
+
+A RollupDelta also carries the change to the providers' booking counters
+in ProviderStats (see bookings/provider_stats.py).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum
+
+from .models import Booking, BookingDailyRollup
+from .provider_stats import CounterDelta
+from .scheduling import to_minutes
+
+REBUILD_CHUNK_DAYS = 31
+
+# Booking fields a rollup row is derived from
+ROLLUP_FIELDS = ('date', 'provider_id', 'service_id', 'status', 'price', 'start_time', 'end_time')
+
+
+class RollupDelta:
+    """
+    Accumulated rollup changes, applied in one go.
+
+    Usage:
+        delta = RollupDelta()
+        delta.add(old_booking_state, -1)
+        delta.add(new_booking_state)
+        delta.apply()
+    """
+
+    def __init__(self):
+        # (date, provider id, service id, status) -> [count, revenue, minutes]
+        self.changes = defaultdict(lambda: [0, Decimal('0'), 0])
+        self.counters = CounterDelta()
+
+    def add(self, state, sign=1):
+        """Count a booking in (sign=1) or out (sign=-1); `state` is a booking_state() tuple"""
+        day, provider_id, service_id, status, price, start_time, end_time = state
+        change = self.changes[(day, provider_id, service_id, status)]
+        change[0] += sign
+        change[1] += sign * (price or 0)
+        change[2] += sign * (to_minutes(end_time) - to_minutes(start_time))
+        self.counters.add(provider_id, status, price, sign)
+
+    def add_booking(self, booking, sign=1):
+        self.add(booking_state(booking), sign)
+
+    def apply(self):
+        increments, decrements = [], []
+        for key, (count, revenue, minutes) in self.changes.items():
+            if count > 0:
+                increments.append((key, count, revenue, minutes))
+            elif count < 0:
+                decrements.append((key, -count, -revenue, -minutes))
+            elif revenue or minutes:
+                # A booking that changed price or times but stayed in its row
+                increments.append((key, 0, revenue, minutes))
+        self.changes.clear()
+
+        table = connection.ops.quote_name(BookingDailyRollup._meta.db_table)
+        with connection.cursor() as cursor:
+            if increments:
+                cursor.executemany(
+                    f'INSERT INTO {table} (date, provider_id, service_id, status, booking_count, revenue, minutes) '
+                    f'VALUES (%s, %s, %s, %s, %s, %s, %s) '
+                    f'ON CONFLICT (date, provider_id, service_id, status) DO UPDATE SET '
+                    f'booking_count = {table}.booking_count + excluded.booking_count, '
+                    f'revenue = {table}.revenue + excluded.revenue, '
+                    f'minutes = {table}.minutes + excluded.minutes',
+                    [_row_params(key, count, revenue, minutes) for key, count, revenue, minutes in increments]
+                )
+            if decrements:
+                cursor.executemany(
+                    f'UPDATE {table} SET booking_count = booking_count - %s, '
+                    f'revenue = revenue - %s, minutes = minutes - %s '
+                    f'WHERE date = %s AND provider_id = %s AND service_id = %s AND status = %s',
+                    [
+                        (count, _decimal_param(revenue), minutes, *_key_params(key))
+                        for key, count, revenue, minutes in decrements
+                    ]
+                )
+        self.counters.apply()
+
+
+def _decimal_param(value):
+    return connection.ops.adapt_decimalfield_value(value, 12, 2)
+
+
+def _key_params(key):
+    day, provider_id, service_id, status = key
+    return connection.ops.adapt_datefield_value(day), provider_id, service_id, status
+
+
+def _row_params(key, count, revenue, minutes):
+    return (*_key_params(key), count, _decimal_param(revenue), minutes)
+
+
+def booking_state(booking):
+    """The ROLLUP_FIELDS values of a booking instance"""
+    return tuple(getattr(booking, field) for field in ROLLUP_FIELDS)
+
+
+def stored_booking_state(booking_id):
+    """The ROLLUP_FIELDS values of a booking as stored in the database, None if it does not exist"""
+    return Booking.objects.filter(id=booking_id).values_list(*ROLLUP_FIELDS).first()
+
+
+def record_bookings(bookings, sign=1):
+    """Count bookings written with bulk_create() (or deleted in bulk, with sign=-1)"""
+    delta = RollupDelta()
+    for booking in bookings:
+        delta.add_booking(booking, sign)
+    delta.apply()
+
+
+def rebuild_rollups(since=None, chunk_days=REBUILD_CHUNK_DAYS, progress=None):
+    """
+    Recompute the rollups from the bookings, from `since` (default: all
+    history) on, one transaction per range of `chunk_days` days. progress,
+    when given, is called with (first day, last day, rows written) after
+    each chunk. Returns the number of rows written.
+    """
+    bookings = Booking.objects.order_by()
+    rollups = BookingDailyRollup.objects.all()
+    if since is not None:
+        bookings = bookings.filter(date__gte=since)
+        rollups = rollups.filter(date__gte=since)
+
+    bounds = bookings.aggregate(first=Min('date'), last=Max('date'))
+    if bounds['first'] is None:
+        rollups.delete()
+        return 0
+    # Rollups of days outside the bookings' range are stale
+    rollups.filter(Q(date__lt=bounds['first']) | Q(date__gt=bounds['last'])).delete()
+
+    duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+    written = 0
+    chunk_start = bounds['first']
+    while chunk_start <= bounds['last']:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), bounds['last'])
+        rows = bookings.filter(date__range=(chunk_start, chunk_end)).values(
+            'date', 'provider_id', 'service_id', 'status'
+        ).annotate(booking_count=Count('id'), revenue=Sum('price'), booked=Sum(duration))
+
+        with transaction.atomic():
+            BookingDailyRollup.objects.filter(date__range=(chunk_start, chunk_end)).delete()
+            created = BookingDailyRollup.objects.bulk_create([
+                BookingDailyRollup(
+                    date=row['date'], provider_id=row['provider_id'], service_id=row['service_id'],
+                    status=row['status'], booking_count=row['booking_count'], revenue=row['revenue'] or 0,
+                    minutes=int(row['booked'].total_seconds() // 60) if row['booked'] else 0,
+                )
+                for row in rows
+            ], batch_size=1000)
+        written += len(created)
+
+        if progress is not None:
+            progress(chunk_start, chunk_end, written)
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return written
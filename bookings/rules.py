@@ -0,0 +1,210 @@
+# bookings/rules.py
+"""
+Recurring availability rules.
+
+Every bookable slot used to be a materialized Availability row: 30 minute
+slots from 9 to 18 on weekdays for a year are about 4,700 rows per
+service, written up front and mostly never booked. An AvailabilityRule
+stores the same offer as one row (weekday mask, time window, date range,
+excluded dates), and this module expands rules into slots for just the
+days a page asks for:
+
+    rule_slots()           the slots of a service's rules on some days
+    service_day_slots()    a day's Availability rows and rule slots merged
+    service_days_slots()   the same for a range of days, such as a week
+    materialize_slot()     turn a rule slot into an Availability row, at
+                           booking time only (book_slot() calls it)
+
+A rule slot is identified by a token (see slot_token()), which the
+availability page posts instead of an Availability id. Rows win over rule
+slots with the same start, so a booked rule slot shows as booked.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.db.models import Max, Min, Q
+
+from .models import Availability, AvailabilityRule
+from .scheduling import SlotUnavailable, from_minutes, matches_repeat_pattern, to_minutes
+
+# Rules without an end date are expanded this far ahead at most
+RULE_HORIZON_DAYS = 365
+
+SLOT_TOKEN_PREFIX = 'r'
+
+# A slot offered by a rule; not stored
+RuleSlot = namedtuple('RuleSlot', ('rule_id', 'provider_id', 'service_id', 'date', 'start_time', 'end_time'))
+
+
+def weekday_mask(weekdays):
+    """Bit mask of weekday numbers (Monday = 0)"""
+    mask = 0
+    for weekday in weekdays:
+        mask |= 1 << weekday
+    return mask
+
+
+def repeat_pattern_mask(repeat_pattern, selected_days=()):
+    """The weekday mask of an add_availability repeat pattern"""
+    # Any week has each weekday once
+    monday = date(2024, 1, 1)
+    return weekday_mask(
+        offset for offset in range(7)
+        if matches_repeat_pattern(monday + timedelta(days=offset), repeat_pattern, selected_days)
+    )
+
+
+def rule_days(rule, start, end):
+    """The days in [start, end] on which a rule offers slots"""
+    first = max(start, rule.start_date)
+    last = min(end, rule.end_date or date.max, date.today() + timedelta(days=RULE_HORIZON_DAYS))
+    excluded = set(rule.excluded_dates)
+    day = first
+    while day <= last:
+        if rule.weekdays & (1 << day.weekday()) and day.isoformat() not in excluded:
+            yield day
+        day += timedelta(days=1)
+
+
+def expand_rule(rule, duration, start, end):
+    """RuleSlots of `duration` minutes that fit the rule's window on the days in [start, end]"""
+    window_start, window_end = to_minutes(rule.start_time), to_minutes(rule.end_time)
+    starts = range(window_start, window_end - duration + 1, duration)
+    for day in rule_days(rule, start, end):
+        for slot_start in starts:
+            yield RuleSlot(rule.id, rule.provider_id, rule.service_id, day,
+                           from_minutes(slot_start), from_minutes(slot_start + duration))
+
+
+def rules_between(start, end):
+    """Q for the rules whose date range overlaps [start, end]"""
+    return Q(start_date__lte=end) & (Q(end_date__isnull=True) | Q(end_date__gte=start))
+
+
+def rule_slots(service, start, end, rules=None):
+    """The slots the service's rules offer on the days in [start, end], one query"""
+    if rules is None:
+        rules = AvailabilityRule.objects.filter(rules_between(start, end), service=service)
+    for rule in rules:
+        yield from expand_rule(rule, service.duration, start, end)
+
+
+def service_day_slots(service, day):
+    """
+    The slots of a service on one day, ordered by start time: its
+    Availability rows plus the rule slots no row starts at.
+    Returns (token or row id, start_time, end_time, is_available) tuples.
+    """
+    return service_days_slots(service, day, day)[day]
+
+
+def service_days_slots(service, start, end):
+    """
+    service_day_slots() for every day in [start, end], with one query for
+    the rows and one for the rules. Returns {date: [slot tuples]}.
+    """
+    days = {}
+    day = start
+    while day <= end:
+        days[day] = []
+        day += timedelta(days=1)
+
+    rows = Availability.objects.filter(
+        provider_id=service.provider_id, service=service, date__range=(start, end)
+    ).order_by('date', 'start_time').values_list('date', 'id', 'start_time', 'end_time', 'is_available')
+    taken = set()
+    for day, *slot in rows:
+        days[day].append(tuple(slot))
+        taken.add((day, slot[1]))
+
+    for slot in rule_slots(service, start, end):
+        if (slot.date, slot.start_time) not in taken:
+            taken.add((slot.date, slot.start_time))
+            days[slot.date].append((slot_token(slot), slot.start_time, slot.end_time, True))
+    for slots in days.values():
+        slots.sort(key=lambda slot: slot[1])
+    return days
+
+
+def offered_range(service, today=None):
+    """(first, last) day from today on with an open row or a rule slot, None when there is none"""
+    today = today or date.today()
+    rows = Availability.objects.filter(
+        provider_id=service.provider_id, service=service, date__gte=today, is_available=True
+    ).aggregate(first=Min('date'), last=Max('date'))
+    first, last = rows['first'], rows['last']
+
+    horizon = today + timedelta(days=RULE_HORIZON_DAYS)
+    for rule in AvailabilityRule.objects.filter(rules_between(today, horizon), service=service):
+        rule_first = next(rule_days(rule, today, horizon), None)
+        if rule_first is None:
+            continue
+        rule_last = min(rule.end_date or horizon, horizon)
+        first = min(first or rule_first, rule_first)
+        last = max(last or rule_last, rule_last)
+    return (first, last) if first is not None else None
+
+
+def first_rule_dates(provider_ids, today=None):
+    """
+    {provider id: first day from today on a rule offers slots}, one query.
+    A day whose rule slots are all booked still counts.
+    """
+    today = today or date.today()
+    horizon = today + timedelta(days=RULE_HORIZON_DAYS)
+    first_dates = {}
+    for rule in AvailabilityRule.objects.filter(rules_between(today, horizon), provider_id__in=provider_ids):
+        day = next(rule_days(rule, today, horizon), None)
+        if day is not None and (rule.provider_id not in first_dates or day < first_dates[rule.provider_id]):
+            first_dates[rule.provider_id] = day
+    return first_dates
+
+
+def slot_token(slot):
+    """Identifier of a RuleSlot for forms: r<rule id>-<YYYYMMDD>-<HHMM>"""
+    return f'{SLOT_TOKEN_PREFIX}{slot.rule_id}-{slot.date:%Y%m%d}-{slot.start_time:%H%M}'
+
+
+def is_slot_token(value):
+    return isinstance(value, str) and value.startswith(SLOT_TOKEN_PREFIX)
+
+
+def parse_slot_token(token):
+    """(rule id, date, start time) of a slot token; raises ValueError when malformed"""
+    rule_id, day, start = token[len(SLOT_TOKEN_PREFIX):].split('-')
+    return int(rule_id), datetime.strptime(day, '%Y%m%d').date(), datetime.strptime(start, '%H%M').time()
+
+
+def materialize_slot(service, token):
+    """
+    The Availability row of a rule slot, created on first use. Raises
+    SlotUnavailable when the token does not name a current slot of one of
+    the service's rules. Called by book_slot() inside its transaction and
+    lock retries.
+    """
+    try:
+        rule_id, day, start_time = parse_slot_token(token)
+    except ValueError:
+        raise SlotUnavailable("Selected time slot is not available.")
+
+    rule = AvailabilityRule.objects.filter(id=rule_id, service=service).first()
+    slot = None
+    if rule is not None and day >= date.today():
+        slot = next((slot for slot in expand_rule(rule, service.duration, day, day)
+                     if slot.start_time == start_time), None)
+    if slot is None:
+        raise SlotUnavailable("Selected time slot is not available.")
+
+    # Availability is unique per (provider, service, date, start time):
+    # of two first bookings of a slot, the second one gets the first one's
+    # row, and book_slot() decides which of them can still book it
+    availability, _ = Availability.objects.get_or_create(
+        provider_id=slot.provider_id, service=service, date=slot.date, start_time=slot.start_time,
+        defaults={'end_time': slot.end_time, 'is_available': True},
+    )
+    return availability
+
+
+def offered_by_rule(service, day, start_time):
+    """Whether one of the service's rules offers a slot starting at start_time on day"""
+    return any(slot.start_time == start_time for slot in rule_slots(service, day, day))
@@ -0,0 +1,367 @@
+# bookings/scheduling.py
+"""
+Slot scheduling helpers shared by the booking views.
+
+Times are handled as minutes since midnight so overlap checks are plain
+integer comparisons instead of repeated datetime.combine() calls.
+"""
+import time as timer
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, OperationalError, connection, transaction
+
+from .models import Availability, Booking
+from .provider_stats import refresh_next_available_dates
+
+# Bookings in these states block a time range for the provider
+ACTIVE_BOOKING_STATUSES = ['pending', 'confirmed']
+
+MINUTES_PER_DAY = 24 * 60
+
+# How often book_slot() retries when SQLite reports the database as locked
+LOCK_RETRIES = 5
+LOCK_RETRY_DELAY = 0.05  # seconds, grows linearly per attempt
+
+
+class SlotUnavailable(Exception):
+    """Raised when a slot can no longer be booked; the message is user-facing"""
+
+
+def to_minutes(value):
+    """Convert a datetime.time into minutes since midnight"""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    """Convert minutes since midnight back into a datetime.time"""
+    return time(*divmod(minutes % MINUTES_PER_DAY, 60))
+
+
+def slot_bounds(start_time, duration=None, end_time=None):
+    """
+    Return (start, end) in minutes for a slot.
+
+    The end is either start + duration or the given end_time. A range that
+    wraps past midnight is clamped to the end of the day.
+    """
+    start = to_minutes(start_time)
+    if duration is not None:
+        end = start + duration
+    else:
+        end = to_minutes(end_time)
+    if end <= start or end > MINUTES_PER_DAY:
+        end = MINUTES_PER_DAY
+    return start, end
+
+
+def overlapping_start_lookups(start, end, duration):
+    """
+    Filter kwargs for slots whose [start_time, start_time + duration)
+    overlaps [start, end), with all values in minutes.
+    """
+    lookups = {}
+    if start - duration >= 0:
+        lookups['start_time__gt'] = from_minutes(start - duration)
+    if end < MINUTES_PER_DAY:
+        lookups['start_time__lt'] = from_minutes(end)
+    return lookups
+
+
+def matches_repeat_pattern(day, repeat_pattern, selected_days=()):
+    """Check if a date is included by an add_availability repeat pattern"""
+    if repeat_pattern == "daily":
+        return True
+    if repeat_pattern == "weekdays":
+        # Monday = 0, Sunday = 6
+        return day.weekday() < 5
+    if repeat_pattern == "weekends":
+        return day.weekday() >= 5
+    if repeat_pattern == "custom" and selected_days:
+        # selected_days contains day names like ['monday', 'wednesday', 'friday']
+        return day.strftime('%A').lower() in selected_days
+    return False
+
+
+def iter_bulk_slots(start_date, end_date, start_time, end_time, duration,
+                    repeat_pattern="daily", selected_days=()):
+    """
+    Yield (date, start_time, end_time) for every slot of `duration` minutes
+    that fits between start_time and end_time on the matching dates.
+    """
+    current_date = start_date
+    while current_date <= end_date:
+        if matches_repeat_pattern(current_date, repeat_pattern, selected_days):
+            slot_start = datetime.combine(current_date, start_time)
+            day_end = datetime.combine(current_date, end_time)
+            while True:
+                slot_end = slot_start + timedelta(minutes=duration)
+                if slot_end > day_end:
+                    break
+                yield current_date, slot_start.time(), slot_end.time()
+                slot_start = slot_end
+        current_date += timedelta(days=1)
+
+
+class IntervalIndex:
+    """
+    Static interval index over the bookings of one provider on one day.
+
+    Intervals are sorted by start and paired with a running maximum of the
+    end times, so "does [start, end) overlap anything?" is a single binary
+    search: among the intervals starting before `end`, check whether the
+    furthest-reaching one ends after `start`.
+    """
+
+    def __init__(self, intervals=()):
+        ordered = sorted(intervals)
+        self._starts = [start for start, _ in ordered]
+        self._max_ends = []
+        furthest = -1
+        for _, end in ordered:
+            furthest = max(furthest, end)
+            self._max_ends.append(furthest)
+
+    @classmethod
+    def for_provider_day(cls, provider, date, exclude=None):
+        """Build the index from the provider's active bookings on a date"""
+        bookings = Booking.objects.filter(
+            provider=provider,
+            date=date,
+            status__in=ACTIVE_BOOKING_STATUSES
+        )
+        if exclude is not None:
+            bookings = bookings.exclude(id=exclude)
+
+        return cls.from_times(bookings.values_list('start_time', 'end_time'))
+
+    @classmethod
+    def for_provider_days(cls, provider, start, end):
+        """{date: index} of the provider's active bookings on the days in [start, end], one query"""
+        times = defaultdict(list)
+        bookings = Booking.objects.filter(
+            provider=provider,
+            date__range=(start, end),
+            status__in=ACTIVE_BOOKING_STATUSES
+        ).values_list('date', 'start_time', 'end_time')
+        for day, start_time, end_time in bookings:
+            times[day].append((start_time, end_time))
+
+        indexes = {}
+        day = start
+        while day <= end:
+            indexes[day] = cls.from_times(times[day])
+            day += timedelta(days=1)
+        return indexes
+
+    @classmethod
+    def from_times(cls, times):
+        """Build the index from (start_time, end_time) pairs"""
+        return cls(slot_bounds(start_time, end_time=end_time) for start_time, end_time in times)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlaps(self, start, end):
+        """True if [start, end) (in minutes) overlaps any indexed interval"""
+        # Number of intervals that start before the proposed end
+        candidates = bisect_left(self._starts, end)
+        return candidates > 0 and self._max_ends[candidates - 1] > start
+
+    def overlaps_slot(self, start_time, duration=None, end_time=None):
+        """Same as overlaps() but takes datetime.time values"""
+        return self.overlaps(*slot_bounds(start_time, duration, end_time))
+
+
+def book_slot(customer, service, availability_id):
+    """
+    Book an availability slot for a customer as one atomic unit.
+
+    availability_id can also be the token of a rule slot (bookings/rules.py),
+    whose Availability row is created here, in the same transaction.
+
+    Raises SlotUnavailable when another request got there first or the slot
+    overlaps an active booking. Lock timeouts on SQLite are retried, so
+    losing a race always ends in SlotUnavailable rather than a 500.
+    """
+    for attempt in range(1, LOCK_RETRIES + 1):
+        try:
+            return _book_slot(customer, service, availability_id)
+        except IntegrityError:
+            # The slot still carries an earlier booking row (one booking per slot)
+            raise SlotUnavailable("This slot is already booked.")
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == LOCK_RETRIES:
+                raise
+            timer.sleep(LOCK_RETRY_DELAY * attempt)
+
+
+def _book_slot(customer, service, availability_id):
+    from .rules import is_slot_token, materialize_slot
+
+    with transaction.atomic():
+        # A rule slot (bookings/rules.py) only becomes a row now
+        if is_slot_token(availability_id):
+            availability_id = materialize_slot(service, availability_id).id
+
+        # Claim the slot with a conditional UPDATE before reading anything,
+        # so exactly one of several concurrent requests can win it
+        claimed = Availability.objects.filter(
+            id=availability_id,
+            is_available=True
+        ).update(is_available=False)
+
+        if not claimed:
+            raise SlotUnavailable("Selected time slot is not available.")
+
+        availability = Availability.objects.get(id=availability_id)
+
+        # Serialize bookings per provider where the backend has row locks
+        # (SQLite already serializes writers at the UPDATE above)
+        if connection.features.has_select_for_update:
+            list(User.objects.select_for_update().filter(
+                id=availability.provider_id).values_list('id', flat=True))
+
+        # Check if the new booking would overlap with any existing booking
+        booking_index = IntervalIndex.for_provider_day(availability.provider_id, availability.date)
+        if booking_index.overlaps_slot(availability.start_time, service.duration):
+            raise SlotUnavailable(
+                "This time slot conflicts with an existing booking. Please choose another time.")
+
+        start, end = slot_bounds(availability.start_time, service.duration)
+
+        booking = Booking.objects.create(
+            customer=customer,
+            provider_id=availability.provider_id,
+            service=service,
+            availability=availability,
+            date=availability.date,
+            start_time=availability.start_time,
+            end_time=from_minutes(start + service.duration),  # End time based on duration
+            price=service.price,
+            status="pending"
+        )
+
+        # Mark any other availability slots that would conflict as unavailable
+        Availability.objects.filter(
+            provider_id=availability.provider_id,
+            service=service,
+            date=availability.date,
+            is_available=True,
+            **overlapping_start_lookups(start, end, service.duration)
+        ).update(is_available=False)
+
+        refresh_next_available_dates([availability.provider_id])
+
+    return booking
+
+
+def merge_intervals(intervals):
+    """Merge (start, end) intervals into sorted, disjoint busy ranges"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def unblocked_slots(slots, busy, duration):
+    """
+    Sweep sorted slots against sorted busy ranges.
+
+    slots is an iterable of (slot_id, start) with start in minutes and busy
+    the result of merge_intervals(); returns the ids of the slots whose
+    [start, start + duration) does not overlap any busy range.
+    """
+    free = []
+    j = 0
+    for slot_id, start in sorted(slots, key=lambda slot: slot[1]):
+        end = min(start + duration, MINUTES_PER_DAY)
+        # Busy ranges ending before this slot can't block it or any later slot
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        if j == len(busy) or busy[j][0] >= end:
+            free.append(slot_id)
+    return free
+
+
+def release_booking(booking, delete=False, actor=None):
+    """
+    Cancel a booking (or delete it, for customer cancellations) and reopen
+    the slots it blocked, as one atomic unit. A BookingService transition
+    (bookings/transitions.py); raises InvalidTransition when the booking
+    cannot be cancelled. Returns the number of reopened slots.
+    """
+    # transitions.py builds on this module
+    from .transitions import BookingService
+    return BookingService(actor=actor).cancel(booking, delete=delete).reopened
+
+
+# Ids per UPDATE ... WHERE id IN (...) when reopening or closing slots in bulk
+SLOT_UPDATE_BATCH_SIZE = 500
+
+
+def recompute_availability(provider_days):
+    """
+    Bring the slots of the given (provider_id, date) pairs back in line with
+    their active bookings, after bookings changed status in bulk:
+
+        closed slot overlapping no active booking        -> reopened
+        open slot overlapping an active booking of its
+        own service (what book_slot() closes)            -> closed
+
+    Returns (reopened, closed) slot counts.
+    """
+    provider_days = set(provider_days)
+    if not provider_days:
+        return 0, 0
+    provider_ids = {provider_id for provider_id, _ in provider_days}
+    dates = {day for _, day in provider_days}
+
+    busy = defaultdict(list)  # (provider_id, date) -> [(start, end)]
+    busy_by_service = defaultdict(list)  # (provider_id, date, service_id) -> [(start, end)]
+    bookings = Booking.objects.filter(
+        provider_id__in=provider_ids,
+        date__in=dates,
+        status__in=ACTIVE_BOOKING_STATUSES
+    ).values_list('provider_id', 'date', 'service_id', 'start_time', 'end_time')
+    for provider_id, day, service_id, start_time, end_time in bookings:
+        if (provider_id, day) in provider_days:
+            interval = slot_bounds(start_time, end_time=end_time)
+            busy[provider_id, day].append(interval)
+            busy_by_service[provider_id, day, service_id].append(interval)
+
+    # (provider_id, date, service_id, duration, is_available) -> [(slot_id, start)]
+    slot_groups = defaultdict(list)
+    slots = Availability.objects.filter(
+        provider_id__in=provider_ids,
+        date__in=dates,
+        service__isnull=False
+    ).values_list('id', 'provider_id', 'date', 'service_id', 'service__duration', 'start_time', 'is_available')
+    for slot_id, provider_id, day, service_id, duration, start_time, is_available in slots:
+        if (provider_id, day) in provider_days:
+            slot_groups[provider_id, day, service_id, duration, is_available].append(
+                (slot_id, to_minutes(start_time)))
+
+    to_open = []
+    to_close = []
+    for (provider_id, day, service_id, duration, is_available), group in slot_groups.items():
+        if is_available:
+            blocking = merge_intervals(busy_by_service[provider_id, day, service_id])
+            still_free = set(unblocked_slots(group, blocking, duration))
+            to_close.extend(slot_id for slot_id, _ in group if slot_id not in still_free)
+        else:
+            to_open.extend(unblocked_slots(group, merge_intervals(busy[provider_id, day]), duration))
+
+    for ids, is_available in ((to_open, True), (to_close, False)):
+        for i in range(0, len(ids), SLOT_UPDATE_BATCH_SIZE):
+            Availability.objects.filter(
+                id__in=ids[i:i + SLOT_UPDATE_BATCH_SIZE]).update(is_available=is_available)
+    if to_open or to_close:
+        refresh_next_available_dates(provider_ids)
+
+    return len(to_open), len(to_close)
@@ -0,0 +1,227 @@
+# bookings/search.py
+"""
+Full-text search over services.
+
+search_services() goes through a pluggable backend instead of ORing
+icontains lookups (a LIKE '%q%' full scan per column):
+
+    SQLite   - FTS5 virtual table bookings_service_fts, kept in sync by the
+               signals in bookings/signals.py
+    Postgres - tsvector/tsquery via django.contrib.postgres.search
+    other    - the old icontains filter
+
+Every backend annotates matches with `search_rank` (higher is better) so the
+`relevance` sort can order by it. Set SEARCH_BACKEND to 'fts5', 'postgres' or
+'like' to override the automatic choice.
+
+Code that writes services in bulk (bulk_create, queryset.update) bypasses
+the signals; run `python manage.py rebuild_search_index` afterwards.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, CharField, F, FloatField, Lookup, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Service, ServiceSearchEntry
+
+FTS_TABLE = 'bookings_service_fts'
+
+# Column order of the FTS5 table; the rowid is the service id
+FTS_COLUMNS = ('name', 'description', 'category', 'provider')
+
+# bm25() weights per column: matches in the name or provider count the most
+FTS_WEIGHTS = (10.0, 2.0, 4.0, 6.0)
+
+REBUILD_BATCH_SIZE = 2000
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class Match(Lookup):
+    """`document MATCH query` against an FTS5 table"""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+ServiceSearchEntry._meta.get_field('document').register_lookup(Match)
+
+
+def search_terms(query):
+    """Split a raw search box query into plain words"""
+    return _WORD_RE.findall(query.lower())
+
+
+def category_label(category):
+    return dict(Service.CATEGORY_CHOICES).get(category, category)
+
+
+def service_document(name, description, category, username, first_name, last_name):
+    """The FTS5 row (in FTS_COLUMNS order) for one service"""
+    provider = ' '.join(part for part in (username, first_name, last_name) if part)
+    return name, description, category_label(category), provider
+
+
+class SearchBackend:
+    """Interface of the search backends"""
+
+    def search(self, services, query):
+        """Filter a Service queryset to the matches and annotate `search_rank`"""
+        raise NotImplementedError
+
+    def no_matches(self, services):
+        """Empty result for queries without any searchable word"""
+        return services.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index_services(self, service_ids):
+        """(Re)index the given services; deleted or unknown ids are dropped"""
+
+    def rebuild(self):
+        """Rebuild the whole index, returns the number of indexed services"""
+        return 0
+
+
+class LikeSearchBackend(SearchBackend):
+    """Fallback that keeps the original icontains behaviour, without ranking"""
+
+    def search(self, services, query):
+        return services.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(category__icontains=query) |
+            Q(provider__username__icontains=query) |
+            Q(provider__first_name__icontains=query) |
+            Q(provider__last_name__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class FTS5SearchBackend(SearchBackend):
+    """SQLite FTS5 index with bm25 ranking and prefix matching on every word"""
+
+    def match_expression(self, query):
+        # Quote every word so user input can never be parsed as FTS5 syntax
+        return ' '.join(f'"{term}"*' for term in search_terms(query))
+
+    def search(self, services, query):
+        match = self.match_expression(query)
+        if not match:
+            return self.no_matches(services)
+
+        # Join the index by rowid and run one MATCH: SQLite scans the FTS5
+        # matches first and looks each service up by its primary key.
+        # bm25() only works in the query that runs the MATCH.
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return services.filter(search_entry__document__match=match).annotate(
+            search_rank=RawSQL(f'-bm25({FTS_TABLE}, {weights})', (), output_field=FloatField())
+        )
+
+    def index_services(self, service_ids):
+        service_ids = list(service_ids)
+        if not service_ids:
+            return
+        rows = Service.objects.filter(id__in=service_ids).values_list(
+            'id', 'name', 'description', 'category',
+            'provider__username', 'provider__first_name', 'provider__last_name'
+        )
+        placeholders = ', '.join(['%s'] * len(service_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', service_ids)
+            self._insert(cursor, rows)
+
+    def rebuild(self):
+        rows = Service.objects.order_by('id').values_list(
+            'id', 'name', 'description', 'category',
+            'provider__username', 'provider__first_name', 'provider__last_name'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            return self._insert(cursor, rows.iterator(chunk_size=REBUILD_BATCH_SIZE))
+
+    def _insert(self, cursor, rows):
+        columns = ', '.join(FTS_COLUMNS)
+        sql = f'INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (%s, %s, %s, %s, %s)'
+        total = 0
+        batch = []
+        for service_id, *fields in rows:
+            batch.append((service_id, *service_document(*fields)))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            total += len(batch)
+        return total
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector/tsquery full-text search computed by Postgres"""
+
+    def search(self, services, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        if not search_terms(query):
+            return self.no_matches(services)
+
+        label = Case(
+            *[When(category=key, then=Value(label)) for key, label in Service.CATEGORY_CHOICES],
+            default=F('category'),
+            output_field=CharField(),
+        )
+        vector = (
+            SearchVector('name', weight='A')
+            + SearchVector('provider__username', 'provider__first_name', 'provider__last_name', weight='A')
+            + SearchVector(label, weight='B')
+            + SearchVector('description', weight='C')
+        )
+        search_query = SearchQuery(' & '.join(f'{term}:*' for term in search_terms(query)),
+                                   search_type='raw')
+        return services.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(vector, search_query),
+        ).filter(search_vector=search_query)
+
+
+BACKENDS = {
+    'fts5': FTS5SearchBackend,
+    'postgres': PostgresSearchBackend,
+    'like': LikeSearchBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    """True if the SQLite library Python is linked against has FTS5 compiled in"""
+    import sqlite3
+
+    db = sqlite3.connect(':memory:')
+    try:
+        options = {row[0] for row in db.execute('PRAGMA compile_options')}
+    finally:
+        db.close()
+    return 'ENABLE_FTS5' in options
+
+
+def get_backend():
+    """The search backend for the default database"""
+    name = getattr(settings, 'SEARCH_BACKEND', None)
+    if name is None:
+        if connection.vendor == 'sqlite' and fts5_available():
+            name = 'fts5'
+        elif connection.vendor == 'postgresql':
+            name = 'postgres'
+        else:
+            name = 'like'
+    return BACKENDS[name]()
+
+
+def search(services, query):
+    """Filter and rank a Service queryset for a search box query"""
+    return get_backend().search(services, query)
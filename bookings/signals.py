@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from accounts.models import UserProfile
-from .models import ProviderProfile
+from accounts.roles import invalidate_role
+from .models import Booking, Notification, ProviderProfile, Service
+from .notifications import invalidate_unread_count, notify_status_changes
+from .provider_stats import touch_schedules
+from .rollups import RollupDelta, booking_state, stored_booking_state
+from .search import get_backend as get_search_backend
+from .stats import invalidate_platform_stats
+from .transitions import booking_status_changed
+
+# User fields that end up in the search index of their services
+SEARCHED_USER_FIELDS = {'username', 'first_name', 'last_name'}
 
 
 @receiver(post_save, sender=UserProfile)
@@ -23,7 +34,6 @@ def create_provider_profile(sender, instance, created, **kwargs):
                 kvk_number=instance.kvk_number or '',
                 years_experience=0,
                 rating=0.0,
-                total_bookings=0,
                 is_verified=False,
                 is_active=True,
             )
@@ -49,3 +59,101 @@ def delete_provider_profile_if_not_provider(sender, instance, **kwargs):
                 instance.user.provider_profile.delete()
         except ProviderProfile.DoesNotExist:
             pass
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def reset_unread_notification_count(sender, instance, **kwargs):
+    """
+    Drop the cached unread counter of the notification's user.
+    Bulk writes (bulk_create/update) skip this and invalidate explicitly.
+    """
+    invalidate_unread_count(instance.user_id)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def update_service_search_index(sender, instance, **kwargs):
+    """Keep the full-text search index in sync with the service"""
+    get_search_backend().index_services([instance.id])
+
+
+@receiver(post_save, sender=User)
+def update_provider_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Reindex a provider's services when their name changes
+    (skips saves like the last_login update on every login)
+    """
+    if update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields):
+        return
+    service_ids = list(instance.services.values_list('id', flat=True))
+    get_search_backend().index_services(service_ids)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=ProviderProfile)
+@receiver(post_delete, sender=ProviderProfile)
+def reset_user_role(sender, instance, **kwargs):
+    """Make the sessions of the profile's user resolve their role again"""
+    invalidate_role(instance.user_id)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_rollup_state(sender, instance, **kwargs):
+    """Load the stored state of a booking about to be updated, to move it between rollups"""
+    instance._rollup_state = None if instance._state.adding else stored_booking_state(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_rollups_on_save(sender, instance, **kwargs):
+    """Keep the daily rollups in sync with a created or updated booking"""
+    delta = RollupDelta()
+    old_state = getattr(instance, '_rollup_state', None)
+    if old_state is not None:
+        delta.add(old_state, -1)
+    delta.add_booking(instance)
+    delta.apply()
+
+
+@receiver(post_delete, sender=Booking)
+def update_booking_rollups_on_delete(sender, instance, **kwargs):
+    """Take a deleted booking out of the daily rollups"""
+    delta = RollupDelta()
+    delta.add(booking_state(instance), -1)
+    delta.apply()
+
+
+@receiver(booking_status_changed)
+def update_booking_rollups_on_transition(sender, changes, deleted, **kwargs):
+    """
+    Move transitioned bookings between the daily rollups (and provider
+    counters). Deleted bookings already left them through post_delete.
+    """
+    if deleted:
+        return
+    delta = RollupDelta()
+    for change in changes:
+        delta.add((change.date, change.provider_id, change.service_id, change.old_status,
+                   change.price, change.start_time, change.end_time), -1)
+        delta.add((change.date, change.provider_id, change.service_id, change.status,
+                   change.price, change.start_time, change.end_time))
+    delta.apply()
+
+
+@receiver(booking_status_changed)
+def notify_customers_of_transition(sender, changes, actor=None, **kwargs):
+    """Tell customers their booking changed, unless they changed it themselves"""
+    notify_status_changes(changes, actor)
+
+
+@receiver(booking_status_changed)
+def touch_schedules_on_transition(sender, changes, **kwargs):
+    """The availability grid greys out slots that overlap active bookings"""
+    touch_schedules({change.provider_id for change in changes})
+
+
+@receiver(booking_status_changed)
+def reset_platform_stats_on_transition(sender, **kwargs):
+    """The superadmin dashboard totals include the booking statuses"""
+    invalidate_platform_stats()
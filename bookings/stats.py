@@ -0,0 +1,173 @@
+# bookings/stats.py
+"""
+Aggregate booking statistics for the dashboards.
+
+Every number comes out of a single conditional-aggregation query instead of
+one count()/aggregate() per statistic plus a Python loop for the hours.
+
+RollupStats computes the same numbers from the daily rollups (see
+bookings/rollups.py), reading a few rows per day instead of one per
+booking; the provider and superadmin dashboards use it. The customer
+dashboard keeps BookingStats, the rollups have no customer dimension.
+
+The platform-wide numbers of the superadmin dashboard are also kept in the
+cache for PLATFORM_STATS_TIMEOUT seconds. Booking status changes drop them
+(see bookings/signals.py); other changes may lag that much behind.
+"""
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import Booking, BookingDailyRollup, Service
+
+# Bookings that count towards the total booked hours
+BOOKED_TIME_STATUSES = ['confirmed', 'completed']
+
+
+class BookingStats:
+    """
+    Totals, per-status counts, revenue and booked hours for a set of bookings.
+
+    Usage:
+        stats = BookingStats(Booking.objects.filter(provider=user)).compute()
+        stats['total_bookings'], stats['pending_bookings'], stats['total_hours']
+    """
+
+    def __init__(self, bookings, month_start=None):
+        self.bookings = bookings
+        self.month_start = month_start
+
+    def compute(self):
+        """Run the aggregate query and return the statistics as a dict"""
+        money = DecimalField(max_digits=12, decimal_places=2)
+        duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+        completed = Q(status='completed')
+
+        aggregates = {
+            'total_bookings': Count('id'),
+            'total_revenue': Coalesce(Sum('price', filter=completed), 0, output_field=money),
+            'booked_duration': Sum(duration, filter=Q(status__in=BOOKED_TIME_STATUSES)),
+        }
+        for status, _ in Booking.STATUS_CHOICES:
+            aggregates[f'{status}_bookings'] = Count('id', filter=Q(status=status))
+        if self.month_start is not None:
+            aggregates['month_revenue'] = Coalesce(
+                Sum('price', filter=completed & Q(date__gte=self.month_start)), 0, output_field=money)
+
+        stats = self.bookings.order_by().aggregate(**aggregates)
+
+        booked = stats.pop('booked_duration') or timedelta()
+        stats['total_hours'] = round(booked.total_seconds() / 3600, 1)
+        return stats
+
+
+class RollupStats(BookingStats):
+    """
+    BookingStats numbers from a BookingDailyRollup queryset.
+
+    Usage:
+        stats = RollupStats(BookingDailyRollup.objects.filter(provider=user)).compute()
+    """
+
+    def compute(self):
+        money = DecimalField(max_digits=12, decimal_places=2)
+        completed = Q(status='completed')
+
+        aggregates = {
+            'total_bookings': Coalesce(Sum('booking_count'), 0),
+            'total_revenue': Coalesce(Sum('revenue', filter=completed), 0, output_field=money),
+            'booked_minutes': Coalesce(Sum('minutes', filter=Q(status__in=BOOKED_TIME_STATUSES)), 0),
+        }
+        for status, _ in Booking.STATUS_CHOICES:
+            aggregates[f'{status}_bookings'] = Coalesce(Sum('booking_count', filter=Q(status=status)), 0)
+        if self.month_start is not None:
+            aggregates['month_revenue'] = Coalesce(
+                Sum('revenue', filter=completed & Q(date__gte=self.month_start)), 0, output_field=money)
+
+        stats = self.bookings.order_by().aggregate(**aggregates)
+
+        stats['total_hours'] = round(stats.pop('booked_minutes') / 60, 1)
+        return stats
+
+
+PLATFORM_STATS_CACHE_KEY = 'stats:platform'
+PLATFORM_STATS_TIMEOUT = 60  # seconds
+REVENUE_MONTHS = 6
+TOP_SERVICE_COUNT = 5
+
+
+def month_starts(months, today=None):
+    """The first days of the last `months` calendar months, oldest first"""
+    month = (today or date.today()).replace(day=1)
+    starts = [month]
+    for _ in range(months - 1):
+        month = (month - timedelta(days=1)).replace(day=1)
+        starts.append(month)
+    return starts[::-1]
+
+
+def monthly_revenue(rollups, months=REVENUE_MONTHS, today=None):
+    """Completed revenue per calendar month from daily rollups, grouped in one query"""
+    starts = month_starts(months, today)
+    rows = rollups.filter(status='completed', date__gte=starts[0]).order_by().annotate(
+        month=TruncMonth('date')
+    ).values('month').annotate(revenue=Sum('revenue'))
+    revenue = {row['month']: row['revenue'] for row in rows}
+    return [
+        {'month': start.strftime('%b %Y'), 'revenue': float(revenue.get(start) or 0)}
+        for start in starts
+    ]
+
+
+def top_service_counts(count=TOP_SERVICE_COUNT):
+    """(service id, booking count) of the most booked services, topped up with unbooked ones"""
+    pairs = [
+        (row['service'], row['booking_count'])
+        for row in BookingDailyRollup.objects.order_by().values('service').annotate(
+            booking_count=Sum('booking_count')).filter(booking_count__gt=0)
+        .order_by('-booking_count', 'service')[:count]
+    ]
+    if len(pairs) < count:
+        booked = [service_id for service_id, _ in pairs]
+        pairs.extend(
+            (service_id, 0) for service_id in Service.objects.exclude(id__in=booked)
+            .order_by('id').values_list('id', flat=True)[:count - len(pairs)]
+        )
+    return pairs
+
+
+def platform_stats():
+    """User, service and booking totals for the superadmin dashboard, cached"""
+    stats = cache.get(PLATFORM_STATS_CACHE_KEY)
+    if stats is None:
+        stats = User.objects.aggregate(
+            total_users=Count('id'),
+            total_providers=Count('id', filter=Q(userprofile__user_type='provider')),
+            total_customers=Count('id', filter=Q(userprofile__user_type='user')),
+        )
+        stats.update(Service.objects.aggregate(
+            total_services=Count('id'),
+            active_services=Count('id', filter=Q(is_active=True)),
+        ))
+        stats.update(RollupStats(BookingDailyRollup.objects.all()).compute())
+        stats['monthly_revenue'] = monthly_revenue(BookingDailyRollup.objects.all())
+        stats['top_service_counts'] = top_service_counts()
+        cache.set(PLATFORM_STATS_CACHE_KEY, stats, PLATFORM_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_platform_stats():
+    cache.delete(PLATFORM_STATS_CACHE_KEY)
+
+
+def load_top_services(service_counts):
+    """Services (with their provider) for top_service_counts() pairs, with booking_count set"""
+    counts = dict(service_counts)
+    services = list(Service.objects.filter(id__in=counts).select_related('provider'))
+    for service in services:
+        service.booking_count = counts[service.id]
+    services.sort(key=lambda service: -service.booking_count)
+    return services
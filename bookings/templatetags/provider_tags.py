@@ -1,4 +1,5 @@
 from django import template
+from accounts import roles
 from bookings.models import ProviderProfile
 
 register = template.Library()
@@ -10,7 +11,25 @@ def is_provider(user):
     Template filter to check if a user is a provider
     Usage in template: {% if request.user|is_provider %}
     """
-    return ProviderProfile.is_provider(user)
+    return roles.is_provider(user)
+
+
+@register.filter(name='is_superadmin')
+def is_superadmin(user):
+    """
+    Template filter to check if a user is a superadmin
+    Usage in template: {% if request.user|is_superadmin %}
+    """
+    return roles.is_superadmin(user)
+
+
+@register.filter(name='role_label')
+def role_label(user):
+    """
+    Template filter with the display name of the user's account type
+    Usage in template: {{ request.user|role_label }}
+    """
+    return roles.role_label(user)
 
 
 @register.simple_tag
@@ -1,16 +1,90 @@
-from django.test import TestCase, Client
+import random
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime, timedelta, date, time
 from decimal import Decimal
+from accounts.models import UserProfile
 from .models import (
     ProviderProfile,
     Service,
     Availability,
+    AvailabilityRule,
     Booking,
-    Notification
+    Notification,
+    SearchQuery,
+    BookingDailyRollup,
+    ProviderStats
 )
+from .analytics import SearchLogBuffer
+from .benchmarks import compare_results
+from .bulk import bulk_set_status
+from .datagen import delete_load_data, generate_load_data
+from .pagination import PAGE_SIZE, encode_cursor
+from .provider_stats import reconcile_provider_stats, refresh_next_available_dates
+from .rollups import rebuild_rollups
+from .rules import materialize_slot, rule_slots, slot_token
+from .scheduling import book_slot, merge_intervals, release_booking, unblocked_slots
+from .search import FTS_TABLE, FTS5SearchBackend, fts5_available, get_backend as get_search_backend
+from .stats import PLATFORM_STATS_CACHE_KEY
+from .transitions import BookingService, InvalidTransition, booking_status_changed
+
+
+class BookingTestMixin:
+    """Shared fixtures for booking tests"""
+
+    def create_fixtures(self):
+        """A provider and a customer, the provider's one hour Haircut and tomorrow as self.day"""
+        self.provider_user = User.objects.create_user(username='provider', password='testpass123')
+        UserProfile.objects.create(user=self.provider_user, user_type='provider')
+        self.customer_user = User.objects.create_user(username='customer', password='testpass123')
+        UserProfile.objects.create(user=self.customer_user, user_type='user')
+        self.service = Service.objects.create(
+            provider=self.provider_user,
+            name='Haircut',
+            category='salon_beauty',
+            description='Professional haircut',
+            price=Decimal('35.00'),
+            duration=60
+        )
+        self.day = date.today() + timedelta(days=1)
+
+    def create_slot(self, start, end=None, day=None, **fields):
+        """A slot of the service, as long as the service unless `end` is given"""
+        day = day or self.day
+        if end is None:
+            end = (datetime.combine(day, start) + timedelta(minutes=self.service.duration)).time()
+        return Availability.objects.create(
+            provider=self.provider_user, service=self.service, date=day,
+            start_time=start, end_time=end, **fields
+        )
+
+    def create_booking(self, start, end=None, day=None, status='confirmed', price=None):
+        """A booking of the customer in a closed slot of its own"""
+        slot = self.create_slot(start, end, day, is_available=False)
+        return Booking.objects.create(
+            customer=self.customer_user,
+            provider=self.provider_user,
+            service=self.service,
+            availability=slot,
+            date=slot.date,
+            start_time=slot.start_time,
+            end_time=slot.end_time,
+            price=self.service.price if price is None else price,
+            status=status
+        )
 
 
 class ProviderProfileTestCase(TestCase):
@@ -250,6 +324,89 @@ class AvailabilityTestCase(TestCase):
         self.assertEqual(len(created_slots), 9)
 
 
+class BulkAvailabilityViewTestCase(TestCase):
+    """Test cases for the bulk mode of the add_availability view"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.provider_user = User.objects.create_user(
+            username='provider',
+            password='testpass123'
+        )
+        ProviderProfile.objects.create(
+            user=self.provider_user,
+            service_type='salon_beauty',
+            bio='Salon',
+            city='Amsterdam',
+            phone_number='+31612345678'
+        )
+        self.service = Service.objects.create(
+            provider=self.provider_user,
+            name='Quick Trim',
+            category='salon_beauty',
+            description='Quick hair trim',
+            price=Decimal('20.00'),
+            duration=30
+        )
+        self.client.login(username='provider', password='testpass123')
+
+        # Start on a Monday so the weekday count is predictable
+        today = date.today()
+        self.start_date = today + timedelta(days=7 - today.weekday())
+
+    def post_bulk(self, days, **extra):
+        data = {
+            'mode': 'bulk',
+            'service': self.service.id,
+            'start_date': self.start_date.isoformat(),
+            'end_date': (self.start_date + timedelta(days=days - 1)).isoformat(),
+            'start_time': '09:00',
+            'end_time': '12:00',
+            'repeat_pattern': 'weekdays',
+        }
+        data.update(extra)
+        return self.client.post(reverse('add_availability'), data, follow=True)
+
+    def offered_slots(self, days=180):
+        """The distinct slots the service offers over `days` days, through rows and rules"""
+        end_date = self.start_date + timedelta(days=days - 1)
+        slots = set(Availability.objects.filter(service=self.service).values_list('date', 'start_time'))
+        slots.update((slot.date, slot.start_time) for slot in rule_slots(self.service, self.start_date, end_date))
+        return len(slots)
+
+    def test_bulk_creates_all_slots(self):
+        """Test that every weekday gets its 30 minute slots"""
+        response = self.post_bulk(14)
+
+        # 10 weekdays x 6 half-hour slots between 09:00 and 12:00
+        self.assertEqual(self.offered_slots(), 60)
+        self.assertContains(response, 'created 60 availability slots')
+        self.assertContains(response, '0 duplicate slots skipped')
+
+    def test_bulk_skips_existing_slots(self):
+        """Test that re-running an overlapping range only adds missing slots"""
+        self.post_bulk(7)
+        response = self.post_bulk(14)
+
+        self.assertEqual(self.offered_slots(), 60)
+        self.assertContains(response, 'created 30 availability slots')
+        self.assertContains(response, '30 duplicate slots skipped')
+
+    def test_bulk_query_count_does_not_grow_with_range(self):
+        """Test that the bulk path does not issue a query per slot"""
+
+        with CaptureQueriesContext(connection) as short_range:
+            self.post_bulk(7)
+        AvailabilityRule.objects.all().delete()
+        with CaptureQueriesContext(connection) as long_range:
+            self.post_bulk(180)
+
+        self.assertGreater(self.offered_slots(), 500)
+        # A recurring offer is one rule, not one row per slot
+        self.assertEqual(Availability.objects.count(), 0)
+        self.assertLess(len(long_range), len(short_range) + 10)
+
+
 class BookingTestCase(TestCase):
     """Test cases for Booking model and conflict detection"""
 
@@ -732,3 +889,1401 @@ class NotificationTestCase(TestCase):
         # Refresh from database
         notification.refresh_from_db()
         self.assertTrue(notification.is_read)
+
+
+class IntervalIndexTestCase(BookingTestMixin, TestCase):
+    """Test cases for the per provider-day booking interval index"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+
+    def test_overlap_queries(self):
+        """Test overlap detection against several intervals"""
+        from .scheduling import IntervalIndex
+
+        index = IntervalIndex([(9 * 60, 10 * 60), (8 * 60, 17 * 60 + 30), (12 * 60, 13 * 60)])
+        self.assertTrue(index.overlaps(16 * 60, 17 * 60))  # Inside the long interval
+        self.assertFalse(index.overlaps(17 * 60 + 30, 18 * 60))  # Touching end is free
+        self.assertFalse(index.overlaps(7 * 60, 8 * 60))  # Touching start is free
+        self.assertFalse(IntervalIndex().overlaps(0, 24 * 60))
+
+    def test_for_provider_day_ignores_inactive_bookings(self):
+        """Test that cancelled and completed bookings do not block slots"""
+        from .scheduling import IntervalIndex
+
+        active = self.create_booking(time(9, 0), time(10, 0))
+        self.create_booking(time(11, 0), time(12, 0), status='cancelled')
+        self.create_booking(time(13, 0), time(14, 0), status='completed')
+
+        index = IntervalIndex.for_provider_day(self.provider_user, self.day)
+        self.assertEqual(len(index), 1)
+        self.assertTrue(index.overlaps_slot(time(9, 30), 60))
+        self.assertFalse(index.overlaps_slot(time(11, 0), 60))
+
+        # Excluding the only active booking leaves nothing to conflict with
+        index = IntervalIndex.for_provider_day(self.provider_user, self.day, exclude=active.id)
+        self.assertFalse(index.overlaps_slot(time(9, 30), 60))
+
+    def test_view_availability_marks_conflicting_slots(self):
+        """Test that slots overlapping a booking are shown as unavailable"""
+        self.create_booking(time(10, 0), time(11, 0))
+        for start in (time(9, 0), time(9, 30), time(11, 0)):
+            self.create_slot(start)
+
+        self.client.login(username='customer', password='testpass123')
+        response = self.client.get(
+            reverse('view_availability', args=[self.service.id]),
+            {'date': self.day.isoformat()}
+        )
+
+        availability = {slot['time']: slot['is_available'] for slot in response.context['time_slots']}
+        self.assertEqual(availability, {
+            '09:00': True,
+            '09:30': False,  # 09:30-10:30 runs into the 10:00 booking
+            '10:00': False,  # The booked slot itself
+            '11:00': True,
+        })
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked with SQLite EXPLAIN QUERY PLAN')
+class HotQueryIndexTestCase(BookingTestMixin, TestCase):
+    """Test that the hot availability/booking queries use the composite indexes"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        self.today = date.today()
+
+    # The unique (provider, service, date, start_time) constraint's index;
+    # SQLite names the index of a table constraint itself
+    SERVICE_DAY_INDEXES = ('avail_unique_service_start', 'sqlite_autoindex_bookings_availability')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """Assert that the query plan searches one of the given indexes"""
+        plan = queryset.explain()
+        self.assertTrue(
+            any(f'USING INDEX {name}' in plan or f'USING COVERING INDEX {name}' in plan
+                for name in index_names),
+            f'None of {index_names} used:\n{plan}'
+        )
+
+    def test_view_availability_date_range_uses_open_slot_index(self):
+        """Test the earliest/latest open date lookup"""
+        from django.db.models import Min, Max
+
+        queryset = Availability.objects.filter(
+            provider=self.provider_user,
+            service=self.service,
+            date__gte=self.today,
+            is_available=True
+        ).values('provider').annotate(
+            earliest_date=Min('date'),
+            latest_date=Max('date')
+        )
+        self.assertUsesIndex(queryset, 'avail_open_slot_idx')
+
+    def test_view_availability_day_slots_use_service_day_index(self):
+        """Test the selected day's slot list"""
+        queryset = Availability.objects.filter(
+            provider=self.provider_user,
+            service=self.service,
+            date=self.today
+        ).order_by('start_time')
+        self.assertUsesIndex(queryset, *self.SERVICE_DAY_INDEXES)
+
+    def test_cancel_booking_blocked_slots_use_service_day_index(self):
+        """Test the unavailable slot lookup when a booking is released"""
+        queryset = Availability.objects.filter(
+            provider=self.provider_user,
+            service=self.service,
+            date=self.today,
+            is_available=False
+        )
+        self.assertUsesIndex(queryset, *self.SERVICE_DAY_INDEXES)
+
+    def test_confirm_booking_open_slots_use_composite_index(self):
+        """Test the open slot lookup after a booking is created"""
+        queryset = Availability.objects.filter(
+            provider=self.provider_user,
+            service=self.service,
+            date=self.today,
+            is_available=True
+        )
+        # Both composite indexes narrow this to one service-day
+        self.assertUsesIndex(queryset, 'avail_open_slot_idx', *self.SERVICE_DAY_INDEXES)
+
+    def test_conflict_check_uses_provider_day_index(self):
+        """Test the provider-day booking lookup used for conflict checks"""
+        queryset = Booking.objects.filter(
+            provider=self.provider_user,
+            date=self.today,
+            status__in=['pending', 'confirmed']
+        ).values_list('start_time', 'end_time')
+        self.assertUsesIndex(queryset, 'booking_provider_day_idx')
+
+    def test_dashboard_calendar_uses_provider_day_index(self):
+        """Test the provider dashboard's upcoming bookings window"""
+        queryset = Booking.objects.filter(
+            provider=self.provider_user,
+            date__gte=self.today,
+            date__lte=self.today + timedelta(days=90)
+        ).exclude(status='cancelled')
+        self.assertUsesIndex(queryset, 'booking_provider_day_idx')
+
+    def test_customer_dashboard_uses_customer_day_index(self):
+        """Test the customer dashboard's upcoming bookings"""
+        queryset = Booking.objects.filter(
+            Q(status='confirmed') | Q(status='pending'),
+            customer=self.customer_user,
+            date__gte=self.today
+        ).order_by('date', 'start_time')
+        self.assertUsesIndex(queryset, 'booking_customer_day_idx')
+
+
+class ConfirmBookingViewTestCase(BookingTestMixin, TestCase):
+    """Test cases for the confirm_booking view"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        self.slots = {
+            start: self.create_slot(start, (datetime.combine(self.day, start) + timedelta(minutes=30)).time())
+            for start in (time(9, 0), time(9, 30), time(10, 0), time(10, 30))
+        }
+        self.client.login(username='customer', password='testpass123')
+
+    def confirm(self, slot):
+        return self.client.post(
+            reverse('confirm_booking', args=[self.service.id]),
+            {'availability_id': slot.id},
+            follow=True
+        )
+
+    def test_booking_blocks_overlapping_slots(self):
+        """Test that a 60 minute booking closes every slot it overlaps"""
+        self.confirm(self.slots[time(9, 30)])
+
+        booking = Booking.objects.get()
+        self.assertEqual((booking.start_time, booking.end_time), (time(9, 30), time(10, 30)))
+        open_slots = set(Availability.objects.filter(is_available=True).values_list('start_time', flat=True))
+        self.assertEqual(open_slots, {time(10, 30)})
+
+    def test_taken_slot_is_rejected_cleanly(self):
+        """Test that booking an already claimed slot shows a message"""
+        self.confirm(self.slots[time(9, 0)])
+        response = self.confirm(self.slots[time(9, 0)])
+
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertContains(response, 'Selected time slot is not available.')
+
+    def test_slot_with_leftover_booking_row_is_rejected_cleanly(self):
+        """Test that the one-booking-per-slot constraint is reported, not raised"""
+        slot = self.slots[time(9, 0)]
+        Booking.objects.create(
+            customer=self.customer_user,
+            provider=self.provider_user,
+            service=self.service,
+            availability=slot,
+            date=self.day,
+            start_time=time(9, 0),
+            end_time=time(10, 0),
+            price=self.service.price,
+            status='cancelled'
+        )
+
+        response = self.confirm(slot)
+
+        self.assertContains(response, 'This slot is already booked.')
+        slot.refresh_from_db()
+        self.assertTrue(slot.is_available)  # The claim was rolled back
+
+
+class ConcurrentConfirmBookingTestCase(BookingTestMixin, TransactionTestCase):
+    """Stress test confirm_booking with many customers racing for slots"""
+
+    CUSTOMERS = 8
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        self.clients = []
+        for i in range(self.CUSTOMERS):
+            customer = User.objects.create_user(username=f'customer{i}', password='testpass123')
+            client = Client()
+            client.force_login(customer)
+            # Store the role and session expiry now, so the racing requests
+            # do not all write their sessions at once
+            client.get(reverse('my_bookings'))
+            self.clients.append(client)
+
+    def race(self, slot_ids):
+        """POST confirm_booking from every client at once, cycling through slot_ids"""
+        import threading
+        from django.db import connections
+
+        barrier = threading.Barrier(len(self.clients))
+        responses = []
+        errors = []
+
+        def book(client, slot_id):
+            try:
+                barrier.wait()
+                responses.append(client.post(
+                    reverse('confirm_booking', args=[self.service.id]),
+                    {'availability_id': slot_id}
+                ))
+            except Exception as e:  # Any exception here is an unhandled view error
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=book, args=(client, slot_ids[i % len(slot_ids)]))
+            for i, client in enumerate(self.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual([r.status_code for r in responses], [302] * len(self.clients))
+
+        # Losers are told the slot is gone, never that something broke
+        from django.contrib.messages import get_messages
+        for response in responses:
+            for message in get_messages(response.wsgi_request):
+                self.assertNotIn('An error occurred', str(message))
+        return responses
+
+    def test_single_slot_is_booked_exactly_once(self):
+        """Test that only one of many concurrent requests gets the same slot"""
+        slot = self.create_slot(time(9, 0))
+
+        responses = self.race([slot.id])
+
+        self.assertEqual(Booking.objects.count(), 1)
+        winners = [r for r in responses if r.url == reverse('my_bookings')]
+        self.assertEqual(len(winners), 1)
+        slot.refresh_from_db()
+        self.assertFalse(slot.is_available)
+
+    def test_overlapping_slots_are_never_double_booked(self):
+        """Test that concurrent bookings of overlapping slots leave one booking"""
+        slots = [self.create_slot(time(9, 0)), self.create_slot(time(9, 30)), self.create_slot(time(10, 0))]
+
+        self.race([slot.id for slot in slots])
+
+        bookings = list(Booking.objects.order_by('start_time'))
+        for first, second in zip(bookings, bookings[1:]):
+            self.assertLessEqual(first.end_time, second.start_time)
+        # 09:00 and 10:00 can both be booked, 09:30 overlaps either of them
+        self.assertIn(len(bookings), (1, 2))
+
+    def test_rule_slot_is_materialized_and_booked_once(self):
+        """Test that concurrent first bookings of a rule slot share one row and one booking"""
+        AvailabilityRule.objects.create(
+            provider=self.provider_user, service=self.service, weekdays=0b1111111,
+            start_time=time(9, 0), end_time=time(10, 0), start_date=self.day
+        )
+        token = slot_token(next(rule_slots(self.service, self.day, self.day)))
+
+        responses = self.race([token])
+
+        self.assertEqual(Availability.objects.count(), 1)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(len([r for r in responses if r.url == reverse('my_bookings')]), 1)
+
+
+class BookingStatsTestCase(BookingTestMixin, TestCase):
+    """Test cases for the single-query BookingStats aggregate"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        self.today = date.today()
+        self.month_start = self.today.replace(day=1)
+
+        # (days from month start, start, end, status, price)
+        for offset, start, end, status, price in [
+            (0, time(9, 0), time(10, 0), 'completed', '35.00'),
+            (0, time(10, 0), time(11, 30), 'confirmed', '50.00'),
+            (0, time(12, 0), time(13, 0), 'pending', '35.00'),
+            (0, time(13, 0), time(14, 0), 'cancelled', '35.00'),
+            (-40, time(9, 0), time(11, 0), 'completed', '80.00'),
+        ]:
+            self.create_booking(start, end, self.month_start + timedelta(days=offset),
+                                status=status, price=Decimal(price))
+
+    def test_compute_in_one_query(self):
+        """Test all statistics against hand-computed values"""
+        from .stats import BookingStats
+
+        with self.assertNumQueries(1):
+            stats = BookingStats(
+                Booking.objects.filter(provider=self.provider_user),
+                month_start=self.month_start
+            ).compute()
+
+        self.assertEqual(stats['total_bookings'], 5)
+        self.assertEqual(stats['pending_bookings'], 1)
+        self.assertEqual(stats['confirmed_bookings'], 1)
+        self.assertEqual(stats['completed_bookings'], 2)
+        self.assertEqual(stats['cancelled_bookings'], 1)
+        self.assertEqual(stats['total_revenue'], Decimal('115.00'))
+        self.assertEqual(stats['month_revenue'], Decimal('35.00'))
+        # 1h completed + 1.5h confirmed + 2h completed last month
+        self.assertEqual(stats['total_hours'], 4.5)
+
+    def test_empty_queryset(self):
+        """Test that an empty set of bookings gives zeros, not None"""
+        from .stats import BookingStats
+
+        stats = BookingStats(Booking.objects.filter(customer=self.provider_user)).compute()
+
+        self.assertEqual(stats['total_bookings'], 0)
+        self.assertEqual(stats['total_revenue'], 0)
+        self.assertEqual(stats['total_hours'], 0)
+        self.assertNotIn('month_revenue', stats)
+
+
+@override_settings(SEARCH_LOG_BACKGROUND=False)
+class ServiceSearchTestCase(TestCase):
+    """Test full-text search in search_services"""
+
+    def setUp(self):
+        # TransactionTestCase flushes don't reach the FTS table, start from a clean index
+        get_search_backend().rebuild()
+
+        self.provider = User.objects.create_user(
+            username='styleprovider', password='testpass123', first_name='Emma', last_name='Visser'
+        )
+        self.other_provider = User.objects.create_user(username='tutor', password='testpass123')
+
+        self.haircut = Service.objects.create(
+            provider=self.provider, name='Haircut', category='salon_beauty',
+            description='Wash, cut and blow dry', price=Decimal('35.00'), duration=60
+        )
+        self.math = Service.objects.create(
+            provider=self.other_provider, name='Math Tutoring', category='education',
+            description='Algebra lessons, no haircut included', price=Decimal('40.00'), duration=60
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse('search_services'), params)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['services'])
+
+    def test_matches_every_indexed_field(self):
+        self.assertEqual(self.search(q='tutor'), [self.math])  # name prefix
+        self.assertEqual(self.search(q='algebra'), [self.math])  # description
+        self.assertEqual(self.search(q='beauty'), [self.haircut])  # category label
+        self.assertEqual(self.search(q='visser'), [self.haircut])  # provider name
+
+    def test_relevance_ranks_name_matches_first(self):
+        self.assertEqual(self.search(q='haircut', sort_by='relevance'), [self.haircut, self.math])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search(q='math algebra'), [self.math])
+        self.assertEqual(self.search(q='math visser'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search(q='"hair* (cut'), [self.haircut])
+        self.assertEqual(self.search(q='!!!'), [])
+
+    @skipUnless(connection.vendor == 'sqlite' and fts5_available(), 'Needs SQLite with FTS5')
+    def test_fts5_matches_and_ranks_in_one_match(self):
+        """Test that the FTS5 index drives the query and is searched only once"""
+        matches = FTS5SearchBackend().search(Service.objects.all(), 'haircut').order_by('-search_rank')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(matches), [self.haircut, self.math])
+
+        self.assertEqual(queries[0]['sql'].count('MATCH'), 1)
+        self.assertIn(f'SCAN {FTS_TABLE} VIRTUAL TABLE', matches.explain().splitlines()[0])
+
+    def test_index_follows_changes(self):
+        self.haircut.name = 'Beard Trim'
+        self.haircut.save()
+        self.assertEqual(self.search(q='beard'), [self.haircut])
+
+        self.provider.last_name = 'Jansen'
+        self.provider.save()
+        self.assertEqual(self.search(q='jansen'), [self.haircut])
+        self.assertEqual(self.search(q='visser'), [])
+
+        self.math.delete()
+        self.assertEqual(self.search(q='algebra'), [])
+
+    def test_rebuild_search_index_command(self):
+        Service.objects.filter(id=self.haircut.id).update(name='Massage')
+        self.assertEqual(self.search(q='massage'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search(q='massage'), [self.haircut])
+
+
+@override_settings(SEARCH_LOG_BACKGROUND=False)
+class SearchLogBufferTestCase(TestCase):
+    """Test the buffered SearchQuery logging of search_services"""
+
+    def setUp(self):
+        self.buffer = SearchLogBuffer()
+        patcher = patch('bookings.analytics.search_log', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_search_does_not_write_synchronously(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('search_services'), {'q': 'haircut', 'min_price': '10'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'INSERT' in q['sql']])
+        self.assertEqual(SearchQuery.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        logged = SearchQuery.objects.get()
+        self.assertEqual(logged.query, 'haircut')
+        self.assertEqual(logged.min_price, Decimal('10'))
+        self.assertEqual(logged.ip_address, '127.0.0.1')
+
+    @override_settings(SEARCH_LOG_BATCH_SIZE=3)
+    def test_full_batch_is_written_with_one_insert(self):
+        for query in ('hair', 'yoga'):
+            self.buffer.log(query=query)
+        self.assertEqual(SearchQuery.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.buffer.log(query='math')
+        self.assertEqual(SearchQuery.objects.count(), 3)
+
+    def test_full_queue_drops_entries(self):
+        buffer = SearchLogBuffer(max_size=2)
+        for query in ('hair', 'yoga', 'math'):
+            buffer.log(query=query)
+
+        self.assertEqual(buffer.stats(), {'queued': 2, 'written': 0, 'dropped': 1, 'failed': 0})
+
+    def test_failed_write_is_counted_not_raised(self):
+        self.buffer.log(query='hair')
+        with patch.object(SearchQuery.objects, 'bulk_create', side_effect=DatabaseError('locked')), \
+                self.assertLogs('bookings.analytics', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(self.buffer.stats(), {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 1})
+
+
+@override_settings(SEARCH_LOG_BACKGROUND=False)
+class ServicePaginationTestCase(TestCase):
+    """Test keyset pagination of browse_providers and search_services"""
+
+    def setUp(self):
+        cache.clear()
+        get_search_backend().rebuild()
+        self.provider = User.objects.create_user(username='provider', password='testpass123')
+
+        # Few distinct prices and durations, so most pages break inside a tie
+        for i in range(PAGE_SIZE * 2 + 5):
+            Service.objects.create(
+                provider=self.provider,
+                name=f'Yoga class {i}',
+                category='fitness',
+                description='Relaxing yoga session',
+                price=Decimal(20 + i % 3),
+                duration=[30, 60][i % 2]
+            )
+
+    def walk_feed(self, url_name, **params):
+        """Follow the JSON feed cursors and return every service id in order"""
+        ids = []
+        cursor = None
+        while True:
+            response = self.client.get(reverse(url_name), dict(params, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), PAGE_SIZE)
+            ids.extend(item['id'] for item in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_every_sort_pages_through_all_services_once(self):
+        orderings = {
+            'newest': ('-created_at', '-id'),
+            'price_low': ('price', 'id'),
+            'price_high': ('-price', '-id'),
+            'duration': ('duration', 'id'),
+        }
+        for sort_by, ordering in orderings.items():
+            expected = list(Service.objects.order_by(*ordering).values_list('id', flat=True))
+            with self.subTest(sort_by=sort_by):
+                self.assertEqual(self.walk_feed('browse_providers_feed', sort_by=sort_by), expected)
+                self.assertEqual(self.walk_feed('search_services_feed', sort_by=sort_by), expected)
+
+    def test_relevance_pages_through_search_results(self):
+        ids = self.walk_feed('search_services_feed', q='yoga')
+        self.assertEqual(sorted(ids), sorted(Service.objects.values_list('id', flat=True)))
+
+    def test_new_services_do_not_shift_pages(self):
+        first = self.client.get(reverse('browse_providers_feed'), {'sort_by': 'newest'}).json()
+        Service.objects.create(
+            provider=self.provider, name='Brand new', category='fitness',
+            description='Just added', price=Decimal('25.00'), duration=60
+        )
+        second = self.client.get(reverse('browse_providers_feed'),
+                                 {'sort_by': 'newest', 'cursor': first['next_cursor']}).json()
+
+        first_ids = {item['id'] for item in first['results']}
+        self.assertFalse(first_ids & {item['id'] for item in second['results']})
+        self.assertEqual(len(second['results']), PAGE_SIZE)
+
+    def test_page_renders_one_page_and_total(self):
+        response = self.client.get(reverse('browse_providers'), {'category': 'fitness'})
+
+        self.assertEqual(len(response.context['services']), PAGE_SIZE)
+        self.assertEqual(response.context['results_count'], PAGE_SIZE * 2 + 5)
+        self.assertContains(response, 'id="load-more"')
+        self.assertEqual(response.context['feed_query'], 'category=fitness')
+
+    def test_invalid_cursor_starts_over(self):
+        first = self.client.get(reverse('search_services_feed'), {'sort_by': 'price_low'}).json()
+        garbled = self.client.get(reverse('search_services_feed'),
+                                  {'sort_by': 'price_low', 'cursor': 'not-a-cursor'}).json()
+        self.assertEqual(garbled['results'], first['results'])
+
+        # Cursors decoding to values the sort field cannot hold
+        for sort_by, value in [('price_low', 'NaN'), ('price_low', '-Infinity'), ('duration', float('inf'))]:
+            with self.subTest(sort_by=sort_by, value=value):
+                start = self.client.get(reverse('search_services_feed'), {'sort_by': sort_by}).json()
+                crafted = self.client.get(reverse('search_services_feed'), {
+                    'sort_by': sort_by, 'cursor': encode_cursor({'v': value, 'id': 1})}).json()
+                self.assertEqual(crafted['results'], start['results'])
+
+    def test_count_is_cached(self):
+        self.client.get(reverse('search_services'), {'category': 'fitness'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('search_services'), {'category': 'fitness'})
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+
+class ReleaseBookingTestCase(BookingTestMixin, TestCase):
+    """Test that cancelling or rejecting a booking reopens the slots it blocked"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        self.slots = self.create_slots(self.day, 4)
+
+    def create_slots(self, day, count):
+        """Half hour slots from 09:00"""
+        slots = {}
+        for i in range(count):
+            start = datetime.combine(day, time(9, 0)) + timedelta(minutes=30 * i)
+            slots[start.time()] = self.create_slot(start.time(), (start + timedelta(minutes=30)).time(), day)
+        return slots
+
+    def book(self, start):
+        return book_slot(self.customer_user, self.service, self.slots[start].id)
+
+    def open_slots(self):
+        return set(Availability.objects.filter(
+            date=self.day, is_available=True).values_list('start_time', flat=True))
+
+    def test_customer_cancel_reopens_blocked_slots(self):
+        booking = self.book(time(9, 30))
+        self.assertEqual(self.open_slots(), {time(10, 30)})
+
+        self.client.login(username='customer', password='testpass123')
+        self.client.post(reverse('cancel_booking', args=[booking.id]))
+
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.open_slots(), set(self.slots))
+
+    def test_provider_reject_keeps_slots_of_other_bookings_closed(self):
+        self.book(time(9, 0))
+        rejected = self.book(time(10, 0))
+
+        self.client.login(username='provider', password='testpass123')
+        self.client.post(reverse('provider_bookings'), {'action': 'reject', 'booking_id': rejected.id})
+
+        rejected.refresh_from_db()
+        self.assertEqual(rejected.status, 'cancelled')
+        # 09:30 still overlaps the 09:00-10:00 booking
+        self.assertEqual(self.open_slots(), {time(10, 0), time(10, 30)})
+
+    def test_query_count_does_not_grow_with_slots(self):
+        def release_queries(day, count):
+            self.slots = self.create_slots(day, count)
+            booking = Booking.objects.select_related('service').get(id=self.book(time(9, 30)).id)
+            with CaptureQueriesContext(connection) as queries:
+                release_booking(booking)
+            return len(queries)
+
+        self.assertEqual(
+            release_queries(self.day + timedelta(days=1), 4),
+            release_queries(self.day + timedelta(days=2), 40)
+        )
+
+    def test_admin_cancel_action_reopens_slots(self):
+        booking = self.book(time(9, 30))
+        User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.login(username='admin', password='testpass123')
+
+        self.client.post(reverse('admin:bookings_booking_changelist'), {
+            'action': 'mark_as_cancelled',
+            '_selected_action': [booking.id],
+        })
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+        self.assertEqual(self.open_slots(), set(self.slots))
+
+    def test_sweep_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            duration = rng.choice([30, 60, 90])
+            bookings = [(s, s + rng.choice([30, 60, 120])) for s in rng.sample(range(0, 1380, 15), 6)]
+            slots = [(i, s) for i, s in enumerate(rng.sample(range(0, 1410, 15), 10))]
+
+            expected = sorted(
+                slot_id for slot_id, start in slots
+                if not any(start < end and start + duration > b_start for b_start, end in bookings)
+            )
+            self.assertEqual(sorted(unblocked_slots(slots, merge_intervals(bookings), duration)), expected)
+
+
+class BulkBookingStatusTestCase(BookingTestMixin, TestCase):
+    """Test the chunked, set-based booking status changes of the admin actions"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+
+    def book_days(self, days, per_day=2):
+        """Book every other hourly slot from 09:00 on `days` consecutive days"""
+        bookings = []
+        for offset in range(days):
+            day = self.day + timedelta(days=offset)
+            for hour in range(9, 9 + per_day * 2):
+                slot = self.create_slot(time(hour, 0), day=day)
+                if hour % 2 == 1:
+                    bookings.append(book_slot(self.customer_user, self.service, slot.id))
+        return bookings
+
+    def test_cancel_reopens_slots_and_notifies(self):
+        bookings = self.book_days(3)
+
+        result = bulk_set_status(Booking.objects.all(), 'cancelled')
+
+        self.assertEqual(result.updated, len(bookings))
+        self.assertEqual(result.reopened, len(bookings))
+        self.assertFalse(Availability.objects.filter(is_available=False).exists())
+        self.assertEqual(
+            Notification.objects.filter(user=self.customer_user, notification_type='cancellation').count(),
+            len(bookings)
+        )
+
+    def test_confirming_a_cancelled_booking_closes_its_slot_again(self):
+        booking = self.book_days(1)[0]
+        bulk_set_status(Booking.objects.filter(id=booking.id), 'cancelled')
+
+        result = bulk_set_status(Booking.objects.filter(id=booking.id), 'confirmed')
+
+        self.assertEqual(result.closed, 1)
+        self.assertFalse(Availability.objects.get(id=booking.availability_id).is_available)
+
+    def test_unchanged_bookings_are_skipped(self):
+        self.book_days(1)
+        bulk_set_status(Booking.objects.all(), 'confirmed')
+
+        result = bulk_set_status(Booking.objects.all(), 'confirmed')
+
+        self.assertEqual((result.updated, result.notified), (0, 0))
+
+    def test_chunks_report_progress(self):
+        self.book_days(4)  # 8 bookings
+        reported = []
+
+        result = bulk_set_status(Booking.objects.all(), 'completed', chunk_size=3,
+                                 progress=lambda r: reported.append(r.updated))
+
+        self.assertEqual(reported, [3, 6, 8])
+        self.assertEqual(result.chunks, 3)
+
+    def test_query_count_does_not_grow_with_selection(self):
+        self.book_days(2)
+        with CaptureQueriesContext(connection) as small:
+            bulk_set_status(Booking.objects.all(), 'cancelled')
+
+        Availability.objects.all().delete()
+        self.book_days(20)
+        with CaptureQueriesContext(connection) as large:
+            bulk_set_status(Booking.objects.all(), 'cancelled')
+
+        self.assertEqual(len(small), len(large))
+
+
+class SplitAvailabilitySlotsTestCase(BookingTestMixin, TestCase):
+    """Test the split_availability_slots management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+
+    def split(self, *args):
+        out = StringIO()
+        call_command('split_availability_slots', *args, stdout=out)
+        return out.getvalue()
+
+    def slot_times(self):
+        return list(Availability.objects.order_by('date', 'start_time').values_list('start_time', 'end_time'))
+
+    def test_splits_long_slots_by_service_duration(self):
+        self.create_slot(time(9, 0), time(12, 0))
+        self.create_slot(time(14, 0), time(15, 0))
+
+        self.split()
+
+        self.assertEqual(self.slot_times(), [
+            (time(9, 0), time(10, 0)), (time(10, 0), time(11, 0)),
+            (time(11, 0), time(12, 0)), (time(14, 0), time(15, 0)),
+        ])
+
+    def test_existing_sub_slots_are_not_duplicated(self):
+        self.create_slot(time(9, 0), time(11, 0))
+        self.create_slot(time(10, 0), time(11, 0))
+
+        self.split()
+
+        self.assertEqual(self.slot_times(), [(time(9, 0), time(10, 0)), (time(10, 0), time(11, 0))])
+
+    def test_dry_run_writes_nothing(self):
+        self.create_slot(time(9, 0), time(12, 0))
+
+        output = self.split('--dry-run')
+
+        self.assertEqual(self.slot_times(), [(time(9, 0), time(12, 0))])
+        self.assertIn('New smaller slots created: 3', output)
+        self.assertFalse(ProviderStats.objects.exists())
+
+    def test_split_refreshes_provider_stats(self):
+        self.create_slot(time(9, 0), time(12, 0))
+
+        self.split()
+
+        stats = ProviderStats.objects.get(provider=self.provider_user)
+        self.assertEqual(stats.next_available_date, self.day)
+        self.assertIsNotNone(stats.schedule_changed_at)
+
+    def test_resume_from_id_skips_processed_slots(self):
+        first = self.create_slot(time(9, 0), time(11, 0))
+        self.create_slot(time(9, 0), time(11, 0), day=self.day + timedelta(days=1))
+
+        self.split('--resume-from-id', str(first.id))
+
+        self.assertTrue(Availability.objects.filter(id=first.id).exists())
+        self.assertEqual(Availability.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_slots_per_chunk(self):
+        for offset in range(2):
+            self.create_slot(time(9, 0), time(12, 0), day=self.day + timedelta(days=offset))
+        with CaptureQueriesContext(connection) as small:
+            self.split('--batch-size', '100')
+
+        Availability.objects.all().delete()
+        for offset in range(20):
+            self.create_slot(time(9, 0), time(12, 0), day=self.day + timedelta(days=offset))
+        with CaptureQueriesContext(connection) as large:
+            self.split('--batch-size', '100')
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Availability.objects.count(), 60)
+
+
+class LoadDataGeneratorTestCase(BookingTestMixin, TestCase):
+    """Test the seeded data generator and the seeding commands built on it"""
+
+    def dataset(self, prefix):
+        """The generated rows of a dataset, without ids and prefixes"""
+        return {
+            'services': list(Service.objects.filter(provider__username__startswith=prefix)
+                             .order_by('id').values_list('name', 'category', 'price', 'duration')),
+            'slots': list(Availability.objects.filter(provider__username__startswith=prefix)
+                          .order_by('id').values_list('date', 'start_time', 'is_available')),
+            'bookings': list(Booking.objects.filter(provider__username__startswith=prefix)
+                             .order_by('id').values_list('date', 'start_time', 'status')),
+        }
+
+    def test_same_seed_builds_the_same_dataset(self):
+        options = dict(providers=3, customers=5, days=4, booking_density=0.5, seed=7, batch_size=20)
+        generate_load_data(prefix='first', **options)
+        generate_load_data(prefix='second', **options)
+
+        self.assertEqual(self.dataset('first'), self.dataset('second'))
+        self.assertTrue(self.dataset('first')['bookings'])
+
+    def test_booked_slots_are_closed(self):
+        counts = generate_load_data(providers=2, customers=3, days=5, booking_density=0.6, seed=1)
+
+        self.assertEqual(counts['bookings'], Booking.objects.count())
+        self.assertEqual(counts['slots'], Availability.objects.count())
+        self.assertFalse(Availability.objects.filter(
+            booking__status__in=['pending', 'confirmed', 'completed'], is_available=True).exists())
+        self.assertFalse(Availability.objects.filter(
+            booking__status='cancelled', is_available=False).exists())
+        self.assertEqual(ProviderProfile.objects.count(), 2)
+
+    def test_deleting_a_dataset_keeps_rollups_and_stats_in_sync(self):
+        options = dict(providers=2, customers=3, days=3, booking_density=0.6, seed=3)
+        generate_load_data(prefix='kept', **options)
+        generate_load_data(prefix='gone', **options)
+        # A dataset customer booking a provider outside the dataset
+        self.create_fixtures()
+        book_slot(User.objects.get(username='gone_customer_0'), self.service, self.create_slot(time(9, 0)).id)
+
+        delete_load_data('gone')
+
+        self.assertFalse(Booking.objects.filter(
+            Q(provider__username__startswith='gone') | Q(customer__username__startswith='gone')).exists())
+
+        def rollups():
+            return sorted(BookingDailyRollup.objects.exclude(booking_count=0).values_list(
+                'provider', 'service', 'date', 'status', 'booking_count', 'revenue', 'minutes'), key=str)
+        stored = rollups()
+        self.assertTrue(stored)
+        rebuild_rollups()
+        self.assertEqual(stored, rollups())
+        self.assertEqual(reconcile_provider_stats(), [])
+
+    def test_command_refuses_to_overwrite_a_dataset(self):
+        call_command('generate_load_data', '--providers', '1', '--customers', '1', '--days', '1',
+                     stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_load_data', '--providers', '1', stdout=StringIO())
+
+        call_command('generate_load_data', '--providers', '2', '--customers', '1', '--days', '1',
+                     '--replace', stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='load_provider_').count(), 2)
+
+    def test_generate_availability_keeps_existing_bookings(self):
+        call_command('add_mock_providers', stdout=StringIO())
+        customer = User.objects.create_user(username='customer', password='testpass123')
+        call_command('generate_availability', '--days', '3', '--seed', '1', stdout=StringIO())
+        slot = Availability.objects.order_by('id').first()
+        booking = book_slot(customer, slot.service, slot.id)
+        slot_count = Availability.objects.count()
+
+        call_command('generate_availability', '--days', '3', '--seed', '2', stdout=StringIO())
+
+        self.assertTrue(Booking.objects.filter(id=booking.id).exists())
+        self.assertEqual(
+            Availability.objects.values('service', 'date', 'start_time').distinct().count(),
+            Availability.objects.count()
+        )
+        self.assertGreaterEqual(Availability.objects.count(), slot_count)
+
+    def test_seeding_commands_are_idempotent(self):
+        call_command('add_mock_providers', stdout=StringIO())
+        call_command('add_mock_providers', stdout=StringIO())
+        call_command('create_test_bookings', '--seed', '3', stdout=StringIO())
+        call_command('create_test_bookings', '--seed', '3', stdout=StringIO())
+
+        self.assertEqual(ProviderProfile.objects.filter(user__username='jakes_plumbing').count(), 1)
+        self.assertEqual(Availability.objects.filter(provider__username='test_provider').count(), 35)
+        self.assertFalse(Availability.objects.filter(
+            booking__isnull=False, booking__status__in=['pending', 'confirmed'], is_available=True).exists())
+
+
+class BenchmarkComparisonTestCase(TestCase):
+    """Test the regression check between two benchmark runs"""
+
+    def test_reports_metrics_above_threshold(self):
+        baseline = [
+            {'benchmark': 'views', 'view': 'dashboard', 'providers': 10, 'ms': 10.0, 'queries': 8, 'peak_kb': 100.0},
+            {'benchmark': 'views', 'view': 'search', 'providers': 10, 'ms': 5.0, 'queries': 2, 'peak_kb': 50.0},
+        ]
+        results = [
+            {'benchmark': 'views', 'view': 'dashboard', 'providers': 10, 'ms': 11.0, 'queries': 12, 'peak_kb': 100.0},
+            {'benchmark': 'views', 'view': 'search', 'providers': 10, 'ms': 9.0, 'queries': 2, 'peak_kb': 40.0},
+            {'benchmark': 'views', 'view': 'search', 'providers': 50, 'ms': 90.0, 'queries': 2, 'peak_kb': 40.0},
+        ]
+
+        regressions = compare_results(baseline, results, threshold=0.2)
+
+        self.assertEqual(
+            [(row['view'], metric, old, new) for row, metric, old, new in regressions],
+            [('dashboard', 'queries', 8, 12), ('search', 'ms', 5.0, 9.0)]
+        )
+
+    def test_reports_session_and_search_regressions(self):
+        baseline = [
+            {'benchmark': 'sessions', 'strategy': 'lazy', 'requests': 100,
+             'requests_per_sec': 500.0, 'session_writes': 1},
+            {'benchmark': 'sessions', 'strategy': 'eager', 'requests': 100,
+             'requests_per_sec': 400.0, 'session_writes': 100},
+            {'benchmark': 'search', 'backend': 'fts5', 'services': 10000, 'ms_per_search': 1.0},
+        ]
+        results = [
+            {'benchmark': 'sessions', 'strategy': 'lazy', 'requests': 100,
+             'requests_per_sec': 300.0, 'session_writes': 100},
+            {'benchmark': 'sessions', 'strategy': 'eager', 'requests': 100,
+             'requests_per_sec': 900.0, 'session_writes': 100},
+            {'benchmark': 'search', 'backend': 'fts5', 'services': 10000, 'ms_per_search': 7.0},
+        ]
+
+        regressions = compare_results(baseline, results, threshold=0.2)
+
+        self.assertEqual(
+            [(row['benchmark'], metric, old, new) for row, metric, old, new in regressions],
+            [('sessions', 'session_writes', 1, 100), ('sessions', 'requests_per_sec', 500.0, 300.0),
+             ('search', 'ms_per_search', 1.0, 7.0)]
+        )
+
+
+class BookingRollupTestCase(BookingTestMixin, TestCase):
+    """Test that the daily booking rollups follow every booking change"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+
+    def book(self, hour, day=None):
+        slot = self.create_slot(time(hour, 0), day=day)
+        return book_slot(self.customer_user, self.service, slot.id)
+
+    def rollups(self):
+        """{(date, status): (count, revenue, minutes)} of the non-empty rollups"""
+        return {
+            (row.date, row.status): (row.booking_count, row.revenue, row.minutes)
+            for row in BookingDailyRollup.objects.exclude(booking_count=0)
+        }
+
+    def test_booking_lifecycle(self):
+        booking = self.book(9)
+        self.book(10)
+        self.assertEqual(self.rollups(), {(self.day, 'pending'): (2, Decimal('70.00'), 120)})
+
+        booking.status = 'confirmed'
+        booking.save()
+        self.assertEqual(self.rollups(), {
+            (self.day, 'pending'): (1, Decimal('35.00'), 60),
+            (self.day, 'confirmed'): (1, Decimal('35.00'), 60),
+        })
+
+        release_booking(booking)
+        self.assertEqual(self.rollups(), {
+            (self.day, 'pending'): (1, Decimal('35.00'), 60),
+            (self.day, 'cancelled'): (1, Decimal('35.00'), 60),
+        })
+
+        booking.delete()
+        self.assertEqual(self.rollups(), {(self.day, 'pending'): (1, Decimal('35.00'), 60)})
+
+    def test_bulk_status_change(self):
+        for hour in range(9, 13):
+            self.book(hour)
+
+        bulk_set_status(Booking.objects.all(), 'completed', chunk_size=3)
+
+        self.assertEqual(self.rollups(), {(self.day, 'completed'): (4, Decimal('140.00'), 240)})
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for offset in range(3):
+            for hour in (9, 11):
+                self.book(hour, day=self.day + timedelta(days=offset))
+        bulk_set_status(Booking.objects.filter(start_time=time(9, 0)), 'completed')
+        expected = self.rollups()
+
+        BookingDailyRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_booking_rollups', '--chunk-days', '2', stdout=out)
+
+        self.assertEqual(self.rollups(), expected)
+        self.assertIn('Wrote 6 rollup rows', out.getvalue())
+
+    def test_deleting_a_service_removes_its_rollups(self):
+        self.book(9)
+
+        self.service.delete()
+
+        self.assertFalse(BookingDailyRollup.objects.exists())
+
+    def test_provider_dashboard_reads_rollups(self):
+        self.book(9)
+        BookingDailyRollup.objects.update(booking_count=7)
+
+        self.client.force_login(self.provider_user)
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.context['total_bookings'], 7)
+
+
+class ProviderStatsTestCase(TestCase):
+    """Test the precomputed provider stats and the listings that use them"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        get_search_backend().rebuild()
+        self.customer_user = User.objects.create_user(username='customer', password='testpass123')
+        self.providers = []
+        for name in ('busy', 'quiet'):
+            user = User.objects.create_user(username=name, password='testpass123')
+            service = Service.objects.create(provider=user, name=f'{name} haircut', category='salon_beauty',
+                                             description='Haircut', price=Decimal('35.00'), duration=60)
+            self.providers.append((user, service))
+        self.day = date.today() + timedelta(days=1)
+
+    def add_slot(self, provider, service, hour, day=None):
+        return Availability.objects.create(provider=provider, service=service, date=day or self.day,
+                                           start_time=time(hour, 0), end_time=time(hour + 1, 0))
+
+    def book(self, provider, service, hour):
+        return book_slot(self.customer_user, service, self.add_slot(provider, service, hour).id)
+
+    def stats(self, provider):
+        stats = ProviderStats.objects.get(provider=provider)
+        return stats.total_bookings, stats.completed_bookings, stats.total_revenue
+
+    def test_counters_follow_booking_transitions(self):
+        provider, service = self.providers[0]
+        first = self.book(provider, service, 9)
+        self.book(provider, service, 10)
+        self.assertEqual(self.stats(provider), (2, 0, Decimal('0.00')))
+
+        first.status = 'completed'
+        first.save()
+        self.assertEqual(self.stats(provider), (2, 1, Decimal('35.00')))
+
+        bulk_set_status(Booking.objects.exclude(id=first.id), 'cancelled')
+        self.assertEqual(self.stats(provider), (1, 1, Decimal('35.00')))
+
+        first.delete()
+        self.assertEqual(self.stats(provider), (0, 0, Decimal('0.00')))
+
+    def test_next_available_date_follows_slots(self):
+        provider, service = self.providers[0]
+        slot = self.add_slot(provider, service, 9)
+        self.add_slot(provider, service, 9, day=self.day + timedelta(days=2))
+
+        booking = book_slot(self.customer_user, service, slot.id)
+        stats = ProviderStats.objects.get(provider=provider)
+        self.assertEqual(stats.next_available_date, self.day + timedelta(days=2))
+
+        release_booking(booking, delete=True)
+        stats.refresh_from_db()
+        self.assertEqual(stats.next_available_date, self.day)
+
+    def test_reconcile_fixes_drift(self):
+        provider, service = self.providers[0]
+        self.book(provider, service, 9)
+        self.add_slot(provider, service, 10)
+        ProviderStats.objects.filter(provider=provider).update(total_bookings=40, next_available_date=None)
+
+        out = StringIO()
+        call_command('check_provider_stats', stdout=out)
+        self.assertIn('The stats of 1 providers drifted', out.getvalue())
+        self.assertEqual(self.stats(provider)[0], 40)
+
+        call_command('check_provider_stats', '--fix', '--batch-size', '1', stdout=StringIO())
+        stats = ProviderStats.objects.get(provider=provider)
+        self.assertEqual(stats.total_bookings, 1)
+        self.assertEqual(stats.next_available_date, self.day)
+        self.assertEqual(reconcile_provider_stats(), [])
+
+    def test_listings_sort_by_popularity_and_filter_by_open_slots(self):
+        (busy, busy_service), (quiet, quiet_service) = self.providers
+        ProviderStats.objects.create(provider=busy, total_bookings=12)
+        self.client.force_login(quiet)
+        UserProfile.objects.create(user=quiet, user_type='provider')
+        self.client.post(reverse('add_availability'), {
+            'service': quiet_service.id, 'date': self.day.isoformat(), 'start_time': '09:00', 'end_time': '10:00',
+        })
+        self.client.logout()
+
+        response = self.client.get(reverse('browse_providers'), {'sort_by': 'popular'})
+        self.assertEqual([service.id for service in response.context['services']],
+                         [busy_service.id, quiet_service.id])
+
+        response = self.client.get(reverse('search_services'), {'sort_by': 'popular', 'available': '1'})
+        self.assertEqual([service.id for service in response.context['services']], [quiet_service.id])
+
+
+class BookingTransitionTestCase(BookingTestMixin, TestCase):
+    """Test the BookingService state machine and its hooks"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        slot = self.create_slot(time(9, 0))
+        self.booking = book_slot(self.customer_user, self.service, slot.id)
+
+    def test_lifecycle_and_hooks(self):
+        sent = []
+
+        def record(sender, changes, status, **kwargs):
+            sent.append([(change.old_status, change.status) for change in changes])
+        booking_status_changed.connect(record)
+        self.addCleanup(booking_status_changed.disconnect, record)
+
+        bookings = BookingService(actor=self.provider_user)
+        bookings.confirm(self.booking)
+        bookings.complete(self.booking)
+
+        self.assertEqual(sent, [[('pending', 'confirmed')], [('confirmed', 'completed')]])
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'completed')
+        self.assertEqual(
+            list(BookingDailyRollup.objects.exclude(booking_count=0).values_list('status', flat=True)),
+            ['completed']
+        )
+        self.assertEqual(Notification.objects.filter(user=self.customer_user).count(), 2)
+
+    def test_invalid_transition_changes_nothing(self):
+        self.client.login(username='provider', password='testpass123')
+
+        response = self.client.post(reverse('provider_bookings'),
+                                    {'action': 'complete', 'booking_id': self.booking.id}, follow=True)
+
+        self.assertContains(response, 'A pending booking cannot be completed.')
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'pending')
+        with self.assertRaises(InvalidTransition):
+            BookingService().complete(self.booking)
+
+    def test_customer_cancellation_does_not_notify_the_customer(self):
+        self.client.login(username='customer', password='testpass123')
+
+        self.client.post(reverse('cancel_booking', args=[self.booking.id]))
+
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(Availability.objects.filter(is_available=False).exists())
+
+    def test_transition_drops_the_platform_stats(self):
+        cache.set(PLATFORM_STATS_CACHE_KEY, {'total_bookings': 0})
+
+        BookingService().confirm(self.booking)
+
+        self.assertIsNone(cache.get(PLATFORM_STATS_CACHE_KEY))
+
+
+class AvailabilityRuleTestCase(BookingTestMixin, TestCase):
+    """Test recurring availability rules and their on-demand slots"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        # Every day from tomorrow on, three one-hour slots between 09:00 and 12:00
+        self.rule = AvailabilityRule.objects.create(
+            provider=self.provider_user, service=self.service, weekdays=0b1111111,
+            start_time=time(9, 0), end_time=time(12, 0), start_date=self.day,
+            excluded_dates=[(self.day + timedelta(days=1)).isoformat()]
+        )
+
+    def day_slots(self, day):
+        response = self.client.get(reverse('view_availability', args=[self.service.id]), {'date': day.isoformat()})
+        return [(slot['time'], slot['is_available']) for slot in response.context['time_slots']]
+
+    def test_rule_slots_are_expanded_per_day(self):
+        self.client.login(username='customer', password='testpass123')
+
+        self.assertEqual(self.day_slots(self.day), [('09:00', True), ('10:00', True), ('11:00', True)])
+        self.assertEqual(self.day_slots(self.day + timedelta(days=1)), [])
+        self.assertFalse(Availability.objects.exists())
+
+    def test_booking_a_rule_slot_materializes_one_row(self):
+        self.client.login(username='customer', password='testpass123')
+        token = self.client.get(
+            reverse('view_availability', args=[self.service.id]), {'date': self.day.isoformat()}
+        ).context['time_slots'][1]['id']
+
+        self.client.post(reverse('confirm_booking', args=[self.service.id]), {'availability_id': token})
+        response = self.client.post(reverse('confirm_booking', args=[self.service.id]),
+                                    {'availability_id': token}, follow=True)
+
+        self.assertContains(response, 'Selected time slot is not available.')
+        self.assertEqual(Booking.objects.get().start_time, time(10, 0))
+        self.assertEqual(list(Availability.objects.values_list('start_time', 'is_available')),
+                         [(time(10, 0), False)])
+        self.assertEqual(self.day_slots(self.day), [('09:00', True), ('10:00', False), ('11:00', True)])
+
+    def test_next_available_date_counts_rules(self):
+        refresh_next_available_dates([self.provider_user.id])
+
+        self.assertEqual(ProviderStats.objects.get(provider=self.provider_user).next_available_date, self.day)
+        self.assertEqual(reconcile_provider_stats(), [])
+
+    def test_rule_backed_row_cannot_be_deleted_but_the_rule_can(self):
+        slot = materialize_slot(self.service, slot_token(next(rule_slots(self.service, self.day, self.day))))
+        self.client.login(username='provider', password='testpass123')
+
+        response = self.client.post(reverse('delete_availability', args=[slot.id]), follow=True)
+        self.assertContains(response, 'comes from a recurring availability rule')
+        self.assertTrue(Availability.objects.filter(id=slot.id).exists())
+
+        self.client.post(reverse('delete_availability_rule', args=[self.rule.id]))
+        self.assertFalse(AvailabilityRule.objects.exists())
+        self.assertEqual(ProviderStats.objects.get(provider=self.provider_user).next_available_date, self.day)
+
+
+class AvailabilityWeekTestCase(BookingTestMixin, TestCase):
+    """Test the JSON week grid behind the availability page"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.create_fixtures()
+        AvailabilityRule.objects.create(
+            provider=self.provider_user, service=self.service, weekdays=0b1111111,
+            start_time=time(9, 0), end_time=time(11, 0), start_date=self.day
+        )
+        self.slot = Availability.objects.create(
+            provider=self.provider_user, service=self.service, date=self.day,
+            start_time=time(14, 0), end_time=time(15, 0)
+        )
+        refresh_next_available_dates([self.provider_user.id])
+        self.url = reverse('availability_week', args=[self.service.id])
+        self.client.login(username='customer', password='testpass123')
+
+    def test_week_grid(self):
+        response = self.client.get(self.url)
+
+        days = response.json()['days']
+        self.assertEqual([day['date'] for day in days],
+                         [(date.today() + timedelta(days=offset)).isoformat() for offset in range(7)])
+        self.assertEqual(days[0]['slots'], [])
+        self.assertEqual([(slot['time'], slot['is_available']) for slot in days[1]['slots']],
+                         [('09:00', True), ('10:00', True), ('14:00', True)])
+        self.assertEqual(days[1]['slots'][2]['id'], self.slot.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'week': 1})
+        with CaptureQueriesContext(connection) as more_slots:
+            Availability.objects.bulk_create([
+                Availability(provider=self.provider_user, service=self.service,
+                             date=self.day + timedelta(days=offset), start_time=time(16, 0), end_time=time(17, 0))
+                for offset in range(7, 14)
+            ])
+            self.client.get(self.url, {'week': 1})
+        # The grid does not cost a query per day or per slot
+        self.assertEqual(len(more_slots), len(queries) + 1)
+
+    def test_revalidation_until_the_schedule_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(self.url, {'week': 1}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        booking = book_slot(self.customer_user, self.service, self.slot.id)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertFalse(changed.json()['days'][1]['slots'][2]['is_available'])
+
+        BookingService().confirm(booking)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 200)
+
+    def test_slot_writes_change_the_etag(self):
+        provider_client = Client()
+        provider_client.login(username='provider', password='testpass123')
+        long_slot = Availability.objects.create(
+            provider=self.provider_user, service=self.service, date=self.day,
+            start_time=time(16, 0), end_time=time(18, 0)
+        )
+        writes = {
+            'bulk add': lambda: provider_client.post(reverse('add_availability'), {
+                'mode': 'bulk', 'service': self.service.id, 'start_date': self.day.isoformat(),
+                'end_date': self.day.isoformat(), 'start_time': '12:00', 'end_time': '13:00',
+                'repeat_pattern': 'daily',
+            }),
+            'delete': lambda: provider_client.post(reverse('delete_availability', args=[self.slot.id])),
+            'split': lambda: call_command('split_availability_slots', stdout=StringIO()),
+        }
+
+        for name, write in writes.items():
+            etag = self.client.get(self.url)['ETag']
+            write()
+            with self.subTest(name):
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertFalse(Availability.objects.filter(id__in=[self.slot.id, long_slot.id]).exists())
+
+    def test_providers_are_refused(self):
+        self.client.login(username='provider', password='testpass123')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+
+class AvailabilityUniqueStartMigrationTestCase(TransactionTestCase):
+    """Test the duplicate slot cleanup of migration 0019"""
+
+    migrate_from = [('bookings', '0018_provider_schedule_changed_at')]
+    migrate_to = [('bookings', '0019_availability_unique_start')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        self.Availability = apps.get_model('bookings', 'Availability')
+        self.Booking = apps.get_model('bookings', 'Booking')
+
+        user_model = apps.get_model('auth', 'User')
+        self.provider = user_model.objects.create(username='provider')
+        self.customer = user_model.objects.create(username='customer')
+        self.service = apps.get_model('bookings', 'Service').objects.create(
+            provider=self.provider, name='Haircut', category='salon_beauty',
+            description='Professional haircut', price=Decimal('35.00'), duration=60
+        )
+        self.day = date.today() + timedelta(days=1)
+
+    def tearDown(self):
+        # Bring the schema back to the latest migration for the other tests
+        self.Availability.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def create_slot(self, status=None):
+        slot = self.Availability.objects.create(
+            provider=self.provider, service=self.service, date=self.day,
+            start_time=time(9, 0), end_time=time(10, 0), is_available=status in (None, 'cancelled')
+        )
+        if status:
+            self.Booking.objects.create(
+                customer=self.customer, provider=self.provider, service=self.service, availability=slot,
+                date=self.day, start_time=time(9, 0), end_time=time(10, 0), price=Decimal('35.00'),
+                status=status
+            )
+        return slot
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        with redirect_stdout(StringIO()):
+            executor.migrate(self.migrate_to)
+
+    def test_cancelled_history_moves_to_the_kept_slot(self):
+        kept = self.create_slot()
+        self.create_slot('cancelled')
+
+        self.migrate()
+
+        self.assertEqual(list(Availability.objects.values_list('id', 'is_available')), [(kept.id, True)])
+        self.assertEqual(list(Booking.objects.values_list('availability', 'status')), [(kept.id, 'cancelled')])
+
+    def test_active_booking_keeps_its_slot(self):
+        self.create_slot('completed')
+        booked = self.create_slot('confirmed')
+        self.create_slot()
+
+        self.migrate()
+
+        self.assertEqual(list(Availability.objects.values_list('id', flat=True)), [booked.id])
+        self.assertEqual(list(Booking.objects.values_list('availability', 'status')), [(booked.id, 'confirmed')])
+
+    def test_two_active_bookings_stop_the_migration(self):
+        self.create_slot('pending')
+        self.create_slot('confirmed')
+
+        with self.assertRaises(RuntimeError):
+            self.migrate()
@@ -0,0 +1,161 @@
+# bookings/transitions.py
+"""
+Booking status transitions.
+
+Booking status used to change in several places, each with its own part
+of the follow-up work: the dashboard and provider_bookings actions
+(save()), cancel_booking (delete()) and the admin actions (update()).
+BookingService is now the single write path for status changes:
+
+    pending   -> confirmed, cancelled
+    confirmed -> completed, cancelled
+    completed -> cancelled
+
+Every transition runs in one transaction:
+
+    1. one SELECT of the bookings and the fields the hooks need
+    2. one conditional UPDATE (or DELETE) per current status, so a booking
+       that another request moved in the meantime is never overwritten
+    3. the slots of the affected provider-days are recomputed in bulk
+    4. booking_status_changed is sent
+
+Caches, counters and notifications subscribe to booking_status_changed
+(see bookings/signals.py) instead of being updated by each caller. It is
+sent inside the transaction, so whatever the receivers write commits or
+rolls back with the status change.
+
+Creating a booking (book_slot) is not a transition; the model signals
+cover it.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from .models import Booking
+from .scheduling import recompute_availability
+
+# Sent with changes=[BookingChange], status, deleted and actor (the user
+# who made the change, None for system changes)
+booking_status_changed = Signal()
+
+TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('completed', 'cancelled'),
+    'completed': ('cancelled',),
+    'cancelled': (),
+}
+
+CHANGE_FIELDS = (
+    'id', 'status', 'customer_id', 'provider_id', 'service_id', 'service__name',
+    'date', 'start_time', 'end_time', 'price',
+)
+
+
+class InvalidTransition(Exception):
+    """Raised when a booking cannot move to a status; the message is user-facing"""
+
+
+# One booking moved by a transition, as passed to the hooks
+BookingChange = namedtuple('BookingChange', (
+    'id', 'old_status', 'customer_id', 'provider_id', 'service_id', 'service_name',
+    'date', 'start_time', 'end_time', 'price', 'status',
+))
+
+
+class TransitionResult:
+    """What one BookingService.apply() call changed"""
+
+    def __init__(self, changes=(), reopened=0, closed=0):
+        self.changes = list(changes)
+        self.reopened = reopened
+        self.closed = closed
+
+    def __len__(self):
+        return len(self.changes)
+
+
+def can_transition(old_status, status, delete=False):
+    """Whether a booking in old_status may move to status (or, with delete=True, be deleted as cancelled)"""
+    if delete:
+        return status == 'cancelled'
+    return status in TRANSITIONS.get(old_status, ())
+
+
+class BookingService:
+    """
+    Moves bookings between statuses.
+
+    Usage:
+        service = BookingService(actor=request.user)
+        service.confirm(booking)
+        service.cancel(booking, delete=True)
+        service.apply(Booking.objects.filter(...), 'cancelled')
+
+    With enforce=False any status can be set (the admin actions, which are
+    used to correct bookings); the follow-up work is the same.
+    """
+
+    def __init__(self, actor=None, enforce=True):
+        self.actor = actor
+        self.enforce = enforce
+
+    def confirm(self, booking):
+        return self.transition(booking, 'confirmed')
+
+    def complete(self, booking):
+        return self.transition(booking, 'completed')
+
+    def cancel(self, booking, delete=False):
+        """Cancel a booking; delete=True removes the row instead (customer cancellations)"""
+        return self.transition(booking, 'cancelled', delete=delete)
+
+    def transition(self, booking, status, delete=False):
+        """Move one booking instance to `status`; raises InvalidTransition when it cannot"""
+        result = self.apply(Booking.objects.filter(id=booking.id), status, delete=delete)
+        if not result.changes:
+            raise InvalidTransition(
+                f"A {booking.get_status_display().lower()} booking cannot be "
+                f"{dict(Booking.STATUS_CHOICES)[status].lower()}.")
+        if delete:
+            booking.id = None
+        else:
+            booking.status = status
+        return result
+
+    def apply(self, bookings, status, delete=False):
+        """
+        Move the bookings of a queryset that can make the transition to
+        `status` (with delete=True: delete them as cancelled). Bookings
+        that cannot are skipped. Returns a TransitionResult.
+        """
+        with transaction.atomic():
+            # Lock the rows where the backend can (SQLite serializes writers
+            # and the conditional UPDATEs below catch concurrent changes)
+            if connection.features.has_select_for_update_of:
+                bookings = bookings.select_for_update(of=('self',))
+            rows = bookings.order_by('id').values_list(*CHANGE_FIELDS)
+            changes = [
+                BookingChange(*row, status)
+                for row in rows
+                if (delete or row[1] != status) and (not self.enforce or can_transition(row[1], status, delete))
+            ]
+            if not changes:
+                return TransitionResult()
+
+            by_status = defaultdict(list)
+            for change in changes:
+                by_status[change.old_status].append(change.id)
+            for old_status, ids in by_status.items():
+                moved = Booking.objects.filter(id__in=ids, status=old_status)
+                written = moved.delete()[1].get(Booking._meta.label, 0) if delete else moved.update(status=status)
+                if written != len(ids):
+                    # Another request moved some of them since the SELECT
+                    raise InvalidTransition("This booking was changed by someone else. Please try again.")
+
+            reopened, closed = recompute_availability({(change.provider_id, change.date) for change in changes})
+
+            booking_status_changed.send(
+                sender=BookingService, changes=changes, status=status, deleted=delete, actor=self.actor)
+
+        return TransitionResult(changes, reopened, closed)
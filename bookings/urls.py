@@ -2,14 +2,18 @@ from django.urls import path
 from .views import (
     add_availability,
     delete_availability,
+    delete_availability_rule,
     browse_providers,
+    browse_providers_feed,
     my_services,
     add_service,
     edit_service,
     delete_service,
     toggle_service_status,
     search_services,
+    search_services_feed,
     view_availability,
+    availability_week,
     provider_bookings,
     confirm_booking,
     my_bookings,
@@ -19,10 +23,15 @@ from .views import (
 urlpatterns = [
     path("add-availability/", add_availability, name="add_availability"),
     path("delete-availability/<int:availability_id>/", delete_availability, name="delete_availability"),
+    path("delete-availability-rule/<int:rule_id>/", delete_availability_rule, name="delete_availability_rule"),
     path("browse-providers/", browse_providers, name="browse_providers"),
+    path("browse-providers/feed/", browse_providers_feed, name="browse_providers_feed"),
     path("search/", search_services, name="search_services"),
+    path("search/feed/", search_services_feed, name="search_services_feed"),
     path("service/<int:service_id>/availability/",
          view_availability, name="view_availability"),
+    path("service/<int:service_id>/availability/week/",
+         availability_week, name="availability_week"),
 
     # Service Management URLs
     path("my-services/", my_services, name="my_services"),
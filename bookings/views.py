@@ -1,20 +1,48 @@
 # bookings/views.py
+import hashlib
+import logging
+from datetime import date, datetime, timedelta
+
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count, Min, Max
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Count
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.text import Truncator
 from accounts.models import UserProfile
-from .models import Availability, Service, SearchQuery, Booking, ProviderProfile
+from accounts.roles import is_provider
+from .models import Availability, AvailabilityRule, Service, Booking
+from .analytics import log_search
 from .forms import ServiceForm
+from .pagination import KEYSET_ORDERINGS, KeysetPaginator, cached_count
+from .provider_stats import refresh_next_available_dates, schedule_version
+from .rules import (
+    expand_rule, offered_by_rule, offered_range, repeat_pattern_mask,
+    rule_slots, rules_between, service_day_slots, service_days_slots,
+)
+from .scheduling import IntervalIndex, SlotUnavailable, book_slot, iter_bulk_slots
+from .transitions import BookingService, InvalidTransition
+from .search import search
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT when creating availability in bulk
+BULK_BATCH_SIZE = 500
+
+# Days the availability page shows at a time
+WEEK_DAYS = 7
 
 
 @login_required
 def add_availability(request):
     """Add availability slots - supports both single and bulk creation"""
-    from datetime import datetime, timedelta
-
     # Ensure only providers can access
-    if not ProviderProfile.is_provider(request.user):
+    if not is_provider(request.user):
         messages.error(request, "Only service providers can access this page.")
         return redirect("dashboard")
 
@@ -47,67 +75,59 @@ def add_availability(request):
                 start_time = datetime.strptime(start_time_str, '%H:%M').time()
                 end_time = datetime.strptime(end_time_str, '%H:%M').time()
 
-                slots_created = 0
-                current_date = start_date
-
                 # Get service duration (in minutes)
                 service_duration = service.duration if service else 60  # Default to 60 minutes
 
-                while current_date <= end_date:
-                    should_create = False
-
-                    if repeat_pattern == "daily":
-                        should_create = True
-                    elif repeat_pattern == "weekdays":
-                        # Monday = 0, Sunday = 6
-                        should_create = current_date.weekday() < 5
-                    elif repeat_pattern == "weekends":
-                        should_create = current_date.weekday() >= 5
-                    elif repeat_pattern == "custom" and selected_days:
-                        # selected_days contains day names like ['monday', 'wednesday', 'friday']
-                        day_name = current_date.strftime('%A').lower()
-                        should_create = day_name in selected_days
-
-                    if should_create:
-                        # Split the time range into slots based on service duration
-                        current_slot_start = start_time
-
-                        while True:
-                            # Calculate end time for this slot
-                            start_datetime = datetime.combine(current_date, current_slot_start)
-                            slot_end_datetime = start_datetime + timedelta(minutes=service_duration)
-                            current_slot_end = slot_end_datetime.time()
-
-                            # Check if this slot goes beyond the end time
-                            end_datetime = datetime.combine(current_date, end_time)
-                            if slot_end_datetime > end_datetime:
-                                break
-
-                            # Check if slot already exists to avoid duplicates
-                            exists = Availability.objects.filter(
-                                provider=request.user,
-                                service=service,
-                                date=current_date,
-                                start_time=current_slot_start,
-                                end_time=current_slot_end
-                            ).exists()
-
-                            if not exists:
-                                Availability.objects.create(
-                                    provider=request.user,
-                                    service=service,
-                                    date=current_date,
-                                    start_time=current_slot_start,
-                                    end_time=current_slot_end,
-                                )
-                                slots_created += 1
-
-                            # Move to next slot
-                            current_slot_start = current_slot_end
-
-                    current_date += timedelta(days=1)
-
-                messages.success(request, f"Successfully created {slots_created} availability slots!")
+                if service is not None:
+                    # A recurring offer of a service is stored as one rule,
+                    # expanded when customers look at a week
+                    slots_created, slots_skipped = _add_availability_rule(
+                        request.user, service, start_date, end_date, start_time, end_time,
+                        repeat_pattern_mask(repeat_pattern, selected_days))
+                    messages.success(
+                        request,
+                        f"Successfully created {slots_created} availability slots! "
+                        f"({slots_skipped} duplicate slots skipped)"
+                    )
+                    return redirect("add_availability")
+
+                # Work out every candidate slot in memory first
+                candidates = list(iter_bulk_slots(
+                    start_date, end_date, start_time, end_time, service_duration,
+                    repeat_pattern, selected_days
+                ))
+
+                # One range query for the slots that already exist
+                existing = set(Availability.objects.filter(
+                    provider=request.user,
+                    service=service,
+                    date__range=(start_date, end_date)
+                ).values_list('date', 'start_time', 'end_time'))
+
+                new_slots = [
+                    Availability(
+                        provider=request.user,
+                        service=service,
+                        date=slot_date,
+                        start_time=slot_start,
+                        end_time=slot_end,
+                    )
+                    for slot_date, slot_start, slot_end in candidates
+                    if (slot_date, slot_start, slot_end) not in existing
+                ]
+
+                with transaction.atomic():
+                    Availability.objects.bulk_create(new_slots, batch_size=BULK_BATCH_SIZE)
+                    refresh_next_available_dates([request.user.id])
+
+                slots_created = len(new_slots)
+                slots_skipped = len(candidates) - slots_created
+
+                messages.success(
+                    request,
+                    f"Successfully created {slots_created} availability slots! "
+                    f"({slots_skipped} duplicate slots skipped)"
+                )
                 return redirect("add_availability")
 
             except Exception as e:
@@ -115,33 +135,74 @@ def add_availability(request):
                 return redirect("add_availability")
         else:
             # Single slot creation (original logic)
-            Availability.objects.create(
-                provider=request.user,
-                service=service,
-                date=request.POST.get("date"),
-                start_time=request.POST.get("start_time"),
-                end_time=request.POST.get("end_time"),
-            )
+            try:
+                with transaction.atomic():
+                    Availability.objects.create(
+                        provider=request.user,
+                        service=service,
+                        date=request.POST.get("date"),
+                        start_time=request.POST.get("start_time"),
+                        end_time=request.POST.get("end_time"),
+                    )
+                    refresh_next_available_dates([request.user.id])
+            except IntegrityError:
+                # Slots are unique per service and start time
+                messages.error(request, "This service already has a slot starting at that time.")
+                return redirect("add_availability")
             messages.success(request, "Availability slot added successfully!")
             return redirect("add_availability")
 
     # Get slots ordered by most recent first, then show upcoming slots
-    from datetime import date as date_today
-    today = date_today.today()
+    today = date.today()
 
     slots = Availability.objects.filter(
         provider=request.user,
         date__gte=today  # Only show today and future slots
     ).select_related('service').order_by("-date", "-start_time")  # Most recent first
 
+    rules = AvailabilityRule.objects.filter(
+        rules_between(today, date.max), provider=request.user
+    ).select_related('service')
+
     return render(request, "bookings/add_availability.html", {
         "slots": slots,
+        "rules": rules,
         "provider_services": provider_services,
     })
 
 
-# Browse Service Providers - Shows all active services
-def browse_providers(request):
+def _add_availability_rule(provider, service, start_date, end_date, start_time, end_time, weekdays):
+    """
+    Store a bulk availability request as one AvailabilityRule. Slots the
+    service already offers (as a row or through another rule) are counted
+    as skipped; a rule that would add nothing is not stored.
+    Returns (slots created, slots skipped).
+    """
+    rule = AvailabilityRule(provider=provider, service=service, weekdays=weekdays,
+                            start_time=start_time, end_time=end_time,
+                            start_date=start_date, end_date=end_date)
+    candidates = {
+        (slot.date, slot.start_time, slot.end_time)
+        for slot in expand_rule(rule, service.duration, start_date, end_date)
+    }
+    existing = set(Availability.objects.filter(
+        provider=provider, service=service, date__range=(start_date, end_date)
+    ).values_list('date', 'start_time', 'end_time'))
+    existing.update(
+        (slot.date, slot.start_time, slot.end_time)
+        for slot in rule_slots(service, start_date, end_date)
+    )
+
+    slots_created = len(candidates - existing)
+    if slots_created:
+        with transaction.atomic():
+            rule.save()
+            refresh_next_available_dates([provider.id])
+    return slots_created, len(candidates) - slots_created
+
+
+def _browse_services(request):
+    """Filtered services and the sort order for browse_providers"""
     # Start with all active services
     services = Service.objects.filter(
         is_active=True).select_related('provider')
@@ -155,39 +216,97 @@ def browse_providers(request):
     if category:
         services = services.filter(category=category)
 
+    services = _filter_listing(request, services, sort_by)
+
     # Search by service name or description
     if search:
         services = services.filter(
-            name__icontains=search
-        ) | services.filter(
-            description__icontains=search
+            Q(name__icontains=search) | Q(description__icontains=search)
         )
 
-    # Sort services
-    if sort_by == 'newest':
-        services = services.order_by('-created_at')
-    elif sort_by == 'price_low':
-        services = services.order_by('price')
-    elif sort_by == 'price_high':
-        services = services.order_by('-price')
-    elif sort_by == 'duration':
-        services = services.order_by('duration')
+    return services, category, search, sort_by
+
+
+def _filter_listing(request, services, sort_by):
+    """
+    The provider filters and sorts shared by browse and search, read from
+    the indexed ProviderStats columns instead of joining bookings and slots
+    per listed service
+    """
+    # Only services whose provider has an open slot from today on
+    if request.GET.get('available'):
+        services = services.filter(provider__provider_stats__next_available_date__gte=date.today())
+
+    # The 'popular' keyset ordering sorts by this annotation
+    if sort_by == 'popular':
+        services = services.annotate(
+            provider_bookings=Coalesce('provider__provider_stats__total_bookings', 0))
+
+    return services
+
+
+def _feed_query(request):
+    """The current filters as a query string, without the page cursor"""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+def _service_feed_item(service):
+    """JSON representation of a service card for the infinite scroll feeds"""
+    return {
+        'id': service.id,
+        'name': service.name,
+        'category': service.get_category_display(),
+        'provider': service.provider.username,
+        'provider_name': service.provider.get_full_name() or service.provider.username,
+        'description': Truncator(service.description).words(15),
+        'duration': service.duration,
+        'duration_display': service.get_duration_display(),
+        'price': str(service.price),
+        'availability_url': reverse('view_availability', args=[service.id]),
+    }
+
+
+def _service_feed_response(page):
+    return JsonResponse({
+        'results': [_service_feed_item(service) for service in page],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+
+# Browse Service Providers - Shows all active services, one page at a time
+def browse_providers(request):
+    services, category, search, sort_by = _browse_services(request)
+    page = KeysetPaginator(services, sort_by).page(request.GET.get('cursor'))
 
     # Get category choices for dropdown
     category_choices = Service.CATEGORY_CHOICES
 
     # Pass everything to template
     context = {
-        'services': services,
+        'services': page,
+        'results_count': cached_count(services),
+        'next_cursor': page.next_cursor,
+        'feed_query': _feed_query(request),
         'category_choices': category_choices,
         'selected_category': category,
         'search_query': search,
         'selected_sort': sort_by,
+        'available_only': bool(request.GET.get('available')),
     }
 
     return render(request, 'bookings/browse_providers.html', context)
 
 
+def browse_providers_feed(request):
+    """JSON pages of browse_providers for infinite scroll"""
+    services, _, _, sort_by = _browse_services(request)
+    page = KeysetPaginator(services, sort_by).page(request.GET.get('cursor'))
+    return _service_feed_response(page)
+
+
 # ==========================================
 # SERVICE MANAGEMENT VIEWS (Providers Only)
 # ==========================================
@@ -196,7 +315,7 @@ def browse_providers(request):
 def my_services(request):
     """List all services for the logged-in provider"""
     # Ensure only providers can access
-    if not ProviderProfile.is_provider(request.user):
+    if not is_provider(request.user):
         messages.error(request, 'Only service providers can manage services.')
         return redirect('dashboard')
 
@@ -222,7 +341,7 @@ def my_services(request):
 def add_service(request):
     """Add a new service"""
     # Ensure only providers can access
-    if not ProviderProfile.is_provider(request.user):
+    if not is_provider(request.user):
         messages.error(request, 'Only service providers can add services.')
         return redirect('dashboard')
 
@@ -311,8 +430,8 @@ def toggle_service_status(request, service_id):
 # SMART SEARCH VIEW
 # ==========================================
 
-def search_services(request):
-    """Smart search functionality with query tracking"""
+def _search_services(request):
+    """Filtered services and their paginator for search_services"""
     query = request.GET.get('q', '').strip()
     category = request.GET.get('category', '')
     min_price = request.GET.get('min_price', '')
@@ -323,21 +442,16 @@ def search_services(request):
     services = Service.objects.filter(
         is_active=True).select_related('provider')
 
-    # Apply search query - search across service name, description, and provider name
+    # Apply search query - full-text search across service name, description, category and provider name
     if query:
-        services = services.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__icontains=query) |
-            Q(provider__username__icontains=query) |
-            Q(provider__first_name__icontains=query) |
-            Q(provider__last_name__icontains=query)
-        )
+        services = search(services, query)
 
     # Filter by category
     if category:
         services = services.filter(category=category)
 
+    services = _filter_listing(request, services, sort_by)
+
     # Filter by price range
     if min_price:
         try:
@@ -351,24 +465,29 @@ def search_services(request):
         except ValueError:
             pass
 
-    # Sort results
-    if sort_by == 'price_low':
-        services = services.order_by('price')
-    elif sort_by == 'price_high':
-        services = services.order_by('-price')
-    elif sort_by == 'duration':
-        services = services.order_by('duration')
-    elif sort_by == 'newest':
-        services = services.order_by('-created_at')
-    else:  # relevance (default)
-        services = services.order_by('-created_at')
-
-    results_count = services.count()
-
-    # Track the search query for analytics
-    if query or category:
+    # Sort results; relevance (the default) ranks full-text matches first
+    # and pages with offsets, the other sorts page by keyset
+    if sort_by in KEYSET_ORDERINGS:
+        paginator = KeysetPaginator(services, sort_by)
+    elif query:
+        paginator = KeysetPaginator(services, sort_by, ordering=['-search_rank', '-created_at', '-id'])
+    else:
+        paginator = KeysetPaginator(services, 'newest')
+
+    return services, paginator, query, category, min_price, max_price, sort_by
+
+
+def search_services(request):
+    """Smart search functionality with query tracking"""
+    services, paginator, query, category, min_price, max_price, sort_by = _search_services(request)
+    page = paginator.page(request.GET.get('cursor'))
+    results_count = cached_count(services)
+
+    # Track the search query for analytics (buffered, written in the background)
+    # Only the first page counts as a search, not the infinite scroll pages
+    if (query or category) and not request.GET.get('cursor'):
         try:
-            search_query = SearchQuery.objects.create(
+            log_search(
                 query=query,
                 user=request.user if request.user.is_authenticated else None,
                 category=category if category else None,
@@ -384,12 +503,15 @@ def search_services(request):
     category_choices = Service.CATEGORY_CHOICES
 
     context = {
-        'services': services,
+        'services': page,
+        'next_cursor': page.next_cursor,
+        'feed_query': _feed_query(request),
         'search_query': query,
         'selected_category': category,
         'min_price': min_price,
         'max_price': max_price,
         'selected_sort': sort_by,
+        'available_only': bool(request.GET.get('available')),
         'results_count': results_count,
         'category_choices': category_choices,
     }
@@ -397,6 +519,12 @@ def search_services(request):
     return render(request, 'bookings/search_results.html', context)
 
 
+def search_services_feed(request):
+    """JSON pages of search_services for infinite scroll"""
+    _, paginator, *_ = _search_services(request)
+    return _service_feed_response(paginator.page(request.GET.get('cursor')))
+
+
 # ==========================================
 # VIEW AVAILABILITY
 # ==========================================
@@ -404,10 +532,8 @@ def search_services(request):
 @login_required
 def view_availability(request, service_id):
     """View availability calendar for a specific service - Only customers can view"""
-    from datetime import datetime, timedelta
-
     # Prevent providers from viewing availability to book
-    if ProviderProfile.is_provider(request.user):
+    if is_provider(request.user):
         messages.error(
             request, "Service providers cannot book services. This page is only for customers.")
         return redirect("browse_providers")
@@ -427,18 +553,7 @@ def view_availability(request, service_id):
 
     # Get availability date range for this service
     today = datetime.now().date()
-    availability_range = Availability.objects.filter(
-        provider=service.provider,
-        service=service,
-        date__gte=today,
-        is_available=True
-    ).aggregate(
-        earliest_date=Min('date'),
-        latest_date=Max('date')
-    )
-
-    earliest_available = availability_range['earliest_date'] or today
-    latest_available = availability_range['latest_date'] or today
+    earliest_available, latest_available = offered_range(service, today) or (today, today)
 
     # Calculate total available days
     total_available_days = (latest_available - earliest_available).days + 1 if latest_available >= earliest_available else 0
@@ -449,7 +564,7 @@ def view_availability(request, service_id):
     # Generate 7 days starting from the calculated start date
     start_date = today + timedelta(days=week_offset * 7)
     week_dates = []
-    for i in range(7):
+    for i in range(WEEK_DAYS):
         date = start_date + timedelta(days=i)
         week_dates.append({
             'date': date,
@@ -466,55 +581,19 @@ def view_availability(request, service_id):
     end_of_current_week = start_date + timedelta(days=6)
     has_next_week = latest_available > end_of_current_week
 
-    # Get availability slots for the selected date
-    availability_slots = Availability.objects.filter(
-        provider=service.provider,
-        service=service,
-        date=selected_date
-    ).order_by('start_time')
-
-    # Get all bookings for this provider on the selected date to check for conflicts
-    existing_bookings = Booking.objects.filter(
-        provider=service.provider,
-        date=selected_date,
-        status__in=['pending', 'confirmed']  # Only active bookings block slots
-    ).select_related('service')
-
-    # Helper function to check if a time slot conflicts with any existing booking
-    def is_slot_conflicting(slot_start, slot_end):
-        """Check if proposed time slot conflicts with any existing booking"""
-        for booking in existing_bookings:
-            booking_start = datetime.combine(selected_date, booking.start_time)
-            booking_end = datetime.combine(selected_date, booking.end_time)
-            proposed_start = datetime.combine(selected_date, slot_start)
-            proposed_end = datetime.combine(selected_date, slot_end)
+    # Get the slots for the selected date: stored rows plus the slots the
+    # service's rules offer that day, expanded for just this day
+    availability_slots = service_day_slots(service, selected_date)
 
-            # Check for overlap: bookings overlap if one starts before the other ends
-            if proposed_start < booking_end and proposed_end > booking_start:
-                return True
-        return False
+    # Index the provider's active bookings for the day once, then answer
+    # each slot's conflict check with a binary search
+    booking_index = IntervalIndex.for_provider_day(service.provider, selected_date)
 
     # Build time slots from availability, respecting service duration
-    time_slots = []
-    for slot in availability_slots:
-        # Calculate the end time based on service duration
-        slot_start_datetime = datetime.combine(selected_date, slot.start_time)
-        slot_end_datetime = slot_start_datetime + timedelta(minutes=service.duration)
-        calculated_end_time = slot_end_datetime.time()
-
-        # Check if this slot conflicts with existing bookings
-        has_conflict = is_slot_conflicting(slot.start_time, calculated_end_time)
-
-        # Determine if slot is truly available
-        is_truly_available = slot.is_available and not has_conflict
-
-        time_slots.append({
-            'id': slot.id,
-            'time': slot.start_time.strftime('%H:%M'),
-            'display_time': slot.start_time.strftime('%I:%M %p'),
-            'end_time': calculated_end_time.strftime('%H:%M'),
-            'is_available': is_truly_available
-        })
+    time_slots = [
+        _time_slot(service, selected_date, slot, booking_index)
+        for slot in availability_slots
+    ]
 
     context = {
         'service': service,
@@ -530,6 +609,87 @@ def view_availability(request, service_id):
     }
 
     return render(request, 'bookings/view_availability.html', context)
+
+
+def _time_slot(service, day, slot, booking_index):
+    """
+    JSON-ready entry of a service_day_slots() slot for the availability
+    page. A slot is only available if it overlaps no active booking.
+    """
+    slot_id, slot_start, _, is_available = slot
+
+    # Calculate the end time based on service duration
+    slot_end = datetime.combine(day, slot_start) + timedelta(minutes=service.duration)
+
+    return {
+        'id': slot_id,
+        'time': slot_start.strftime('%H:%M'),
+        'display_time': slot_start.strftime('%I:%M %p'),
+        'end_time': slot_end.strftime('%H:%M'),
+        'is_available': is_available and not booking_index.overlaps_slot(slot_start, service.duration),
+    }
+
+
+def _week_start(request):
+    """First day of the week the availability page shows (?week=N weeks from today)"""
+    try:
+        week_offset = int(request.GET.get('week', 0))
+    except ValueError:
+        week_offset = 0
+    return date.today() + timedelta(days=week_offset * 7)
+
+
+@login_required
+def availability_week(request, service_id):
+    """
+    The slot grid of a service for the week the availability page shows,
+    as JSON, so the page can switch days without reloading.
+
+    The ETag and Last-Modified headers come from the provider's
+    schedule_changed_at (bookings/provider_stats.py), which costs one
+    query, so a revalidation that nothing changed is answered with a 304
+    before the grid is built. The grid itself is three queries: the week's
+    rows, the service's rules and the provider's bookings.
+    """
+    if is_provider(request.user):
+        return JsonResponse(
+            {'error': "Service providers cannot book services. This page is only for customers."},
+            status=403)
+
+    service = get_object_or_404(Service, id=service_id, is_active=True)
+    start_date = _week_start(request)
+    end_date = start_date + timedelta(days=WEEK_DAYS - 1)
+
+    # The grid depends on the schedule, the slot length and which week it is
+    changed_at = schedule_version(service.provider_id)
+    version = changed_at.isoformat() if changed_at else 'initial'
+    etag = quote_etag(hashlib.md5(
+        f'{service.id}:{service.duration}:{start_date}:{version}'.encode()
+    ).hexdigest())
+    last_modified = changed_at.timestamp() if changed_at else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        days = service_days_slots(service, start_date, end_date)
+        booking_indexes = IntervalIndex.for_provider_days(service.provider_id, start_date, end_date)
+        response = JsonResponse({
+            'service': service.id,
+            'start_date': start_date.isoformat(),
+            'days': [
+                {
+                    'date': day.isoformat(),
+                    'slots': [_time_slot(service, day, slot, booking_indexes[day]) for slot in slots],
+                }
+                for day, slots in days.items()
+            ],
+        })
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Cached by the browser, but revalidated on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 # ==========================================
 # Confirm booking
 # ==========================================
@@ -539,7 +699,7 @@ def view_availability(request, service_id):
 def confirm_booking(request, service_id):
     """Confirm a booking - Only customers can book, providers cannot"""
     # Prevent providers from booking services
-    if ProviderProfile.is_provider(request.user):
+    if is_provider(request.user):
         messages.error(
             request, "Service providers cannot book services. Only customers can make bookings.")
         return redirect("browse_providers")
@@ -550,99 +710,28 @@ def confirm_booking(request, service_id):
 
     availability_id = request.POST.get("availability_id")
 
-    # Debug logging
-    print("=" * 50)
-    print("CONFIRM BOOKING DEBUG")
-    print("=" * 50)
-    print(f"Service ID: {service_id}")
-    print(f"Availability ID from POST: {availability_id}")
-    print(f"All POST data: {request.POST}")
-    print("=" * 50)
+    logger.debug("confirm_booking: service %s, availability %s", service_id, availability_id)
 
     if not availability_id:
         messages.error(request, "Please select a time slot.")
         return redirect("view_availability", service_id=service_id)
 
-    try:
-        availability = Availability.objects.get(
-            id=availability_id,
-            is_available=True
-        )
-    except Availability.DoesNotExist:
-        messages.error(request, "Selected time slot is not available.")
-        return redirect("view_availability", service_id=service_id)
-
     service = get_object_or_404(Service, id=service_id)
 
-    # Prevent double booking
-    if hasattr(availability, "booking"):
-        messages.error(request, "This slot is already booked.")
-        return redirect("view_availability", service_id=service_id)
-
     # CREATE BOOKING
     try:
-        # Calculate end time based on service duration
-        from datetime import datetime, timedelta
-        start_datetime = datetime.combine(availability.date, availability.start_time)
-        end_datetime = start_datetime + timedelta(minutes=service.duration)
-        calculated_end_time = end_datetime.time()
-
-        # Check for booking conflicts before creating
-        conflicting_bookings = Booking.objects.filter(
-            provider=availability.provider,
-            date=availability.date,
-            status__in=['pending', 'confirmed']
-        )
-
-        # Check if the new booking would overlap with any existing booking
-        for existing_booking in conflicting_bookings:
-            existing_start = datetime.combine(availability.date, existing_booking.start_time)
-            existing_end = datetime.combine(availability.date, existing_booking.end_time)
-
-            # Check for overlap
-            if start_datetime < existing_end and end_datetime > existing_start:
-                messages.error(request, "This time slot conflicts with an existing booking. Please choose another time.")
-                return redirect("view_availability", service_id=service_id)
-
-        booking = Booking.objects.create(
-            customer=request.user,
-            provider=availability.provider,
-            service=service,
-            availability=availability,
-            date=availability.date,
-            start_time=availability.start_time,
-            end_time=calculated_end_time,  # Use calculated end time based on duration
-            price=service.price,
-            status="pending"
-        )
-
-        # Mark slot unavailable
-        availability.is_available = False
-        availability.save()
-
-        # Mark any other availability slots that would conflict as unavailable
-        overlapping_slots = Availability.objects.filter(
-            provider=availability.provider,
-            service=service,
-            date=availability.date,
-            is_available=True
-        ).exclude(id=availability.id)
-
-        for slot in overlapping_slots:
-            slot_start = datetime.combine(availability.date, slot.start_time)
-            slot_end_calc = slot_start + timedelta(minutes=service.duration)
-
-            # If this slot would overlap with our new booking, mark it unavailable
-            if slot_start < end_datetime and slot_end_calc > start_datetime:
-                slot.is_available = False
-                slot.save()
+        booking = book_slot(request.user, service, availability_id)
 
         messages.success(
-            request, f"Booking request sent! Waiting for provider confirmation for {availability.date} at {availability.start_time}.")
+            request, f"Booking request sent! Waiting for provider confirmation for {booking.date} at {booking.start_time}.")
         return redirect("my_bookings")
 
-    except Exception as e:
-        print(f"Error creating booking: {e}")
+    except SlotUnavailable as e:
+        messages.error(request, str(e))
+        return redirect("view_availability", service_id=service_id)
+
+    except Exception:
+        logger.exception("Error creating booking for service %s", service_id)
         messages.error(
             request, "An error occurred while creating your booking. Please try again.")
         return redirect("view_availability", service_id=service_id)
@@ -654,7 +743,7 @@ def confirm_booking(request, service_id):
 
 @login_required
 def provider_bookings(request):
-    if not ProviderProfile.is_provider(request.user):
+    if not is_provider(request.user):
         messages.error(request, "Only service providers can access this page.")
         return redirect("dashboard")
 
@@ -664,74 +753,29 @@ def provider_bookings(request):
         booking_id = request.POST.get("booking_id")
 
         try:
-            booking = Booking.objects.get(id=booking_id, provider=request.user)
+            booking = Booking.objects.select_related("customer").get(id=booking_id, provider=request.user)
+            bookings = BookingService(actor=request.user)
 
             if action == "accept":
-                booking.status = "confirmed"
-                booking.save()
+                bookings.confirm(booking)
                 messages.success(
                     request, f"Booking accepted for {booking.customer.username}")
 
             elif action == "reject":
-                from datetime import datetime, timedelta
-
-                booking.status = "cancelled"
-                booking.save()
-
-                # Make availability slot available again
-                booking.availability.is_available = True
-                booking.availability.save()
-
-                # Free up overlapping slots that were blocked by this booking
-                booking_start = datetime.combine(booking.date, booking.start_time)
-                booking_end = datetime.combine(booking.date, booking.end_time)
-
-                # Find all unavailable slots for this service on the same date
-                overlapping_slots = Availability.objects.filter(
-                    provider=booking.provider,
-                    service=booking.service,
-                    date=booking.date,
-                    is_available=False
-                ).exclude(id=booking.availability.id)
-
-                # Check each slot to see if it was blocked by this booking
-                for slot in overlapping_slots:
-                    slot_start = datetime.combine(booking.date, slot.start_time)
-                    slot_end_calc = slot_start + timedelta(minutes=booking.service.duration)
-
-                    # If this slot was overlapping with the cancelled booking
-                    if slot_start < booking_end and slot_end_calc > booking_start:
-                        # Check if there are other active bookings blocking this slot
-                        other_bookings = Booking.objects.filter(
-                            provider=booking.provider,
-                            date=booking.date,
-                            status__in=['pending', 'confirmed']
-                        ).exclude(id=booking.id)
-
-                        slot_is_blocked = False
-                        for other_booking in other_bookings:
-                            other_start = datetime.combine(booking.date, other_booking.start_time)
-                            other_end = datetime.combine(booking.date, other_booking.end_time)
-
-                            if slot_start < other_end and slot_end_calc > other_start:
-                                slot_is_blocked = True
-                                break
-
-                        # Only free the slot if no other bookings block it
-                        if not slot_is_blocked:
-                            slot.is_available = True
-                            slot.save()
+                # Cancel and reopen the slots this booking blocked
+                bookings.cancel(booking)
 
                 messages.success(
                     request, f"Booking rejected for {booking.customer.username}")
 
             elif action == "complete":
-                booking.status = "completed"
-                booking.save()
+                bookings.complete(booking)
                 messages.success(request, f"Booking marked as completed")
 
         except Booking.DoesNotExist:
             messages.error(request, "Booking not found")
+        except InvalidTransition as e:
+            messages.error(request, str(e))
 
         return redirect("provider_bookings")
 
@@ -783,62 +827,16 @@ def cancel_booking(request, booking_id):
     )
 
     if request.method == "POST":
-        from datetime import datetime, timedelta
-
-        # Get the associated availability slot
-        availability = booking.availability
-
         # Store booking details for the message
         service_name = booking.service.name
         booking_date = booking.date
 
-        # Free up the availability slot
-        if availability:
-            availability.is_available = True
-            availability.save()
-
-            # Free up overlapping slots that were blocked by this booking
-            booking_start = datetime.combine(booking.date, booking.start_time)
-            booking_end = datetime.combine(booking.date, booking.end_time)
-
-            # Find all unavailable slots for this service on the same date
-            overlapping_slots = Availability.objects.filter(
-                provider=booking.provider,
-                service=booking.service,
-                date=booking.date,
-                is_available=False
-            ).exclude(id=availability.id)
-
-            # Check each slot to see if it was blocked by this booking
-            for slot in overlapping_slots:
-                slot_start = datetime.combine(booking.date, slot.start_time)
-                slot_end_calc = slot_start + timedelta(minutes=booking.service.duration)
-
-                # If this slot was overlapping with the cancelled booking
-                if slot_start < booking_end and slot_end_calc > booking_start:
-                    # Check if there are other active bookings blocking this slot
-                    other_bookings = Booking.objects.filter(
-                        provider=booking.provider,
-                        date=booking.date,
-                        status__in=['pending', 'confirmed']
-                    ).exclude(id=booking.id)
-
-                    slot_is_blocked = False
-                    for other_booking in other_bookings:
-                        other_start = datetime.combine(booking.date, other_booking.start_time)
-                        other_end = datetime.combine(booking.date, other_booking.end_time)
-
-                        if slot_start < other_end and slot_end_calc > other_start:
-                            slot_is_blocked = True
-                            break
-
-                    # Only free the slot if no other bookings block it
-                    if not slot_is_blocked:
-                        slot.is_available = True
-                        slot.save()
-
-        # Delete the booking
-        booking.delete()
+        # Delete the booking and reopen the slots it blocked
+        try:
+            BookingService(actor=request.user).cancel(booking, delete=True)
+        except InvalidTransition as e:
+            messages.error(request, str(e))
+            return redirect('my_bookings')
 
         messages.success(
             request,
@@ -884,13 +882,23 @@ def delete_availability(request, availability_id):
         )
         return redirect('add_availability')
 
+    # Deleting the row would put a rule's slot back on offer
+    if availability.service and offered_by_rule(availability.service, availability.date, availability.start_time):
+        messages.error(
+            request,
+            "This slot comes from a recurring availability rule. Delete the rule to remove its slots."
+        )
+        return redirect('add_availability')
+
     # Store info for success message before deletion
     slot_date = availability.date.strftime('%B %d, %Y')
     slot_time = availability.start_time.strftime('%I:%M %p')
     service_name = availability.service.name if availability.service else "General availability"
 
     # Delete the availability slot
-    availability.delete()
+    with transaction.atomic():
+        availability.delete()
+        refresh_next_available_dates([request.user.id])
 
     messages.success(
         request,
@@ -898,3 +906,18 @@ def delete_availability(request, availability_id):
     )
 
     return redirect('add_availability')
+
+
+@login_required
+def delete_availability_rule(request, rule_id):
+    """Delete a recurring availability rule; slots already booked from it stay"""
+    rule = get_object_or_404(AvailabilityRule, id=rule_id, provider=request.user)
+
+    if request.method == "POST":
+        service_name = rule.service.name
+        with transaction.atomic():
+            rule.delete()
+            refresh_next_available_dates([request.user.id])
+        messages.success(request, f'The recurring availability of "{service_name}" has been deleted.')
+
+    return redirect('add_availability')
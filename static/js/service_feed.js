@@ -0,0 +1,76 @@
+// Infinite scroll for the service listings (browse and search)
+//
+// The "Load more" link is a plain link to the next page, so the listing
+// keeps working without JavaScript. With JavaScript the next pages are
+// fetched from the JSON feed, rendered with the page's <template> card and
+// appended, automatically once the link scrolls into view.
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-service-feed]').forEach(setupServiceFeed);
+});
+
+function setupServiceFeed(container) {
+    const loadMore = document.getElementById(container.dataset.loadMore);
+    const cardTemplate = document.getElementById(container.dataset.cardTemplate);
+    if (!loadMore || !cardTemplate) return;
+
+    let nextCursor = loadMore.dataset.nextCursor;
+    let loading = false;
+
+    function renderCard(service) {
+        const card = cardTemplate.content.cloneNode(true);
+        card.querySelectorAll('[data-field]').forEach(function(element) {
+            element.textContent = service[element.dataset.field];
+        });
+        card.querySelectorAll('[data-href]').forEach(function(element) {
+            element.setAttribute('href', service[element.dataset.href]);
+        });
+        return card;
+    }
+
+    function loadNextPage() {
+        if (loading || !nextCursor) return;
+        loading = true;
+        loadMore.classList.add('disabled');
+
+        const separator = container.dataset.feedUrl.includes('?') ? '&' : '?';
+        fetch(container.dataset.feedUrl + separator + 'cursor=' + encodeURIComponent(nextCursor), {
+            headers: {'Accept': 'application/json'}
+        })
+            .then(function(response) {
+                if (!response.ok) throw new Error('Feed request failed: ' + response.status);
+                return response.json();
+            })
+            .then(function(data) {
+                data.results.forEach(function(service) {
+                    container.appendChild(renderCard(service));
+                });
+                nextCursor = data.next_cursor;
+                if (nextCursor) {
+                    loadMore.href = loadMore.href.replace(/cursor=[^&]*/, 'cursor=' + encodeURIComponent(nextCursor));
+                } else {
+                    loadMore.remove();
+                }
+            })
+            .catch(function(error) {
+                console.error(error);
+            })
+            .finally(function() {
+                loading = false;
+                loadMore.classList.remove('disabled');
+            });
+    }
+
+    loadMore.addEventListener('click', function(event) {
+        event.preventDefault();
+        loadNextPage();
+    });
+
+    if ('IntersectionObserver' in window) {
+        new IntersectionObserver(function(entries) {
+            if (entries.some(function(entry) { return entry.isIntersecting; })) {
+                loadNextPage();
+            }
+        }, {rootMargin: '400px'}).observe(loadMore);
+    }
+}